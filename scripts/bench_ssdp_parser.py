@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+"""Micro-benchmark of the fast SSDP parser against the ssdp library parsing path it replaced.
+Usage: python scripts/bench_ssdp_parser.py [number of datagrams]"""
+import logging
+import sys
+import timeit
+
+import ssdp
+
+from roku_remote.ssdp_parser import parse_datagram
+
+logger = logging.getLogger("main")
+
+DATAGRAMS = [
+    b"HTTP/1.1 200 OK\r\nCache-Control: max-age=3600\r\nST: roku:ecp\r\nUSN: uuid:roku:ecp:X000008HLY9X\r\n"
+    b"Ext: \r\nServer: Roku/11.5.0 UPnP/1.0 Roku/11.5.0\r\nLOCATION: http://192.168.0.172:8060/\r\n"
+    b"device-group.roku.com: 016D31572B73AFE542A4\r\nWAKEUP: MAC=cc:a1:2b:6a:c5:cf;Timeout=10\r\n\r\n",
+    b"HTTP/1.1 200 OK\r\nCACHE-CONTROL: max-age=120\r\nST: urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+    b"USN: uuid:67d10bb0-9729-4a3f-8bb6-c2491237430c::urn:schemas-upnp-org:device:InternetGatewayDevice:1\r\n"
+    b"EXT:\r\nSERVER: TP-Link/TP-LINK UPnP/1.1 MiniUPnPd/1.8\r\nLOCATION: http://192.168.0.1:1900/ejbqw/rootDesc.xml\r\n"
+    b"OPT: \"http://schemas.upnp.org/upnp/1/0/\"; ns=01\r\n01-NLS: 1\r\nBOOTID.UPNP.ORG: 1\r\nCONFIGID.UPNP.ORG: 1337\r\n\r\n",
+]
+
+def previous_path(data):
+    """the parsing path of the discovery protocol before the fast parser"""
+    response = ssdp.SSDPResponse.parse(data.decode())
+    header_dict = {}
+    for header in response.headers:
+        header_dict[header[0]] = header[1]
+        logger.debug("header: {}".format(header))
+    return header_dict
+
+def fast_path(data):
+    return parse_datagram(data).headers
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    for name, function in (("ssdp library", previous_path), ("parse_datagram", fast_path)):
+        seconds = timeit.timeit(lambda: [function(data) for data in DATAGRAMS], number=number // len(DATAGRAMS))
+        print(f"{name:16} {number} datagrams in {seconds:.3f}s, {seconds / number * 1e6:.2f}us per datagram")
+
+if __name__ == "__main__":
+    main()
@@ -1,163 +1,362 @@
+import asyncio
 import logging
 import os
-import re
+import shlex
 import tkinter as tk
-from tkinter import scrolledtext
+from tkinter import filedialog, messagebox, scrolledtext
 import tkinter.ttk as ttk
-from fnmatch import fnmatch
-from queue import Queue
+from collections import OrderedDict
 
 import Pmw
 from importlib_resources import files
-from PIL import Image, ImageTk
 
 import roku_remote.images
-from roku_remote.discover import discover
-from roku_remote.roku import Roku
+from roku_remote import eventloop
+from roku_remote.assets import ImageCache
+from roku_remote.bridge import TkBridge
+from roku_remote.catalogue import Catalogue
+from roku_remote.discover import DiscoverySession
+from roku_remote.dispatcher import Dispatcher
+from roku_remote.fanout import Broadcast
+from roku_remote.hold import KeyHold
+from roku_remote.macro import Macro, MacroPlayer
+from roku_remote.metrics import get_metrics
+from roku_remote.hydration import Hydrator
+from roku_remote.poller import StatePoller
+from roku_remote.registry import DeviceRegistry, get_header
 
 logger = logging.getLogger("main.app")
 
 class App:
-    REGSITER_ROKU_EVENT = "<<RegisterRoku>>"
     COMBOBOX_SELECTED_EVENT = "<<ComboboxSelected>>"
     bgcolor = "#521c86"
     troughcolor = "#662d91"
-    DISCOVER_INTERVAL = 5*60*1000
-    POWER_UPDATE_INTERVAL = 10*1000
     DISCOVER_BUTTON_FLASH_INTERVAL = 500
+    DISCOVER_QUIET_PERIOD = 10
     activebgcolor = bgcolor
 
-    def __init__(self, window, timeout):
+    def __init__(self, window, timeout, push=True, auth_key=None):
         """creates the main window object, creates widgets, arranges to grid and wires
         up the combobox selection and roku registration events"""
-        self.image_path = files(roku_remote.images)
+        self.images = ImageCache(files(roku_remote.images))
         self.window = window
         self.timeout = timeout
         Pmw.initialise(window)
         self.title = self.window.title("Roku Remote")
         self.window.configure(bg=self.bgcolor)
         self.window.resizable(False, False)
-        self.window.iconphoto(False, tk.PhotoImage(file=f"{self.image_path}/roku_remote.png"))
-
-        self.registration_queue = Queue()
+        self.window.iconphoto(False, tk.PhotoImage(file=f"{self.images.image_path}/roku_remote.png"))
+
+        self.bridge = TkBridge(self.window)
+        self.bridge.add_batch_callback(self.update_devices)
+        self.devices_changed = False
+        self.dispatcher = Dispatcher(lambda command: self.bridge.post(self.command_completed, command))
+        self.hold = KeyHold(self.window, self.submit)
+        self.recording = None
+        self.replaying = False
         self.rokus = []
         self.roku = None
-        self.discover_thread = None
+        self.registry = DeviceRegistry()
+        self.hydrator = Hydrator(self.roku_hydrated, self.hydration_failed)
+        self.poller = StatePoller(self.device_state_changed, push=push, auth_key=auth_key)
+        self.catalogue = Catalogue(self.catalogue_updated)
+        self.discover_animation = None
+        self.discovery = DiscoverySession("roku:ecp", self.register_device, self.unregister_device, registry=self.registry, timeout=timeout, lifecycle_callback=self.discovery_event)
 
         self._create_widgets()
         self._layout_widgets()
         self._disable_widgets()
 
-        self.window.bind(self.REGSITER_ROKU_EVENT, self.register_roku)
-        self.window.after(App.DISCOVER_INTERVAL, self.discover)
-        self.window.after(App.DISCOVER_BUTTON_FLASH_INTERVAL, self.flash_discover_button)
-
         self.window.bind('<KeyPress>', self.on_key_press)
+        self.window.bind('<KeyRelease>', self.on_key_release)
+        self.window.bind('<FocusOut>', lambda event: self.hold.release_all())
         self.device_combobox.bind(self.COMBOBOX_SELECTED_EVENT, self.device_selection_changed)
         self.input_combobox.bind(self.COMBOBOX_SELECTED_EVENT, self.input_selection_changed)
 
     def on_key_press(self, event):
         logger.debug(f"on_key_press code:{event.keycode}: code.hex:{event.keycode:02x} char:{event.char}")
         if self.roku:
-            self.roku.send_char(event.char, event.keysym)
+            from roku_remote.roku import char_to_key
+            key = char_to_key(event.char, event.keysym)
+            if key is not None:
+                self.hold.press(self.roku, key)
             if event.keycode == 67:         # <F1> key
-                child = tk.Toplevel(self.window)
-                child.resizable(height=True, width=False)
-                child.title(self.roku.get_name())
-                child.rowconfigure(0, weight=1)
-                child.columnconfigure(0, weight=1)
-                text_area = scrolledtext.ScrolledText(child, font=('Helvetica 12'))
-                text_area.insert(tk.INSERT, self.roku.get_full_device_info())
-                text_area.grid(column=0, row=0, sticky=tk.NSEW)
-                text_area.config(state="disabled") 
-
-
-    def register_roku(self, event):
-        """called by the Tk.mainloop when a REGISTER_ROKU_EVENT has been posted from the discovery thread
-        pops the Roku from the registration queue, checks the comobox to see if we have registered any
-        roku yet, if so checks whether this is a known roku, if a new roku then appends to the roku array.
-        If this is the first registration, posts a selection change event for the combobox and sets the current
-        selection to 0, the first roku"""
-        roku = self.registration_queue.get()
+                self.submit(self.roku.get_full_device_info, callback=self.show_device_info)
+        if event.keycode == 68:             # <F2> key
+            App.StatsWindow(self)
+        if event.keycode == 69:             # <F3> key
+            self.toggle_recording()
+        if event.keycode == 70:             # <F4> key
+            self.replay_macro()
+        if event.keycode == 71:             # <F5> key
+            App.BroadcastWindow(self)
+
+    def on_key_release(self, event):
+        if self.roku:
+            from roku_remote.roku import char_to_key
+            key = char_to_key(event.char, event.keysym)
+            if key is not None:
+                self.hold.release(key)
+
+    def show_device_info(self, command):
+        """opens a window showing the full device-info of the device that command was sent to"""
+        if command.exception is not None:
+            return
+        child = tk.Toplevel(self.window)
+        child.resizable(height=True, width=False)
+        child.title(command.roku.get_name())
+        child.rowconfigure(0, weight=1)
+        child.columnconfigure(0, weight=1)
+        text_area = scrolledtext.ScrolledText(child, font=('Helvetica 12'))
+        text_area.insert(tk.INSERT, command.result)
+        text_area.grid(column=0, row=0, sticky=tk.NSEW)
+        text_area.config(state="disabled")
+
+    def submit(self, function, *args, callback=None, roku=None):
+        """queues function(*args) on the dispatcher queue of roku, by default the selected roku,
+        without blocking the Tk.mainloop, callback is called on the Tk thread with the completed command"""
+        roku = roku or self.roku
+        if roku is None:
+            logger.debug(f"submit self.roku is None")
+            return
+        self.dispatcher.submit(roku, function, *args, callback=callback)
+        self.poller.poke(roku)
+        if self.recording is not None:
+            self.recording.record(getattr(function, "__name__", ""), args)
+
+    def toggle_recording(self):
+        """starts recording the actions sent to the devices, or stops and offers to save them"""
+        if self.recording is None:
+            self.recording = Macro()
+            self.window.title("Roku Remote - recording")
+            return
+        macro = self.recording
+        self.recording = None
+        self.window.title("Roku Remote")
+        if len(macro) > 0:
+            path = filedialog.asksaveasfilename(parent=self.window, title="save macro", defaultextension=".macro", filetypes=[("macros", "*.macro")])
+            if path:
+                macro.save(path)
+                logger.info(f"saved {len(macro)} actions over {macro.get_duration():.1f}s to {path}")
+
+    def replay_macro(self):
+        """replays a saved macro on the selected roku with its original timing"""
+        if self.roku is None or self.replaying or self.recording is not None:
+            return
+        path = filedialog.askopenfilename(parent=self.window, title="replay macro", filetypes=[("macros", "*.macro"), ("all files", "*")])
+        if not path:
+            return
+        try:
+            macro = Macro.load(path)
+        except (OSError, ValueError) as ex:
+            messagebox.showerror("replay macro", str(ex), parent=self.window)
+            return
+        self.replaying = True
+        self.window.title(f"Roku Remote - replaying {os.path.basename(path)}")
+        MacroPlayer(macro).submit([self.roku]).add_done_callback(lambda future: self.bridge.post(self.macro_replayed, future))
+
+    def macro_replayed(self, future):
+        """called on the Tk thread through the bridge when a replay finishes"""
+        self.replaying = False
+        self.window.title("Roku Remote")
+        if future.exception() is not None:
+            logger.error(f"exception {future.exception()} replaying macro")
+            return
+        for playback in future.result():
+            late = max(playback.errors, default=0)
+            logger.info(f"replayed {len(playback.latencies)} actions on roku {playback.roku.get_name()}, {playback.failed} failed, at most {late * 1000:.0f}ms late")
+
+    def command_completed(self, command):
+        """called on the Tk thread through the bridge to hand a completed command to its callback"""
+        logger.debug(f"completed {command} for roku {command.roku.get_name()} in {command.latency():.3f}s")
+        if command.callback is not None:
+            command.callback(command)
+
+    def register_roku(self, roku):
+        """called on the Tk thread through the bridge with a hydrated Roku, checks whether this is a
+        known roku, if a new roku then appends to the roku array, if a known roku at a new address
+        replaces it. The combobox is updated once per batch by update_devices"""
         roku_name = roku.get_name()
-        values = self.device_combobox['values']
-        current = self.device_combobox.current()
-        logger.debug(f"registering Roku {roku_name}, current selected is {current} values {values}")
-        if (values) == ("discovering...",): # see _create_widgets where the combobox is created
-            values = ()
-            current = -1
-        if roku_name in values:
-            logger.info(f"Roku {roku_name} is already registered")
+        logger.debug(f"registering Roku {roku_name}")
+        for i, registered in enumerate(self.rokus):
+            if registered.get_name() == roku_name:
+                if registered.get_api_url() == roku.get_api_url():
+                    logger.info(f"Roku {roku_name} is already registered")
+                    roku.close()
+                    return
+                logger.info(f"Roku {roku_name} moved to {roku.get_api_url()}")
+                self.rokus[i] = roku
+                self.release_roku(registered)
+                if self.roku is registered:
+                    self.roku = None
+                break
+        else:
+            self.rokus.append(roku)
+        self.poller.add(roku)
+        self.devices_changed = True
+
+    def update_devices(self):
+        """called on the Tk thread after each bridge batch, brings the combobox and widget state
+        up to date with the registered rokus once, however many registered or left in the batch.
+        Keeps the selection by name, so a roku that moved stays selected, else selects the first"""
+        if not self.devices_changed:
+            return
+        self.devices_changed = False
+        if len(self.rokus) == 0:
+            self.roku = None
+            self.reset_combobox()
+            self._disable_widgets()
             return
-        self.rokus.append(roku)
-        values = values + (roku_name,)
-        self.device_combobox['values'] = values
-        if current == -1:
+        selected = self.device_combobox.get()
+        names = tuple(roku.get_name() for roku in self.rokus)
+        self.device_combobox['values'] = names
+        self.device_combobox.current(names.index(selected) if selected in names else 0)
+        if selected == "discovering...": # see reset_combobox
             self._enable_widgets()
-            self.device_combobox.current(0)
-            self.device_selection_changed(event)
-            self.window.after(App.POWER_UPDATE_INTERVAL, self.update_power_button_state)
+        if self.roku is None:
+            self.device_selection_changed(None)
+
+    def release_roku(self, roku):
+        """stops all background work for a Roku that is no longer registered. It is closed
+        by its dispatcher worker after the commands already queued for it, e.g. the keyups
+        of held keys, so none of them races the close"""
+        self.hold.forget(roku)
+        self.dispatcher.submit(roku, roku.close)
+        self.dispatcher.remove(roku)
+        self.poller.remove(roku)
+        self.catalogue.forget(roku)
 
     def register_device(self, dict):
         """called from discovery thread as a callback
-        creates a new Roku object from the dictionary, posts to the registration queue
-        and posts an event to the Tk.mainloop in order to add the Roku to the combobox"""
-        roku = Roku(dict)
-        logger.info(f"registering {roku.get_description()} {roku.get_name()} {roku.get_device_info('friendly-model-name')} at {roku.get_api_url()}")
-        self.registration_queue.put(Roku(dict))
-        self.window.event_generate(self.REGSITER_ROKU_EVENT)
+        for a new or moved device only, responses of known devices are dropped by the discovery
+        registry. Hands the device to the hydrator so the discovery thread never waits on HTTP"""
+        self.hydrator.submit(dict)
+
+    def roku_hydrated(self, roku):
+        """called from a hydration worker with a new Roku object, posts it through the bridge
+        in order to add the Roku to the combobox"""
+        logger.info(f"registering {roku.get_name()} at {roku.get_api_url()}")
+        self.bridge.post(self.register_roku, roku)
+
+    def hydration_failed(self, dict, ex):
+        """called from a hydration worker, forgets the device so the next discovery retries it"""
+        self.registry.forget(get_header(dict, "USN"))
+
+    def unregister_device(self, dict):
+        """called from discovery as a callback when a device sends ssdp:byebye, posts the USN
+        through the bridge to remove the Roku from the combobox"""
+        self.bridge.post(self.unregister_roku, get_header(dict, "USN"))
+
+    def unregister_roku(self, usn):
+        """called on the Tk thread through the bridge, removes the Roku that left the network,
+        update_devices selects the first remaining one if it was selected"""
+        for roku in self.rokus:
+            if roku.get_usn() == usn:
+                break
+        else:
+            return
+        logger.info(f"unregistering Roku {roku.get_name()}")
+        self.rokus.remove(roku)
+        self.release_roku(roku)
+        if self.roku is roku:
+            self.roku = None
+        self.devices_changed = True
+
+    def discovery_event(self, event, detail):
+        """called from the discovery session as searches start and finish and devices are
+        found, posts the event to the Tk thread"""
+        self.bridge.post(self.discovery_event_received, event)
+
+    def discovery_event_received(self, event):
+        """animates the discover button while a search is running, the animation is the only
+        timer, so an idle remote has no periodic wakeups"""
+        match event:
+            case DiscoverySession.SEARCH_STARTED:
+                if self.discover_animation is None:
+                    self.discover_animation = self.window.after(App.DISCOVER_BUTTON_FLASH_INTERVAL, self.flash_discover_button)
+            case DiscoverySession.DEVICE_FOUND:
+                self.discover_btn.show(True)
+            case DiscoverySession.SEARCH_FINISHED:
+                if self.discover_animation is not None:
+                    self.window.after_cancel(self.discover_animation)
+                    self.discover_animation = None
+                self.discover_btn.show(True)
 
     def flash_discover_button(self):
-        if self.discover_thread.is_alive():
-            #logger.debug("flashing discover button")
-            self.discover_btn.onoff(False)
+        self.discover_btn.show(not self.discover_btn.on)
+        self.discover_animation = self.window.after(App.DISCOVER_BUTTON_FLASH_INTERVAL, self.flash_discover_button)
+
+
+    def device_state_changed(self, roku, state):
+        """called from the state poller when a device's power state or active app changes,
+        posts the state through the bridge"""
+        self.bridge.post(self.device_state_received, roku, state)
+
+    def device_state_received(self, roku, state):
+        """called on the Tk thread through the bridge, updates the power button image if the
+        state is the selected device's"""
+        if roku is self.roku:
+            self.update_power_button_state(state)
+
+    def catalogue_updated(self, roku, apps, icons):
+        """called from the catalogue when a device's installed apps or their icons change,
+        posts them through the bridge"""
+        self.bridge.post(self.catalogue_received, roku, apps, icons)
+
+    def catalogue_received(self, roku, apps, icons):
+        """called on the Tk thread through the bridge, shows the selected device's apps in the
+        channel strip, or the bundled channels if its apps are unknown"""
+        if roku is not self.roku:
+            return
+        if apps is None:
+            self.reset_channels()
         else:
-            self.discover_btn.onoff(True)
-        self.window.after(App.DISCOVER_BUTTON_FLASH_INTERVAL, self.flash_discover_button)
+            self.channel_frame.set_channels([(id, name) for id, name, version in apps], icons)
 
+    def reset_channels(self):
+        """shows the bundled channels until a device's own apps are known"""
+        self.channel_frame.set_channels([(id, id) for id in self.images.channel_ids()], {})
 
-    def update_power_button_state(self, user_action=False):
-        """called every App.POWER_UPDATE_INTERVAL seconds from the Tk.mainloop
-        to check power state of device and update power button image.
-        TODO: Research if Roku sends network events via SSDP, or websockets"""
-        if self.roku:
-            try:
-                power = self.roku.is_power_on()
-            except Exception as ex:
-                logger.error(f"{self.roku.get_name}: exception {ex} in update_power_button, resetting...")
-                self.discover(True, True)
-                return
-            logger.debug(f"{self.roku.get_name()}: power is {'on' if power else 'off'}")
-            self.power_btn.set_power(power)
-            if user_action == False:
-                logger.debug(f"{self.roku.get_name()}: resetting self.window.after")
-                self.window.after(App.POWER_UPDATE_INTERVAL, self.update_power_button_state)
+    def update_power_button_state(self, state):
+        """updates power button image from the selected device's last polled state"""
+        if state is None:
+            return
+        if not state["reachable"]:
+            logger.error(f"{self.roku.get_name()}: unreachable, resetting...")
+            self.discover(True, True)
+            return
+        logger.debug(f"{self.roku.get_name()}: power is {'on' if state['power'] else 'off'}, app is {state['active_app']}")
+        self.power_btn.set_power(state["power"])
 
     def power_button(self):
-        """sends power button message to selected roku device"""
-        self.roku.send_key_power()
-        self.update_power_button_state(True)
+        """sends power button message to selected roku device, the poller is poked by submit
+        and picks up the new power state"""
+        if self.roku is not None:
+            self.submit(self.roku.send_key_power)
 
-    def set_discover_thread(self, ssdp_thread):
-        self.discover_thread = ssdp_thread
+    def start_discovery(self):
+        """starts listening for devices and sends the initial M-SEARCH"""
+        self.discovery.start(quiet_period=App.DISCOVER_QUIET_PERIOD)
 
     def discover(self, force=False, user_action=False):
-        """starts a discovery thread when the user clicks the discover button or upon
-        an exception getting power button state """
-        if self.discover_thread.is_alive():
-            logger.debug("discover thread already running")
+        """sends an M-SEARCH when the user clicks the discover button or upon
+        an exception getting power button state, devices announcing themselves
+        are picked up by the discovery session in between"""
+        if self.discovery.is_searching():
+            logger.debug("discovery search already running")
             return
         
         logger.debug(f"discover(force={force}, user_action={user_action})")
         if force:
+            for roku in self.rokus:
+                self.release_roku(roku)
             self.rokus.clear()
+            self.registry.clear()
             self.roku = None
             self.reset_combobox()
+            self.reset_channels()
             self._disable_widgets()
-        self.discover_thread = discover("roku:ecp", self.register_device, force, timeout=self.timeout)
-        self.discover_thread.start()
-        if user_action == False:
-            self.window.after(App.DISCOVER_INTERVAL, self.discover)
+        self.discovery.search(quiet_period=App.DISCOVER_QUIET_PERIOD)
 
     def input_selection_changed(self, event):
         """event handler when user selects new input from combobox"""
@@ -165,17 +364,17 @@ class App:
         if self.roku is not None:
             match selection:
                 case "HDMI-1":
-                    self.roku.send_key_input_hdmi1()
+                    self.submit(self.roku.send_key_input_hdmi1)
                 case "HDMI-2":
-                    self.roku.send_key_input_hdmi2()
+                    self.submit(self.roku.send_key_input_hdmi2)
                 case "HDMI-3":
-                    self.roku.send_key_input_hdmi3()
+                    self.submit(self.roku.send_key_input_hdmi3)
                 case "HDMI-4":
-                    self.roku.send_key_input_hdmi4()
+                    self.submit(self.roku.send_key_input_hdmi4)
                 case "Tuner":
-                    self.roku.send_key_input_tuner()
+                    self.submit(self.roku.send_key_input_tuner)
                 case "AV-1":
-                    self.roku.send_key_input_av1()
+                    self.submit(self.roku.send_key_input_av1)
         self.window.focus_set()
         
 
@@ -184,8 +383,18 @@ class App:
         selection = self.device_combobox.get()
         for roku in self.rokus:
             if roku.get_name() == selection:
+                if self.roku is not roku:
+                    if self.roku is not None:
+                        self.hold.release_all()
+                        self.roku.stop_heartbeat()
+                    # the previous device's apps must not be launched on this one, the load
+                    # below publishes this device's memoized apps straight away
+                    self.reset_channels()
                 self.roku = roku
-                self.update_power_button_state(True)
+                self.roku.start_heartbeat()
+                self.update_power_button_state(self.poller.get_state(roku))
+                self.poller.poke(roku)
+                self.catalogue.load(roku)
         self.window.focus_set()
 
     def reset_combobox(self):
@@ -241,32 +450,32 @@ class App:
         self.reset_combobox()
 
         # Buttons: each button is a clickable image with alpha-channel laying on a canvas
-        self.power_btn          = App.PowerButton(self, self.window, "power", f"{self.image_path}/power_red.png", lambda event: self.btn_clicked(self.power_button), 50, 50, f"{self.image_path}/power_green.png")
-        self.discover_btn       = App.Button(self, self.window, "discover", f"{self.image_path}/discover.png", lambda event: self.discover(True, True), 50, 50)
-
-        self.back_btn           = App.Button(self, self.window, "back", f"{self.image_path}/back.png", lambda event: self.btn_clicked(self.roku.send_key_back), 75, 50)
-        self.guide_btn          = App.Button(self, self.window, "guide", f"{self.image_path}/guide.png", lambda event: self.btn_clicked(self.roku.send_key_guide), 75, 50)
-        self.home_btn           = App.Button(self, self.window, "home", f"{self.image_path}/home.png", lambda event: self.btn_clicked(self.roku.send_key_home), 75, 50)
-
-        self.rocker_nw          = App.Button(self, self.window, None, f"{self.image_path}/rocker_nw.png", None, 78, 78)
-        self.up_btn             = App.Button(self, self.window, "up", f"{self.image_path}/rocker_up.png", lambda event: self.btn_clicked(self.roku.send_key_up), 78, 78)
-        self.rocker_ne          = App.Button(self, self.window, None, f"{self.image_path}/rocker_ne.png", None, 78, 78)
-        self.left_btn           = App.Button(self, self.window, "left", f"{self.image_path}/rocker_left.png", lambda event: self.btn_clicked(self.roku.send_key_left), 78, 78)
-        self.select_btn         = App.Button(self, self.window, "select", f"{self.image_path}/rocker_center.png", lambda event: self.btn_clicked(self.roku.send_key_select), 78, 78)
-        self.right_btn          = App.Button(self, self.window, "right", f"{self.image_path}/rocker_right.png", lambda event: self.btn_clicked(self.roku.send_key_right), 78, 78)
-        self.rocker_sw          = App.Button(self, self.window, None, f"{self.image_path}/rocker_sw.png", None, 78, 78)
-        self.down_btn           = App.Button(self, self.window, "down", f"{self.image_path}/rocker_down.png", lambda event: self.btn_clicked(self.roku.send_key_down), 78, 78)
-        self.rocker_se          = App.Button(self, self.window, None, f"{self.image_path}/rocker_se.png", None, 78, 78)
-
-        self.instant_replay_btn = App.Button(self, self.window, "instant replay", f"{self.image_path}/instant_replay.png", lambda event: self.btn_clicked(self.roku.send_key_instant_replay), 75, 50)
-        self.info_btn           = App.Button(self, self.window, "info", f"{self.image_path}/info.png", lambda event: self.btn_clicked(self.roku.send_key_info), 75, 50)
-        self.headphones_btn     = App.Button(self, self.window, "headphones", f"{self.image_path}/headphones.png", lambda event: self.btn_clicked(self.roku.send_key_headphones), 75, 50)
-        self.rev_btn            = App.Button(self, self.window, "rewind", f"{self.image_path}/rev.png", lambda event: self.btn_clicked(self.roku.send_key_rev), 75, 50)
-        self.play_btn           = App.Button(self, self.window, "play/pause", f"{self.image_path}/play.png", lambda event: self.btn_clicked(self.roku.send_key_play), 75, 50)
-        self.fwd_btn            = App.Button(self, self.window, "forward", f"{self.image_path}/forward.png", lambda event: self.btn_clicked(self.roku.send_key_fwd), 75, 50)
-        self.volume_up_btn      = App.Button(self, self.window, "volume up", f"{self.image_path}/volume_up.png", lambda event: self.btn_clicked(self.roku.send_key_volume_up), 75, 50)
-        self.volume_down_btn    = App.Button(self, self.window, "volume down", f"{self.image_path}/volume_down.png", lambda event: self.btn_clicked(self.roku.send_key_volume_down), 75, 50)
-        self.volume_mute_btn    = App.Button(self, self.window, "volume mute", f"{self.image_path}/volume_mute.png", lambda event: self.btn_clicked(self.roku.send_key_volume_mute), 75, 50)
+        self.power_btn          = App.PowerButton(self, self.window, "power", "power_red.png", lambda event: self.power_button(), 50, 50, "power_green.png")
+        self.discover_btn       = App.Button(self, self.window, "discover", "discover.png", lambda event: self.discover(True, True), 50, 50)
+
+        self.back_btn           = App.Button(self, self.window, "back", "back.png", lambda event: self.btn_clicked(self.roku.send_key_back), 75, 50)
+        self.guide_btn          = App.Button(self, self.window, "guide", "guide.png", lambda event: self.btn_clicked(self.roku.send_key_guide), 75, 50)
+        self.home_btn           = App.Button(self, self.window, "home", "home.png", lambda event: self.btn_clicked(self.roku.send_key_home), 75, 50)
+
+        self.rocker_nw          = App.Button(self, self.window, None, "rocker_nw.png", None, 78, 78)
+        self.up_btn             = App.Button(self, self.window, "up", "rocker_up.png", None, 78, 78, hold_key="Up")
+        self.rocker_ne          = App.Button(self, self.window, None, "rocker_ne.png", None, 78, 78)
+        self.left_btn           = App.Button(self, self.window, "left", "rocker_left.png", None, 78, 78, hold_key="Left")
+        self.select_btn         = App.Button(self, self.window, "select", "rocker_center.png", lambda event: self.btn_clicked(self.roku.send_key_select), 78, 78)
+        self.right_btn          = App.Button(self, self.window, "right", "rocker_right.png", None, 78, 78, hold_key="Right")
+        self.rocker_sw          = App.Button(self, self.window, None, "rocker_sw.png", None, 78, 78)
+        self.down_btn           = App.Button(self, self.window, "down", "rocker_down.png", None, 78, 78, hold_key="Down")
+        self.rocker_se          = App.Button(self, self.window, None, "rocker_se.png", None, 78, 78)
+
+        self.instant_replay_btn = App.Button(self, self.window, "instant replay", "instant_replay.png", lambda event: self.btn_clicked(self.roku.send_key_instant_replay), 75, 50)
+        self.info_btn           = App.Button(self, self.window, "info", "info.png", lambda event: self.btn_clicked(self.roku.send_key_info), 75, 50)
+        self.headphones_btn     = App.Button(self, self.window, "headphones", "headphones.png", lambda event: self.btn_clicked(self.roku.send_key_headphones), 75, 50)
+        self.rev_btn            = App.Button(self, self.window, "rewind", "rev.png", None, 75, 50, hold_key="Rev")
+        self.play_btn           = App.Button(self, self.window, "play/pause", "play.png", lambda event: self.btn_clicked(self.roku.send_key_play), 75, 50)
+        self.fwd_btn            = App.Button(self, self.window, "forward", "forward.png", None, 75, 50, hold_key="Fwd")
+        self.volume_up_btn      = App.Button(self, self.window, "volume up", "volume_up.png", None, 75, 50, hold_key="VolumeUp")
+        self.volume_down_btn    = App.Button(self, self.window, "volume down", "volume_down.png", None, 75, 50, hold_key="VolumeDown")
+        self.volume_mute_btn    = App.Button(self, self.window, "volume mute", "volume_mute.png", lambda event: self.btn_clicked(self.roku.send_key_volume_mute), 75, 50)
 
         self.input_combobox = ttk.Combobox(state="readonly", width=5)
         balloon = Pmw.Balloon(self.input_combobox)
@@ -275,18 +484,7 @@ class App:
         self.input_combobox['values'] = ("input","HDMI-1","HDMI-2","HDMI-3","HDMI-4","Tuner","AV-1")
         self.input_combobox.current(0)
 
-        self.channel_frame = App.ScrollableFrame(self.window, 225, 50)
-
-        self.channel_buttons = []
-        for r, d, files in os.walk(self.image_path):
-            for f in files:
-                if fnmatch(f, "*.jpeg"):
-                    path = os.path.join(r, f)
-                    channel_id = re.search(r'\d+', f).group()
-                    button = App.Button(self, self.channel_frame.scrollable_frame, channel_id, path, None, 75, 50)
-                    self.channel_buttons.append(button)
-        self.channel_buttons.sort(key=lambda button: int(button.name), reverse=False)
-        pass
+        self.channel_frame = App.ChannelStrip(self, self.window, self.images.channel_ids(), 225, 50, 75)
 
     def _layout_widgets(self):
         """lays out all the widgets in a 3 column, multirow grid"""
@@ -326,15 +524,10 @@ class App:
         self.volume_up_btn.canvas       .grid(row=8, column=2, padx=5, pady=10, stick=tk.NSEW)
 
         self.channel_frame              .grid(row=9, columnspan=3, padx=0, pady=10)
-        i = 0
-        for button in self.channel_buttons:
-            button.canvas.grid(row=0, column=i)
-            i += 1
 
 
     def btn_clicked(self, obj):
-        """handles button clicks by either delegating to the button object's
-        btn_clicked method if it exists, or by wiring based on the button object"""
+        """handles button clicks by queueing the button's roku function on the dispatcher"""
         logger.debug(f"{__class__.__name__}.btn_clicked")
         if self.roku is None or obj is None:
             if self.roku is None:
@@ -342,24 +535,20 @@ class App:
             if obj is None:
                 logger.debug(f"btn_clicked obj is None")
             return
-        try:
-            obj()
-        except Exception as ex:
-            logger.debug(f"Exception {ex} App to handle function of button")
-            obj.btn_clicked()
+        self.submit(obj)
 
     class Button():
         """helper class to build button widgets based on canvases and images"""
-        def __init__(self, app, window, name, image_path, onclick, x, y, alt_image_path=None):
+        def __init__(self, app, window, name, image_name, onclick, x, y, alt_image_name=None, hold_key=None):
             self.app = app
             self.name = name
+            self.hold_key = hold_key
             self.on = True
             self.onclick = onclick
             self.canvas = tk.Canvas(window, width=x, height=y, bd=0, borderwidth=0, highlightthickness=0, bg=App.bgcolor)
-            self.tkimage = Image.open(image_path).resize((x,y))
-            self.img = ImageTk.PhotoImage(self.tkimage)
-            if alt_image_path is not None:
-                self.alt_img = ImageTk.PhotoImage(Image.open(alt_image_path).resize((x,y)))
+            self.img = app.images.get(image_name, (x,y), window)
+            if alt_image_name is not None:
+                self.alt_img = app.images.get(alt_image_name, (x,y), window)
             self.btn_img = self.canvas.create_image(self.canvas.winfo_reqwidth()/2, self.canvas.winfo_reqheight()/2, anchor=tk.CENTER, image=self.img)
             if name is not None:
                 balloon = Pmw.Balloon(self.canvas)
@@ -368,48 +557,262 @@ class App:
             self.set_clickable()
 
         def set_clickable(self):
-            if self.onclick is not None:
+            if self.hold_key is not None:
+                self.canvas.tag_bind(self.btn_img, "<ButtonPress-1>", self.btn_pressed)
+                self.canvas.tag_bind(self.btn_img, "<ButtonRelease-1>", lambda event: self.app.hold.release(self.hold_key))
+            elif self.onclick is not None:
                 self.canvas.tag_bind(self.btn_img, "<Button-1>", self.onclick)
             else:
                 if self.name is not None:
                     self.canvas.tag_bind(self.btn_img, "<Button-1>", self.btn_clicked)
 
-        def onoff(self, set_on):
-            if self.on == True:
-                self.on = False
-                self.canvas.delete(self.btn_img)
-            #self.tkimage = self.tkimage.rotate(-5)
-            #self.img = ImageTk.PhotoImage(self.tkimage)
-            else:
-                self.on = True
-                self.btn_img = self.canvas.create_image(self.canvas.winfo_reqwidth()/2, self.canvas.winfo_reqheight()/2, anchor=tk.CENTER, image=self.img)
+        def show(self, on):
+            """shows or hides the button image, the canvas item is kept"""
+            if on != self.on:
+                self.on = on
+                self.canvas.itemconfigure(self.btn_img, state=tk.NORMAL if on else tk.HIDDEN)
 
-            if set_on == True and self.on == False:
-                self.on = True
-                self.btn_img = self.canvas.create_image(self.canvas.winfo_reqwidth()/2, self.canvas.winfo_reqheight()/2, anchor=tk.CENTER, image=self.img)
-                self.set_clickable()
+        def btn_pressed(self, ev):
+            """a press of a button that can be held, a quick click still sends one keypress"""
+            if self.app.roku is not None:
+                self.app.hold.press(self.app.roku, self.hold_key)
 
         def btn_clicked(self, ev):
             logger.debug(f"Button.btn_clicked {self.name}")
-            self.app.roku.send_launch_channel(self.name)
+            if self.app.roku is not None:
+                self.app.submit(self.app.roku.send_launch_channel, self.name)
 
     class PowerButton(Button):
         """PowerButton subclass of Button to handle special case of changing image when power state changes"""
         def set_power(self, power):
-            self.btn_img = self.canvas.create_image(self.canvas.winfo_reqwidth()/2, self.canvas.winfo_reqheight()/2, anchor=tk.CENTER, image=self.alt_img if power else self.img)
-            self.canvas.tag_bind(self.btn_img, "<Button-1>", self.onclick)
+            self.canvas.itemconfigure(self.btn_img, image=self.alt_img if power else self.img)
+
+    class StatsWindow(tk.Toplevel):
+        """window showing the request latency, error, connection reuse and discovery metrics
+        and the dispatcher queues, refreshed every REFRESH_INTERVAL ms while it is open"""
+        REFRESH_INTERVAL = 2000
 
-    class ScrollableFrame(ttk.Frame):
-        def __init__(self, container, width, height, *args, **kwargs):
+        def __init__(self, app):
+            super().__init__(app.window)
+            self.app = app
+            self.title("Stats")
+            self.rowconfigure(0, weight=1)
+            self.columnconfigure(0, weight=1)
+            self.text_area = scrolledtext.ScrolledText(self, font=('Courier 11'), height=24, width=100)
+            self.text_area.grid(column=0, row=0, sticky=tk.NSEW)
+            self.refresh_id = None
+            self.refresh()
+
+        def destroy(self):
+            # a pending refresh would otherwise run against the destroyed window
+            if self.refresh_id is not None:
+                self.after_cancel(self.refresh_id)
+                self.refresh_id = None
+            super().destroy()
+
+        def refresh(self):
+            lines = [get_metrics().format(), "", "dispatcher:"]
+            for name, stats in self.app.dispatcher.stats().items():
+                lines.append(f"  {name}: " + ", ".join(f"{key} {value}" for key, value in stats.items()))
+            position = self.text_area.yview()[0]
+            self.text_area.config(state="normal")
+            self.text_area.delete("1.0", tk.END)
+            self.text_area.insert(tk.INSERT, "\n".join(lines))
+            self.text_area.config(state="disabled")
+            self.text_area.yview_moveto(position)
+            self.refresh_id = self.after(App.StatsWindow.REFRESH_INTERVAL, self.refresh)
+
+    class BroadcastWindow(tk.Toplevel):
+        """window that sends commands to the chosen devices at once and shows each device's
+        result and latency. Commands use the rokucmd syntax, e.g. home, PowerOff or launch:12,
+        each is broadcast to all chosen devices before the next one is sent"""
+        def __init__(self, app):
+            super().__init__(app.window)
+            self.app = app
+            self.rokus = list(app.rokus)
+            self.broadcast = Broadcast()
+            self.title("Broadcast")
+            self.rowconfigure(3, weight=1)
+            self.columnconfigure(0, weight=1)
+
+            self.device_list = tk.Listbox(self, selectmode=tk.MULTIPLE, exportselection=False, height=min(max(len(self.rokus), 1), 10))
+            for roku in self.rokus:
+                self.device_list.insert(tk.END, roku.get_name())
+            self.device_list.select_set(0, tk.END)
+            self.command_entry = ttk.Entry(self)
+            self.command_entry.insert(0, "home")
+            self.command_entry.bind("<Return>", lambda event: self.send())
+            self.send_button = ttk.Button(self, text="send", command=self.send)
+            self.text_area = scrolledtext.ScrolledText(self, font=('Courier 11'), height=12, width=60)
+            self.text_area.config(state="disabled")
+
+            self.device_list.grid(row=0, column=0, columnspan=2, sticky=tk.NSEW, padx=5, pady=5)
+            self.command_entry.grid(row=1, column=0, sticky=tk.EW, padx=5)
+            self.send_button.grid(row=1, column=1, padx=5)
+            self.text_area.grid(row=3, column=0, columnspan=2, sticky=tk.NSEW, padx=5, pady=5)
+            self.command_entry.focus_set()
+
+        def send(self):
+            # the runner imports roku, and with it aiohttp, which startup defers until a device appears
+            from roku_remote.runner import parse_commands
+            rokus = [self.rokus[i] for i in self.device_list.curselection()]
+            command = self.command_entry.get()
+            try:
+                steps = parse_commands(shlex.split(command))
+            except ValueError as ex:
+                self.show(f"{command}: {ex}")
+                return
+            if len(rokus) == 0 or len(steps) == 0:
+                return
+            self.send_button["state"] = tk.DISABLED
+            asyncio.run_coroutine_threadsafe(self.send_steps(rokus, command, steps), eventloop.get_loop())
+
+        async def send_steps(self, rokus, command, steps):
+            """runs on the event loop, sends each step to all rokus and posts the results"""
+            lines = []
+            try:
+                for label, method, args in steps:
+                    if method is None:
+                        await asyncio.sleep(args[0])
+                        continue
+                    results = await self.broadcast.send_async([roku.async_roku for roku in rokus], method, *args)
+                    lines.append(f"{label}\n{Broadcast.format(results)}")
+            finally:
+                self.app.bridge.post(self.sent, f"> {command}\n" + "\n".join(lines))
+
+        def sent(self, text):
+            if not self.winfo_exists():
+                return
+            self.send_button["state"] = tk.NORMAL
+            self.show(text)
+
+        def show(self, text):
+            self.text_area.config(state="normal")
+            self.text_area.insert(tk.END, text + "\n\n")
+            self.text_area.see(tk.END)
+            self.text_area.config(state="disabled")
+
+    class ChannelStrip(ttk.Frame):
+        """horizontally scrolling strip of channel buttons. Only the slots in view plus OVERSCAN
+        on either side exist, as image items on one canvas that are recycled to show other
+        channels as the strip scrolls. Channel images, a device's app icon or else the bundled
+        image, are decoded when first shown and kept in a small LRU of decoded images"""
+        OVERSCAN = 1
+        SCROLL_UNITS = 25
+
+        def __init__(self, app, container, channel_ids, width, height, slot_width, *args, **kwargs):
             super().__init__(container, *args, **kwargs)
-            canvas = tk.Canvas(self, width=width, height=height, borderwidth=0, highlightthickness=0)
+            self.app = app
+            self.channel_ids = channel_ids
+            self.names = {}
+            self.icons = {}
+            self.width = width
+            self.height = height
+            self.slot_width = slot_width
+            self.offset = 0
+            self.canvas = tk.Canvas(self, width=width, height=height, bd=0, borderwidth=0, highlightthickness=0, bg=App.bgcolor)
             style=ttk.Style()
             style.configure('Horizontal.TScrollbar', troughcolor=App.troughcolor, background=App.bgcolor, bordercolor=App.bgcolor, arrowcolor="white")
-            scrollbar = ttk.Scrollbar(self, orient="horizontal", command=canvas.xview)
-            self.scrollable_frame = ttk.Frame(canvas, borderwidth=0)
-
-            self.scrollable_frame.bind("<Configure>", lambda e: canvas.configure(scrollregion=canvas.bbox("all")))
-            canvas.create_window((0,0), window=self.scrollable_frame, anchor="nw")
-            canvas.configure(xscrollcommand=scrollbar.set)
-            canvas.grid(row=0, column=0)
-            scrollbar.grid(row=1, column=0, sticky=tk.NSEW)
+            self.scrollbar = ttk.Scrollbar(self, orient="horizontal", command=self.scroll)
+            self.canvas.grid(row=0, column=0)
+            self.scrollbar.grid(row=1, column=0, sticky=tk.NSEW)
+            self.balloon = Pmw.Balloon(self.canvas)
+            self.balloon.configure(relmouse="both")
+
+            # a slot shows channel index when index % len(slots) is its position
+            slots = -(-width // slot_width) + 1 + 2 * App.ChannelStrip.OVERSCAN
+            self.slots = [self.canvas.create_image(0, 0, anchor=tk.NW, state=tk.HIDDEN) for _ in range(slots)]
+            self.slot_sources = [None] * slots
+            self.images = OrderedDict()
+            self.cache_size = 2 * slots     # at least every slot's image, so shown images stay alive
+
+            self.canvas.bind("<Button-1>", self.clicked)
+            self.canvas.bind("<MouseWheel>", self.wheel)
+            self.canvas.bind("<Button-4>", self.wheel)
+            self.canvas.bind("<Button-5>", self.wheel)
+            self.layout()
+
+        def set_channels(self, channels, icons):
+            """shows channels, a list of (id, name), with icons mapping id to an icon file.
+            Only the slots whose channel or image changed are redrawn"""
+            self.channel_ids = [id for id, name in channels]
+            self.names = dict(channels)
+            self.icons = icons
+            self.offset = min(self.offset, max(self.get_total_width() - self.width, 0))
+            self.layout()
+
+        def get_total_width(self):
+            return len(self.channel_ids) * self.slot_width
+
+        def scroll(self, action, amount, units=None):
+            """scrollbar command, moveto a fraction or scroll by units or pages"""
+            if action == "moveto":
+                offset = float(amount) * self.get_total_width()
+            else:
+                offset = self.offset + int(amount) * (self.width if units == "pages" else App.ChannelStrip.SCROLL_UNITS)
+            self.offset = int(min(max(offset, 0), max(self.get_total_width() - self.width, 0)))
+            self.layout()
+
+        def wheel(self, event):
+            self.scroll("scroll", -1 if event.num == 4 or event.delta > 0 else 1, "units")
+
+        def get_source(self, channel_id):
+            """returns the image file shown for a channel, or None"""
+            if channel_id in self.icons:
+                return self.icons[channel_id]
+            name = f"chan{channel_id}.jpeg"
+            return name if name in self.app.images.manifest else None
+
+        def get_image(self, source):
+            image = self.images.get(source)
+            if image is None:
+                size = (self.slot_width, self.height)
+                try:
+                    if source in self.app.images.manifest:
+                        image = self.app.images.load(source, size, self.canvas)
+                    else:
+                        # icon files are named by the sha1 of their content
+                        image = self.app.images.load_file(source, os.path.splitext(os.path.basename(source))[0], size, self.canvas)
+                except (OSError, tk.TclError) as ex:
+                    logger.error(f"exception {ex} loading channel image {source}")
+                    return ""
+                self.images[source] = image
+                if len(self.images) > self.cache_size:
+                    self.images.popitem(last=False)
+            else:
+                self.images.move_to_end(source)
+            return image
+
+        def layout(self):
+            """moves the slots over the channels in view, recycling the slots that scrolled out"""
+            first = self.offset // self.slot_width - App.ChannelStrip.OVERSCAN
+            for index in range(first, first + len(self.slots)):
+                slot = index % len(self.slots)
+                item = self.slots[slot]
+                if 0 <= index < len(self.channel_ids):
+                    channel_id = self.channel_ids[index]
+                    source = self.get_source(channel_id)
+                    image = self.get_image(source) if source is not None else ""
+                    name = self.names.get(channel_id, channel_id)
+                    if self.slot_sources[slot] != (channel_id, name, source):
+                        self.slot_sources[slot] = (channel_id, name, source)
+                        self.canvas.itemconfigure(item, image=image, state=tk.NORMAL)
+                        self.balloon.tagunbind(self.canvas, item)
+                        self.balloon.tagbind(self.canvas, item, name)
+                    self.canvas.coords(item, index * self.slot_width - self.offset, 0)
+                elif self.slot_sources[slot] is not None:
+                    self.slot_sources[slot] = None
+                    self.canvas.itemconfigure(item, state=tk.HIDDEN)
+                    self.balloon.tagunbind(self.canvas, item)
+            total = self.get_total_width()
+            if total > 0:
+                self.scrollbar.set(self.offset / total, min((self.offset + self.width) / total, 1))
+            else:
+                self.scrollbar.set(0, 1)
+
+        def clicked(self, event):
+            index = (self.offset + event.x) // self.slot_width
+            if 0 <= index < len(self.channel_ids):
+                logger.debug(f"ChannelStrip.clicked {self.channel_ids[index]}")
+                if self.app.roku is not None:
+                    self.app.submit(self.app.roku.send_launch_channel, self.channel_ids[index])
@@ -0,0 +1,126 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+import tkinter as tk
+
+logger = logging.getLogger("main.assets")
+
+def get_cache_dir(name="images"):
+    """returns the per-user cache directory name, honouring XDG_CACHE_HOME"""
+    root = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(root, "roku_remote", name)
+
+def write_atomically(path, write):
+    """calls write(f) on a temporary file that then replaces path, so readers never see a
+    partial file. Returns False if it could not be written, a failure only costs a cache"""
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f"{path}.{os.getpid()}.tmp"
+        with open(temp, "wb") as f:
+            write(f)
+        os.replace(temp, path)
+        return True
+    except OSError as ex:
+        logger.error(f"exception {ex} writing cache file {path}")
+        return False
+
+class ImageCache:
+    """serves the button images pre-resized from an on-disk cache. A manifest of the image
+    directory records each source file's sha1, so unchanged files are not hashed again, and
+    each resized image is stored as a PNG keyed by source hash and size, which Tk loads
+    natively without going through PIL. PIL only runs the first time a size is needed, and
+    its images are closed once written. Identical images share one PhotoImage"""
+    MANIFEST = "manifest.json"
+    CHANNEL_PATTERN = re.compile(r"chan(\d+)\.jpeg$")
+
+    def __init__(self, image_path, cache_dir=None):
+        self.image_path = str(image_path)
+        self.cache_dir = cache_dir or get_cache_dir()
+        self.photos = {}
+        self.loads = 0
+        self.load_seconds = 0
+        self.manifest = self.load_manifest()
+
+    def load_manifest(self):
+        """returns {file name: {"mtime", "size", "sha1"}} of the image directory, rehashing
+        only the files whose mtime or size differ from the saved manifest"""
+        path = os.path.join(self.cache_dir, ImageCache.MANIFEST)
+        try:
+            with open(path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            saved = {}
+        manifest = {}
+        for entry in os.scandir(self.image_path):
+            if not entry.name.endswith((".png", ".jpeg")):
+                continue
+            stat = entry.stat()
+            known = saved.get(entry.name)
+            if known is not None and known["mtime"] == stat.st_mtime and known["size"] == stat.st_size:
+                manifest[entry.name] = known
+                continue
+            with open(entry.path, "rb") as f:
+                sha1 = hashlib.sha1(f.read()).hexdigest()
+            manifest[entry.name] = {"mtime": stat.st_mtime, "size": stat.st_size, "sha1": sha1}
+        if manifest != saved:
+            logger.debug(f"saving manifest of {len(manifest)} images to {path}")
+            write_atomically(path, lambda f: f.write(json.dumps(manifest).encode()))
+        return manifest
+
+    def channel_ids(self):
+        """returns the ids of the channels that have an image, in ascending order"""
+        ids = [ImageCache.CHANNEL_PATTERN.match(name) for name in self.manifest]
+        return sorted((match.group(1) for match in ids if match), key=int)
+
+    def get_file(self, name, size):
+        """returns the path of image name resized to size (width, height), resizing it into
+        the cache first if needed"""
+        return self.resize(os.path.join(self.image_path, name), self.manifest[name]["sha1"], size)
+
+    def resize(self, source, digest, size):
+        """returns the path of image file source, whose content hash is digest, resized to
+        size, or source itself if the resized image could not be cached"""
+        path = os.path.join(self.cache_dir, f"{digest}_{size[0]}x{size[1]}.png")
+        if not os.path.exists(path):
+            logger.debug(f"resizing {source} to {size[0]}x{size[1]}")
+            # PIL is only needed on a cache miss, a warm start does not import it
+            from PIL import Image
+            with Image.open(source) as image:
+                resized = image.resize(size)
+            try:
+                if not write_atomically(path, lambda f: resized.save(f, "PNG")):
+                    return source
+            finally:
+                resized.close()
+        return path
+
+    def get(self, name, size, master=None):
+        """returns a PhotoImage of image name resized to size, shared by identical images"""
+        key = (self.manifest[name]["sha1"], tuple(size))
+        photo = self.photos.get(key)
+        if photo is None:
+            photo = self.photos[key] = self.load(name, size, master)
+        return photo
+
+    def load(self, name, size, master=None):
+        """returns a new PhotoImage of image name resized to size, which the cache does not
+        keep, for callers that manage the lifetime of their images themselves"""
+        return self.load_file(os.path.join(self.image_path, name), self.manifest[name]["sha1"], size, master)
+
+    def load_file(self, source, digest, size, master=None):
+        """returns a new PhotoImage of any image file, e.g. a downloaded icon, resized to size"""
+        started = time.perf_counter()
+        try:
+            path = self.resize(source, digest, size)
+            if path != source:
+                return tk.PhotoImage(master=master, file=path)
+            # the cache could not be written, fall back to resizing in memory
+            from PIL import Image, ImageTk
+            with Image.open(path) as image:
+                return ImageTk.PhotoImage(image.resize(size), master=master)
+        finally:
+            self.loads += 1
+            self.load_seconds += time.perf_counter() - started
@@ -0,0 +1,91 @@
+import logging
+import os
+import tkinter as tk
+from threading import Lock
+
+logger = logging.getLogger("main.bridge")
+
+class TkBridge:
+    """thread-safe channel from worker threads and the event loop to the Tk thread. post()
+    queues a callback from any thread, the Tk thread runs the queued callbacks in order.
+    Posting to an empty queue writes one byte to a pipe that Tk watches with a file handler,
+    so the Tk thread is woken only when there is work and never polls. Where Tk has no file
+    handlers (Windows) the queue is polled every POLL_INTERVAL ms instead. Everything posted
+    since the last wakeup is drained as one batch, after which the batch callbacks run, so
+    widgets can be updated once per batch however many updates arrived"""
+    POLL_INTERVAL = 50
+
+    def __init__(self, window):
+        self.window = window
+        self.lock = Lock()
+        self.pending = []
+        self.batch_callbacks = []
+        self.signalled = False
+        self.reader = None
+        self.writer = None
+        self.poll = None
+        self.closed = False
+        try:
+            self.reader, self.writer = os.pipe()
+            os.set_blocking(self.reader, False)
+            self.window.tk.createfilehandler(self.reader, tk.READABLE, self.readable)
+        except (AttributeError, OSError, tk.TclError) as ex:
+            logger.debug(f"no file handler wakeup, {ex}, polling every {TkBridge.POLL_INTERVAL}ms")
+            for fd in (self.reader, self.writer):
+                if fd is not None:
+                    os.close(fd)
+            self.reader = self.writer = None
+            self.poll = self.window.after(TkBridge.POLL_INTERVAL, self.polled)
+
+    def post(self, callback, *args):
+        """queues callback(*args) to run on the Tk thread, may be called from any thread"""
+        with self.lock:
+            if self.closed:
+                return
+            self.pending.append((callback, args))
+            wakeup = self.writer is not None and not self.signalled
+            self.signalled = True
+        if wakeup:
+            os.write(self.writer, b"\0")
+
+    def add_batch_callback(self, callback):
+        """callback() runs on the Tk thread after each batch of posted callbacks"""
+        self.batch_callbacks.append(callback)
+
+    def readable(self, fd, mask):
+        try:
+            os.read(fd, 512)
+        except BlockingIOError:
+            pass
+        self.drain()
+
+    def polled(self):
+        self.poll = self.window.after(TkBridge.POLL_INTERVAL, self.polled)
+        self.drain()
+
+    def drain(self):
+        """runs the queued callbacks on the Tk thread, then the batch callbacks"""
+        with self.lock:
+            pending = self.pending
+            self.pending = []
+            self.signalled = False
+        if len(pending) == 0:
+            return
+        for callback, args in pending + [(callback, ()) for callback in self.batch_callbacks]:
+            try:
+                callback(*args)
+            except Exception as ex:
+                logger.exception(f"exception {ex} in {callback}")
+
+    def close(self):
+        with self.lock:
+            self.closed = True
+            self.pending = []
+        if self.reader is not None:
+            self.window.tk.deletefilehandler(self.reader)
+            os.close(self.reader)
+            os.close(self.writer)
+            self.reader = self.writer = None
+        if self.poll is not None:
+            self.window.after_cancel(self.poll)
+            self.poll = None
@@ -0,0 +1,177 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+
+from roku_remote import eventloop
+from roku_remote.assets import get_cache_dir, write_atomically
+
+logger = logging.getLogger("main.catalogue")
+
+class IconCache:
+    """size bounded on-disk LRU of app icons. Icons are keyed by app id and version, so
+    devices with the same app installed share its icon, and stored under the sha1 of their
+    content. A cached icon is revalidated with If-None-Match / If-Modified-Since, a 304
+    costs no download. The index is kept in memory and saved by save()"""
+    INDEX = "index.json"
+    MAX_BYTES = 16 * 1024 * 1024
+
+    def __init__(self, cache_dir=None, max_bytes=MAX_BYTES):
+        self.cache_dir = cache_dir or get_cache_dir("icons")
+        self.max_bytes = max_bytes
+        self.dirty = False
+        try:
+            with open(os.path.join(self.cache_dir, IconCache.INDEX)) as f:
+                self.index = json.load(f)
+        except (OSError, ValueError):
+            self.index = {}
+
+    @staticmethod
+    def get_key(id, version):
+        return re.sub(r"[^\w.-]", "_", f"{id}-{version}")
+
+    def get_path(self, key):
+        """returns the path of a cached icon, or None, and marks it recently used"""
+        entry = self.index.get(key)
+        if entry is None:
+            return None
+        path = os.path.join(self.cache_dir, entry["file"])
+        if not os.path.exists(path):
+            del self.index[key]
+            self.dirty = True
+            return None
+        entry["used"] = time.time()
+        self.dirty = True
+        return path
+
+    async def fetch(self, roku, id, key):
+        """downloads or revalidates the icon of app id from an AsyncRoku, returns whether
+        the cached icon changed"""
+        headers = {}
+        # get_path() drops the entry of an icon whose file has gone, it is then downloaded again
+        entry = self.index.get(key) if self.get_path(key) is not None else None
+        if entry is not None:
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+        status, body, response_headers = await roku.get_icon(id, headers)
+        if status == 304 and headers:
+            logger.debug(f"{roku.get_name()}: icon {key} not modified")
+            return False
+        if status != 200 or not body:
+            logger.debug(f"{roku.get_name()}: no icon for {key}, status {status}")
+            return False
+        file = hashlib.sha1(body).hexdigest() + ".img"
+        if entry is not None and entry["file"] == file:
+            return False
+        if not write_atomically(os.path.join(self.cache_dir, file), lambda f: f.write(body)):
+            return False
+        logger.debug(f"{roku.get_name()}: cached icon {key}, {len(body)} bytes")
+        self.index[key] = {"file": file, "size": len(body), "etag": response_headers.get("ETag"),
+                           "last_modified": response_headers.get("Last-Modified"), "used": time.time()}
+        self.dirty = True
+        self.evict(key)
+        return True
+
+    def evict(self, keep=None):
+        """removes the least recently used icons until the cache fits in max_bytes"""
+        total = sum(entry["size"] for entry in self.index.values())
+        for key in sorted(self.index, key=lambda key: self.index[key]["used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            entry = self.index.pop(key)
+            total -= entry["size"]
+            if not any(other["file"] == entry["file"] for other in self.index.values()):
+                try:
+                    os.remove(os.path.join(self.cache_dir, entry["file"]))
+                except OSError:
+                    pass
+            self.dirty = True
+
+    def save(self):
+        if self.dirty:
+            self.dirty = False
+            write_atomically(os.path.join(self.cache_dir, IconCache.INDEX), lambda f: f.write(json.dumps(self.index).encode()))
+
+class Catalogue:
+    """per-device catalogue of installed apps and their icons. load() publishes the device's
+    memoized app list right away, then refreshes it from query/apps and fetches the icons not
+    yet validated this session, calling on_update(device, apps, icons) on the event loop
+    thread whenever something changed. apps is a list of (id, name, version), or None when
+    the device's apps could not be fetched and nothing is memoized, icons maps app id to icon
+    file path. The public methods may be called from any thread"""
+
+    def __init__(self, on_update, icons=None):
+        self.on_update = on_update
+        self.icons = icons or IconCache()
+        self.apps = {}
+        self.validated = set()
+        self.loading = {}
+
+    # thread safe api
+    def load(self, device):
+        """publishes and refreshes the catalogue of device, a Roku or AsyncRoku"""
+        eventloop.call_soon(self.load_now, device)
+
+    def forget(self, device):
+        eventloop.call_soon(self.forget_now, device)
+
+    # event loop thread
+    def load_now(self, device):
+        if device in self.loading:
+            return
+        task = asyncio.ensure_future(self.refresh(device))
+        self.loading[device] = task
+        task.add_done_callback(lambda task: self.loading.pop(device, None))
+
+    def forget_now(self, device):
+        self.apps.pop(device, None)
+        task = self.loading.pop(device, None)
+        if task is not None:
+            task.cancel()
+
+    def get_icons(self, apps):
+        icons = {}
+        for id, name, version in apps:
+            path = self.icons.get_path(IconCache.get_key(id, version))
+            if path is not None:
+                icons[id] = path
+        return icons
+
+    async def refresh(self, device):
+        roku = getattr(device, "async_roku", device)
+        apps = self.apps.get(device)
+        if apps is not None:
+            self.on_update(device, apps, self.get_icons(apps))
+        try:
+            fresh = await roku.get_apps()
+        except Exception as ex:
+            logger.debug(f"{roku.get_name()}: exception {ex} fetching apps")
+            if apps is None:
+                self.on_update(device, None, {})
+            return
+        if fresh != apps:
+            logger.debug(f"{roku.get_name()}: {len(fresh)} apps installed")
+            self.apps[device] = apps = fresh
+            self.on_update(device, apps, self.get_icons(apps))
+        try:
+            for id, name, version in apps:
+                key = IconCache.get_key(id, version)
+                if key in self.validated:
+                    continue
+                try:
+                    changed = await self.icons.fetch(roku, id, key)
+                except Exception as ex:
+                    logger.debug(f"{roku.get_name()}: exception {ex} fetching icon {key}")
+                    continue
+                self.validated.add(key)
+                if changed and device in self.apps:
+                    self.on_update(device, apps, self.get_icons(apps))
+        finally:
+            self.icons.save()
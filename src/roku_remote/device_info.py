@@ -0,0 +1,99 @@
+import asyncio
+import logging
+import time
+
+logger = logging.getLogger("main.device_info")
+
+class DeviceInfoCache:
+    """caches the query/device-info document of a Roku. Static fields never change for the
+    lifetime of the device and are served from the cache once fetched, volatile fields are
+    served only while younger than their TTL. Concurrent refreshes are coalesced into a
+    single request, the other callers await its result. Must be used from one event loop"""
+
+    STATIC_FIELDS = frozenset({
+        "udn", "serial-number", "device-id", "vendor-name", "model-name", "model-number",
+        "model-region", "friendly-device-name", "friendly-model-name", "default-device-name",
+        "is-tv", "is-stick", "screen-size", "panel-id", "ui-resolution", "tuner-type",
+        "wifi-mac", "ethernet-mac", "software-version", "software-build",
+    })
+    VOLATILE_TTLS = {
+        "power-mode": 2,
+        "uptime": 1,
+        "network-name": 60,
+        "network-type": 60,
+    }
+    DEFAULT_TTL = 30
+
+    def __init__(self, fetch, ttls=None):
+        """fetch is a coroutine function returning the objectified device-info document,
+        ttls overrides the volatile field TTLs in seconds"""
+        self.fetch = fetch
+        self.ttls = dict(DeviceInfoCache.VOLATILE_TTLS, **(ttls or {}))
+        self.refreshing = None
+        self.device_info = None
+        self.fetched = None
+        self.pushed = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def ttl(self, key):
+        return self.ttls.get(key, DeviceInfoCache.DEFAULT_TTL)
+
+    def is_fresh(self, key):
+        if self.device_info is None:
+            return False
+        if key in DeviceInfoCache.STATIC_FIELDS:
+            return True
+        return self.fetched is not None and time.monotonic() - self.fetched < self.ttl(key)
+
+    async def get(self, key):
+        """returns the device-info field key, refreshing the document if the field is stale"""
+        if key in self.pushed:
+            value, pushed = self.pushed[key]
+            if time.monotonic() - pushed < self.ttl(key):
+                self.hits += 1
+                return value
+            del self.pushed[key]
+        if self.is_fresh(key):
+            self.hits += 1
+            return self.device_info[key]
+        if self.refreshing is None:
+            self.misses += 1
+            self.refreshing = asyncio.ensure_future(self.refresh())
+        else:
+            self.coalesced += 1
+        # shield so one cancelled caller does not cancel the refresh the others await
+        device_info = await asyncio.shield(self.refreshing)
+        return device_info[key]
+
+    async def refresh(self):
+        try:
+            self.store(await self.fetch())
+            return self.device_info
+        finally:
+            self.refreshing = None
+
+    def store(self, device_info):
+        """replaces the cached document, e.g. with one fetched outside of the cache"""
+        self.device_info = device_info
+        self.fetched = time.monotonic()
+        self.pushed.clear()
+
+    def push(self, key, value):
+        """records a field value the device pushed, it is served for the field's TTL or until
+        the next refresh"""
+        self.pushed[key] = (value, time.monotonic())
+
+    def invalidate(self):
+        """marks all volatile fields stale, static fields are kept"""
+        self.fetched = None
+        self.pushed.clear()
+
+    def cancel(self):
+        """cancels a refresh in flight, e.g. when the device's session is closed"""
+        if self.refreshing is not None:
+            self.refreshing.cancel()
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "coalesced": self.coalesced}
@@ -1,24 +1,40 @@
 #!/usr/bin/env python3
 """Send out a M-SEARCH request and listening for responses."""
 import asyncio
+import ipaddress
 import logging
 import socket
-from threading import Thread
+from urllib.parse import urlparse
 
 import click
+import ifaddr
 import ssdp
 
+from roku_remote import eventloop
+from roku_remote.metrics import get_metrics
+from roku_remote.registry import DeviceRegistry, get_header
+from roku_remote.ssdp_parser import parse_datagram
+
 logger = logging.getLogger("main")
 
+SSDP_PORT = 1900
+MX_MAX = 5      # UPnP devices treat larger MX values as 5
+INTERFACE = "INTERFACE"     # added to the headers of every response, names the interface it arrived on
+
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 @click.command(context_settings=CONTEXT_SETTINGS, options_metavar="<options>")
 @click.option("--log-level", help="Log level (default: debug)", type=click.Choice(["debug", "info", "error"]), default="info")
 @click.option("--timeout", help="length of time in seconds to keep listening for devices, default 60s", type=click.INT, default=60)
 @click.option("--scope", help="defines the scope of the disovery", type=click.STRING, default="ssdp:all")
+@click.option("--show-registry", help="list the discovered devices and their advertised lifetimes", is_flag=True, default=False)
+@click.option("--max-devices", help="stop after this many devices have responded", type=click.INT, default=None)
+@click.option("--quiet-period", help="stop after this many seconds without a new device", type=click.FLOAT, default=None)
+@click.option("--match", help="stop at the first Roku whose friendly name, serial, USN or IP address matches", type=click.STRING, default=None)
+@click.option("--metrics", "metrics_format", help="print the discovery phase metrics in this format when done", type=click.Choice(["json", "prometheus"]), default=None)
 
-def main(scope, timeout, log_level):
+def main(scope, timeout, log_level, show_registry, max_devices, quiet_period, match, metrics_format):
     """unit test for discovery.
-    Discovers all devices, waits for thread to terminate
+    Discovers all devices, waits for the search to complete
     """
     if log_level == "debug":
         level = logging.DEBUG
@@ -30,44 +46,67 @@ def main(scope, timeout, log_level):
 
     logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s', level=level)
     logger.info("discovering ...")
-    ssdp_thread = discover(scope, SSDP_ProtocolHandler.default_client_callback, False, timeout)
-    ssdp_thread.start()
-    ssdp_thread.join()
+    registry = DeviceRegistry() if show_registry else None
+    if match is not None:
+        find_match(match, timeout, registry)
+    else:
+        session = DiscoverySession(scope, default_client_callback, registry=registry, timeout=timeout)
+        try:
+            session.search(timeout, max_devices=max_devices, quiet_period=quiet_period).result()
+        except KeyboardInterrupt:
+            pass
+        session.stop()
+    if registry is not None:
+        for entry in registry.entries():
+            logger.info(f"registered: {entry}")
+    logger.info("stopping discovery thread")
+    if metrics_format is not None:
+        click.echo(get_metrics().export(metrics_format))
+
+def find_match(match, timeout, registry):
+    """searches for the Roku match names, a friendly name needs each device's device-info,
+    which the runner's find() fetches"""
+    from roku_remote.runner import find
+    try:
+        roku = eventloop.run(find(match, timeout, default_client_callback, registry))
+    except LookupError as ex:
+        logger.info(f"no match: {ex}")
+        return
+    except KeyboardInterrupt:
+        return
+    logger.info(f"matched: {roku.get_name()} at {roku.get_api_url()}")
+    eventloop.run(roku.close())
+
+def default_client_callback(header_dict):
+    """default callback for unit testing"""
+    logger.info(f"discovered: {header_dict}")
 
 class SSDP_ProtocolHandler(ssdp.SimpleServiceDiscoveryProtocol):
-    """Protocol to handle responses and requests."""
-
-    def default_client_callback(self, header_dict):
-        """default callback for unit testing"""
-        logger.info(f"discovered: {header_dict}")
-
-    callback = None
-
-    def response_received(self, response: ssdp.SSDPResponse, addr: tuple):
-        """Handle an incoming response and call client callback with response headers in dictionary"""
-        logger.debug(f"received response: reason: {response.reason} status: {response.status_code}")
-        
-        header_dict = {}
-        # convert the stupid array of name-value tuples into a dictionary
-        for header in response.headers:
-            header_dict[header[0]] = header[1]
-            logger.debug("header: {}".format(header))
-
-        self.callback(header_dict)        
-"""
-    def request_received(self, request: ssdp.SSDPRequest, addr: tuple):
-        #Handle an incoming request.
-        logger.debug(
-            "received request: {} {} {}".format(
-                request.method, request.uri, request.version
-            )
-        )
+    """Protocol to handle responses and requests, hands them to the discovery engine. A search
+    socket's handler knows its interface, the shared NOTIFY socket's does not"""
+
+    def __init__(self, engine, interface=None):
+        self.engine = engine
+        self.interface = interface
+
+    def datagram_received(self, data, addr):
+        """Parse an incoming datagram with the fast parser and pass the headers of a response
+        or NOTIFY to the engine, M-SEARCH requests from other hosts are ignored"""
+        record = parse_datagram(data)
+        if record is None:
+            return
+        if record.is_response():
+            self.engine.response_received(record.headers, addr, self.interface)
+        elif record.method == "NOTIFY":
+            self.engine.notify_received(record.headers, addr, self.interface)
 
-        for header in request.headers:
-            logger.debug("header: {}".format(header))
+    def error_received(self, exc):
+        logger.debug(f"socket error {exc}")
 
-        print()
-"""
+    def connection_lost(self, exc):
+        """the base class stops the event loop here, which is the shared loop, so only log"""
+        if exc is not None:
+            logger.debug(f"socket closed, {exc}")
 
 def get_ip():
     s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -82,57 +121,425 @@ def get_ip():
         s.close()
     return IP
 
-def discover(search_target, client_callback, force=False, timeout=60):
-    """Start the discovery thread"""
-    logger.debug(f"discover({search_target}, {client_callback}, {force}, {timeout})")
-    ssdp_thread = Thread(target=discover_thread, args=(search_target, client_callback, force, timeout), daemon=True)
-    return ssdp_thread
-
-def discover_thread(search_target, client_callback, force, timeout):
-    """sends the SSDP request packet on the network and waits for responses"""
-    # Start the asyncio loop.
-    if SSDP_ProtocolHandler.callback is not None and force == False:
-        logger.info("discovery already in progress")
-        return
-    
-    ip_address = get_ip()
-    logger.info(f"discovery thread running, ip address is {ip_address}")
-    SSDP_ProtocolHandler.callback = client_callback
-    loop = asyncio.new_event_loop()
-    connect = loop.create_datagram_endpoint(SSDP_ProtocolHandler, local_addr=(ip_address, None), family=socket.AF_INET)
-    transport, protocol = loop.run_until_complete(connect)
-
-    logger.debug("sending SSDP request")
-    # Send out an M-SEARCH callback = client_callbackrequest, requesting all service types.
-    SSDP_PORT = 1900
-    search_request = ssdp.SSDPRequest(
-        "M-SEARCH",
-        headers={
-            "HOST": SSDP_ProtocolHandler.MULTICAST_ADDRESS + ":" + str(SSDP_PORT),
-            "MAN": '"ssdp:discover"',
-            "MX": str(timeout),
-            "ST": search_target,
-            #"ST": "ssdp:all",
-            #"ST": "roku:ecp",
-        },
-    )   
-    sock = transport.get_extra_info('socket')
-    sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, timeout)
-
-    search_request.sendto(transport, (SSDP_ProtocolHandler.MULTICAST_ADDRESS, SSDP_PORT))
-
-    # Keep on running for timeout seconds.
+class Interface:
+    """a local IPv4 interface discovery runs on"""
+    def __init__(self, name, ip_address, network_prefix):
+        self.name = name
+        self.ip_address = ip_address
+        self.network = ipaddress.ip_network(f"{ip_address}/{network_prefix}", strict=False)
+
+    def __repr__(self):
+        return f"{self.name} {self.ip_address}"
+
+def get_interfaces():
+    """returns the interfaces eligible for discovery, every IPv4 address that is neither
+    loopback nor link-local, falling back to the address of the default route"""
+    interfaces = []
+    for adapter in ifaddr.get_adapters():
+        for ip in adapter.ips:
+            if not isinstance(ip.ip, str):
+                continue
+            address = ipaddress.ip_address(ip.ip)
+            if address.is_loopback or address.is_link_local:
+                continue
+            interfaces.append(Interface(adapter.nice_name, ip.ip, ip.network_prefix))
+    if len(interfaces) == 0:
+        interfaces.append(Interface("default", get_ip(), 32))
+    return interfaces
+
+def multicast_socket(interfaces):
+    """creates a socket bound to the SSDP port and joined to the SSDP multicast group on
+    each of the interfaces, to receive the NOTIFY messages devices send"""
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if hasattr(socket, "SO_REUSEPORT"):
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        except OSError:
+            pass
     try:
-        loop.run_until_complete(asyncio.sleep(timeout))
-    except KeyboardInterrupt:
-        pass
+        sock.bind(("", SSDP_PORT))
+    except OSError:
+        sock.close()
+        raise
+    for interface in interfaces:
+        membership = socket.inet_aton(SSDP_ProtocolHandler.MULTICAST_ADDRESS) + socket.inet_aton(interface.ip_address)
+        try:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_ADD_MEMBERSHIP, membership)
+        except OSError as ex:
+            logger.warning(f"cannot join SSDP multicast group on {interface}: {ex}")
+    sock.setblocking(False)
+    return sock
 
-    transport.close()
-    loop.close()
-    SSDP_ProtocolHandler.callback = None
-    logger.info("stopping discovery thread")
+class Search:
+    """one M-SEARCH window with its early completion criteria. The search ends when timeout
+    seconds have elapsed, or earlier once max_devices devices have responded, once no new device
+    has responded for quiet_period seconds, or at the first device whose serial, USN or IP address
+    equals match. finish() ends it from the event loop thread for any other reason, e.g. when a
+    caller has found the device it was looking for by name. Times are event loop (monotonic) times"""
+
+    def __init__(self, timeout, max_devices=None, quiet_period=None, match=None):
+        self.timeout = timeout
+        self.max_devices = max_devices
+        self.quiet_period = quiet_period
+        self.match = match
+        self.devices = set()
+        self.started = None
+        self.first = None
+        self.last = None
+        self.matched = None
+        self.reason = None
+        self.interfaces = {}
+        self.done = asyncio.Event()
+
+    def observe(self, header_dict, now):
+        """records a response, called by the session for every response while the search runs"""
+        if self.done.is_set():
+            return
+        key = get_header(header_dict, "USN") or get_header(header_dict, "LOCATION")
+        if key in self.devices:
+            return
+        self.devices.add(key)
+        if self.first is None:
+            self.first = now
+        self.last = now
+        stats = self.interfaces.setdefault(header_dict.get(INTERFACE), {"devices": 0, "first": None, "last": None})
+        stats["devices"] += 1
+        if stats["first"] is None:
+            stats["first"] = now - self.started
+        stats["last"] = now - self.started
+        if self.match is not None and self.matches(header_dict):
+            self.matched = header_dict
+            self.finish("match")
+        elif self.max_devices is not None and len(self.devices) >= self.max_devices:
+            self.finish("max devices")
+
+    def matches(self, header_dict):
+        usn = get_header(header_dict, "USN") or ""
+        location = urlparse(get_header(header_dict, "LOCATION") or "")
+        return self.match in (usn, DeviceRegistry.get_serial(usn), location.hostname)
+
+    def finish(self, reason="finished"):
+        if not self.done.is_set():
+            self.reason = reason
+            self.done.set()
+
+    async def wait(self, loop):
+        """waits until the search completes by one of its criteria"""
+        deadline = self.started + self.timeout
+        while not self.done.is_set():
+            now = loop.time()
+            if now >= deadline:
+                self.finish("timeout")
+                break
+            wake = deadline
+            if self.quiet_period is not None:
+                quiet_end = (self.last or self.started) + self.quiet_period
+                if quiet_end <= now:
+                    self.finish("quiet period")
+                    break
+                wake = min(wake, quiet_end)
+            try:
+                await asyncio.wait_for(self.done.wait(), wake - now)
+            except asyncio.TimeoutError:
+                pass
+
+    def time_to_first(self):
+        return self.first - self.started if self.first is not None else None
+
+    def time_to_last(self):
+        return self.last - self.started if self.last is not None else None
+
+    def report(self):
+        first = f"{self.time_to_first():.3f}s" if self.first is not None else "-"
+        last = f"{self.time_to_last():.3f}s" if self.last is not None else "-"
+        per_interface = ", ".join(f"{name}: {stats['devices']} devices, first after {stats['first']:.3f}s, last after {stats['last']:.3f}s" for name, stats in self.interfaces.items())
+        return f"{len(self.devices)} devices, first after {first}, last after {last}, ended by {self.reason}" + (f" ({per_interface})" if per_interface else "")
+
+class DiscoveryEngine:
+    """shared SSDP sockets on the shared event loop. Joins the SSDP multicast group once on
+    every interface and keeps one search socket per interface, for as long as at least one
+    DiscoverySession is attached. Each response or NOTIFY is tagged with its interface and
+    routed to every session whose search target it matches, so any number of sessions with
+    different search targets, callbacks and lifetimes discover concurrently"""
+
+    def __init__(self):
+        self.interfaces = []
+        self.listen_transport = None
+        self.search_transports = {}
+        self.sessions = []
+        self.opening = None
+
+    async def attach(self, session):
+        """the first session to attach opens the sockets, sessions attaching while they are
+        being opened wait for the same opening rather than opening them again"""
+        if session in self.sessions:
+            return
+        self.sessions.append(session)
+        if len(self.sessions) == 1:
+            self.opening = asyncio.ensure_future(self.open())
+        await asyncio.shield(self.opening)
+
+    async def detach(self, session):
+        if session not in self.sessions:
+            return
+        self.sessions.remove(session)
+        if len(self.sessions) == 0:
+            if self.opening is not None:
+                await asyncio.gather(self.opening, return_exceptions=True)
+            if len(self.sessions) == 0:
+                await self.close()
+
+    async def open(self):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        await self.close()
+        self.interfaces = get_interfaces()
+        logger.info(f"discovery service running on {self.interfaces}")
+        try:
+            sock = multicast_socket(self.interfaces)
+            self.listen_transport, protocol = await loop.create_datagram_endpoint(lambda: SSDP_ProtocolHandler(self), sock=sock)
+        except OSError as ex:
+            logger.warning(f"cannot listen for NOTIFY on port {SSDP_PORT}: {ex}, using M-SEARCH only")
+        for interface in self.interfaces:
+            try:
+                transport, protocol = await loop.create_datagram_endpoint(lambda: SSDP_ProtocolHandler(self, interface), local_addr=(interface.ip_address, None), family=socket.AF_INET)
+                # multicast egress follows the routing table unless the interface is set explicitly
+                transport.get_extra_info('socket').setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_IF, socket.inet_aton(interface.ip_address))
+                self.search_transports[interface] = transport
+            except OSError as ex:
+                logger.warning(f"cannot search on {interface}: {ex}")
+        get_metrics().observe_discovery("open", loop.time() - started)
+
+    async def close(self):
+        for transport in [self.listen_transport, *self.search_transports.values()]:
+            if transport is not None:
+                transport.close()
+        self.listen_transport = None
+        self.search_transports = {}
+
+    def is_open(self):
+        return len(self.search_transports) > 0
+
+    def send_search(self, search_target, timeout):
+        """sends the SSDP request packet for search_target on every interface at once,
+        responses arrive on the socket of the interface"""
+        logger.debug(f"sending SSDP request for {search_target}")
+        search_request = ssdp.SSDPRequest(
+            "M-SEARCH",
+            headers={
+                "HOST": SSDP_ProtocolHandler.MULTICAST_ADDRESS + ":" + str(SSDP_PORT),
+                "MAN": '"ssdp:discover"',
+                "MX": str(max(1, min(timeout, MX_MAX))),
+                "ST": search_target,
+                #"ST": "ssdp:all",
+                #"ST": "roku:ecp",
+            },
+        )
+        for transport in self.search_transports.values():
+            sock = transport.get_extra_info('socket')
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_MULTICAST_TTL, timeout)
+            search_request.sendto(transport, (SSDP_ProtocolHandler.MULTICAST_ADDRESS, SSDP_PORT))
+
+    def get_interface(self, addr, interface=None):
+        """returns the name of the interface a datagram from addr arrived on. That is the
+        socket's own interface for a search socket, on the shared NOTIFY socket it is inferred
+        as the interface with the most specific network the address is on, or None"""
+        if interface is not None:
+            return interface.name
+        address = ipaddress.ip_address(addr[0])
+        candidates = [interface for interface in self.interfaces if address in interface.network]
+        if len(candidates) == 0:
+            return None
+        return max(candidates, key=lambda interface: interface.network.prefixlen).name
+
+    def response_received(self, header_dict, addr, interface=None):
+        header_dict[INTERFACE] = self.get_interface(addr, interface)
+        target = get_header(header_dict, "ST")
+        for session in list(self.sessions):
+            if session.accepts(target):
+                session.response_received(dict(header_dict))
+
+    def notify_received(self, header_dict, addr, interface=None):
+        header_dict[INTERFACE] = self.get_interface(addr, interface)
+        target = get_header(header_dict, "NT")
+        for session in list(self.sessions):
+            if session.accepts(target):
+                session.notify_received(dict(header_dict))
+
+_engine = None
+
+def get_engine():
+    """returns the process wide discovery engine"""
+    global _engine
+    if _engine is None:
+        _engine = DiscoveryEngine()
+    return _engine
+
+class DiscoverySession:
+    """a discovery client with its own search target (roku:ecp, ssdp:all or any other ST),
+    callbacks and lifetime, sharing the discovery engine's sockets with other sessions.
+    Once started, devices are tracked incrementally from their ssdp:alive and ssdp:byebye
+    NOTIFY messages, an M-SEARCH is only sent by start() and on demand by search().
+    client_callback is called with the headers of every new device, byebye_callback with the
+    headers of a device leaving the network. Callbacks run on the event loop thread and must
+    not block. When a registry is given, responses from devices already in the registry are
+    dropped, and registry entries are revalidated with an M-SEARCH shortly before their
+    advertised max-age lapses, entries that are not seen again by then are expired and passed
+    to byebye_callback. A session with a lifetime closes itself after lifetime seconds.
+    lifecycle_callback is called with SEARCH_STARTED when the session starts searching,
+    DEVICE_FOUND for every new device while it searches and SEARCH_FINISHED once no search
+    is running any more, the second argument is the Search or the device headers"""
+    REVALIDATION_TIMEOUT = 5
+    SEARCH_STARTED = "started"
+    DEVICE_FOUND = "found"
+    SEARCH_FINISHED = "finished"
+
+    def __init__(self, search_target, client_callback, byebye_callback=None, registry=None, timeout=60, lifetime=None, engine=None, lifecycle_callback=None):
+        self.search_target = search_target
+        self.client_callback = client_callback
+        self.byebye_callback = byebye_callback
+        self.lifecycle_callback = lifecycle_callback
+        self.registry = registry
+        self.timeout = timeout
+        self.lifetime = lifetime
+        self.engine = engine or get_engine()
+        self.attached = False
+        self.searches = []
+        self.housekeeping_handle = None
+        self.lifetime_handle = None
+
+    def start(self, **criteria):
+        """attaches to the engine and sends the initial M-SEARCH, returns a concurrent future
+        that resolves to the initial Search once it completes"""
+        return self.search(**criteria)
+
+    def search(self, timeout=None, **criteria):
+        """sends an M-SEARCH from any thread, returns a concurrent future that resolves to
+        the completed Search, criteria are the Search early completion criteria"""
+        return asyncio.run_coroutine_threadsafe(self.search_async(timeout, **criteria), eventloop.get_loop())
+
+    def is_searching(self):
+        return len(self.searches) > 0
+
+    def stop(self):
+        eventloop.run(self.close())
+
+    def accepts(self, target):
+        return self.search_target == "ssdp:all" or target == self.search_target
+
+    async def attach(self):
+        if self.attached:
+            return
+        await self.engine.attach(self)
+        self.attached = True
+        if self.lifetime is not None:
+            self.lifetime_handle = asyncio.get_running_loop().call_later(self.lifetime, lambda: asyncio.ensure_future(self.close()))
+
+    async def close(self):
+        for handle in (self.housekeeping_handle, self.lifetime_handle):
+            if handle is not None:
+                handle.cancel()
+        self.housekeeping_handle = None
+        self.lifetime_handle = None
+        for search in self.searches:
+            search.finish("session closed")
+        if self.attached:
+            self.attached = False
+            await self.engine.detach(self)
+
+    async def search_async(self, timeout=None, **criteria):
+        """sends the SSDP request packet on the network and waits up to timeout seconds
+        for responses, returns the completed Search"""
+        timeout = timeout or self.timeout
+        await self.attach()
+        if self.registry is not None and not self.is_searching():
+            self.registry.reset_stats()
+        loop = asyncio.get_running_loop()
+        search = Search(timeout, **criteria)
+        search.started = loop.time()
+        self.searches.append(search)
+        if len(self.searches) == 1:
+            self.lifecycle(DiscoverySession.SEARCH_STARTED, search)
+        self.engine.send_search(self.search_target, timeout)
+
+        # Keep on listening until the search completes
+        try:
+            await search.wait(loop)
+        finally:
+            search.finish("cancelled")
+            self.searches.remove(search)
+            self.observe(search, loop.time())
+            if self.registry is not None and not self.is_searching():
+                logger.info(f"discovery dedup stats: {self.registry.stats()}")
+            logger.info(f"search for {self.search_target} complete: {search.report()}")
+            if not self.is_searching():
+                self.lifecycle(DiscoverySession.SEARCH_FINISHED, search)
+        return search
+
+    def observe(self, search, now):
+        """records the search's phases in the metrics"""
+        metrics = get_metrics()
+        metrics.observe_discovery("search", now - search.started)
+        if search.first is not None:
+            metrics.observe_discovery("first_response", search.time_to_first())
+            metrics.observe_discovery("last_response", search.time_to_last())
+
+    def lifecycle(self, event, detail):
+        if self.lifecycle_callback is not None:
+            self.lifecycle_callback(event, detail)
+
+    def response_received(self, header_dict):
+        now = asyncio.get_running_loop().time()
+        for search in self.searches:
+            search.observe(header_dict, now)
+        if self.registry is not None:
+            status = self.registry.observe(header_dict)
+            self.schedule_housekeeping()
+            if status == DeviceRegistry.KNOWN:
+                return
+        if self.is_searching():
+            self.lifecycle(DiscoverySession.DEVICE_FOUND, header_dict)
+        self.client_callback(header_dict)
+
+    def schedule_housekeeping(self):
+        """arms a timer for the registry's next revalidation or expiry deadline"""
+        deadline = self.registry.next_deadline()
+        if self.housekeeping_handle is not None:
+            if deadline is not None and self.housekeeping_handle.when() <= deadline:
+                return
+            self.housekeeping_handle.cancel()
+            self.housekeeping_handle = None
+        if deadline is not None and self.attached:
+            loop = asyncio.get_running_loop()
+            self.housekeeping_handle = loop.call_at(max(deadline, loop.time()), self.housekeeping)
+
+    def housekeeping(self):
+        """expires lapsed registry entries and revalidates the entries about to lapse"""
+        self.housekeeping_handle = None
+        expired, revalidate = self.registry.housekeeping()
+        for entry in expired:
+            logger.info(f"expired: {entry.usn} at {entry.location}")
+            if self.byebye_callback is not None:
+                self.byebye_callback(entry.headers)
+        if revalidate:
+            logger.info("revalidating devices about to expire")
+            asyncio.ensure_future(self.search_async(DiscoverySession.REVALIDATION_TIMEOUT))
+        self.schedule_housekeeping()
+
+    def notify_received(self, header_dict):
+        match get_header(header_dict, "NTS"):
+            case "ssdp:alive":
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug(f"alive: {get_header(header_dict, 'USN')} at {get_header(header_dict, 'LOCATION')}")
+                self.response_received(header_dict)
+            case "ssdp:byebye":
+                logger.info(f"byebye: {get_header(header_dict, 'USN')}")
+                if self.registry is not None:
+                    self.registry.forget(get_header(header_dict, "USN"))
+                    self.schedule_housekeeping()
+                if self.byebye_callback is not None:
+                    self.byebye_callback(header_dict)
 
 if __name__ == "__main__":
     main()
-    
-    
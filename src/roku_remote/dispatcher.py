@@ -0,0 +1,125 @@
+import logging
+import time
+from queue import Queue
+from threading import Lock, Thread
+from weakref import WeakSet
+
+logger = logging.getLogger("main.dispatcher")
+
+class Dispatcher:
+    """runs commands for Roku devices in the background. Each device gets its own ordered
+    queue and worker thread, so commands to one device run in strict submission order while
+    a slow or unreachable device never blocks the caller or the other devices. When a command
+    finishes, the notify callback is called on the worker thread with the completed Command,
+    the caller is responsible for handing it over to its own thread"""
+
+    class Command:
+        """a queued call of function(*args) for a device, with its outcome and timings"""
+        def __init__(self, roku, function, args, callback):
+            self.roku = roku
+            self.function = function
+            self.args = args
+            self.callback = callback
+            self.result = None
+            self.exception = None
+            self.submitted = time.monotonic()
+            self.started = None
+            self.finished = None
+
+        def latency(self):
+            return self.finished - self.started if self.finished is not None else None
+
+        def __repr__(self):
+            return f"{getattr(self.function, '__name__', self.function)}{self.args}"
+
+    class DeviceQueue:
+        """ordered command queue and worker thread for a single device"""
+        def __init__(self, dispatcher, roku):
+            self.dispatcher = dispatcher
+            self.roku = roku
+            self.queue = Queue()
+            self.in_flight = 0
+            self.submitted = 0
+            self.completed = 0
+            self.failed = 0
+            self.max_depth = 0
+            self.thread = Thread(target=self.worker_thread, daemon=True)
+            self.thread.start()
+
+        def put(self, command):
+            """called with the dispatcher's lock held"""
+            self.submitted += 1
+            self.dispatcher.outstanding += 1
+            self.queue.put(command)
+            self.max_depth = max(self.max_depth, self.queue.qsize())
+
+        def worker_thread(self):
+            while True:
+                command = self.queue.get()
+                if command is None:
+                    break
+                self.in_flight = 1
+                command.started = time.monotonic()
+                try:
+                    command.result = command.function(*command.args)
+                    self.completed += 1
+                except Exception as ex:
+                    command.exception = ex
+                    self.failed += 1
+                    logger.error(f"exception {ex} in {command} for roku {self.roku.get_name()}")
+                command.finished = time.monotonic()
+                self.in_flight = 0
+                # notify before decrementing outstanding, so a caller seeing no outstanding
+                # commands is guaranteed to have been notified of every completion
+                self.dispatcher.notify(command)
+                with self.dispatcher.lock:
+                    self.dispatcher.outstanding -= 1
+
+        def stats(self):
+            return {
+                "depth": self.queue.qsize(),
+                "in_flight": self.in_flight,
+                "max_depth": self.max_depth,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+            }
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.lock = Lock()
+        self.queues = {}
+        self.removed = WeakSet()
+        self.outstanding = 0
+
+    def submit(self, roku, function, *args, callback=None):
+        """queues function(*args) to run on roku's worker and returns the Command immediately.
+        Returns None without running it once roku has been removed"""
+        command = Dispatcher.Command(roku, function, args, callback)
+        with self.lock:
+            if roku in self.removed:
+                logger.debug(f"dropped {command} for removed roku {roku.get_name()}")
+                return None
+            device_queue = self.queues.get(roku)
+            if device_queue is None:
+                device_queue = self.queues[roku] = Dispatcher.DeviceQueue(self, roku)
+            device_queue.put(command)
+        logger.debug(f"submitted {command} to roku {roku.get_name()} depth {device_queue.queue.qsize()}")
+        return command
+
+    def remove(self, roku):
+        """stops roku's worker once the commands already queued for it have run, commands
+        submitted for roku afterwards are dropped"""
+        with self.lock:
+            self.removed.add(roku)
+            device_queue = self.queues.pop(roku, None)
+            if device_queue is not None:
+                device_queue.queue.put(None)
+
+    def pending(self):
+        """number of commands submitted but not yet completed across all devices"""
+        return self.outstanding
+
+    def stats(self):
+        """queue depth and in-flight metrics for each device, keyed by device name"""
+        return {roku.get_name(): device_queue.stats() for roku, device_queue in list(self.queues.items())}
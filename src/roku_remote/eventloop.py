@@ -0,0 +1,28 @@
+import asyncio
+import logging
+from threading import Lock, Thread
+
+logger = logging.getLogger("main.eventloop")
+
+_loop = None
+_lock = Lock()
+
+def get_loop():
+    """returns the shared asyncio event loop, starting its daemon thread on first use.
+    All asynchronous ECP and discovery work in the process runs on this one loop"""
+    global _loop
+    with _lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            Thread(target=_loop.run_forever, name="roku-event-loop", daemon=True).start()
+            logger.debug("shared event loop started")
+    return _loop
+
+def run(coro, timeout=None):
+    """runs coro on the shared event loop and blocks the calling thread until it completes.
+    Must not be called from the event loop thread itself"""
+    return asyncio.run_coroutine_threadsafe(coro, get_loop()).result(timeout)
+
+def call_soon(callback, *args):
+    """schedules callback(*args) on the shared event loop from any thread"""
+    get_loop().call_soon_threadsafe(callback, *args)
@@ -0,0 +1,81 @@
+import asyncio
+import logging
+import time
+
+from roku_remote import eventloop
+
+logger = logging.getLogger("main.fanout")
+
+class Broadcast:
+    """sends the same command to many devices in parallel on the shared event loop. At most
+    concurrency devices are sent to at once and each send is abandoned after timeout seconds,
+    so a stuck device costs at most one timeout and never delays the results of the others.
+    Commands are AsyncRoku method names, e.g. send_keypress, with their arguments"""
+    CONCURRENCY = 8
+    TIMEOUT = 5
+    OK_STATUS = (200, 202)
+
+    class Result:
+        """the outcome of a command on one device"""
+        def __init__(self, roku):
+            self.roku = roku
+            self.status = None
+            self.exception = None
+            self.latency = None
+            self.timed_out = False
+
+        def ok(self):
+            return self.exception is None and self.status in Broadcast.OK_STATUS
+
+        def get_outcome(self):
+            if self.timed_out:
+                return "timed out"
+            if self.exception is not None:
+                return f"error {self.exception}"
+            return f"status {self.status}"
+
+        def __repr__(self):
+            return f"{self.roku.get_name()}: {self.get_outcome()}"
+
+    def __init__(self, concurrency=CONCURRENCY, timeout=TIMEOUT):
+        self.concurrency = concurrency
+        self.timeout = timeout
+
+    def send(self, rokus, method, *args):
+        """sends to Roku facades and blocks the calling thread until every device has answered
+        or timed out, returns a Result per device in the order of rokus"""
+        return eventloop.run(self.send_async([roku.async_roku for roku in rokus], method, *args))
+
+    def submit(self, rokus, method, *args):
+        """sends to Roku facades without blocking, returns a concurrent future of the Results"""
+        return asyncio.run_coroutine_threadsafe(self.send_async([roku.async_roku for roku in rokus], method, *args), eventloop.get_loop())
+
+    async def send_async(self, rokus, method, *args):
+        """sends to AsyncRokus on the running loop, returns a Result per device in order"""
+        semaphore = asyncio.Semaphore(self.concurrency)
+        return await asyncio.gather(*[self.send_one(semaphore, roku, method, args) for roku in rokus])
+
+    async def send_one(self, semaphore, roku, method, args):
+        result = Broadcast.Result(roku)
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                result.status = await asyncio.wait_for(getattr(roku, method)(*args), self.timeout)
+            except asyncio.TimeoutError:
+                result.timed_out = True
+                result.exception = TimeoutError(f"no answer in {self.timeout}s")
+            except Exception as ex:
+                result.exception = ex
+            result.latency = time.perf_counter() - started
+        if not result.ok():
+            logger.info(f"{method}{args} on {roku.get_name()}: {result.get_outcome()}")
+        return result
+
+    @staticmethod
+    def format(results):
+        """returns the Results as a text table of device, outcome and latency"""
+        width = max([len(result.roku.get_name()) for result in results] + [6])
+        lines = [f"{'device':<{width}}  {'result':<20}  latency"]
+        for result in results:
+            lines.append(f"{result.roku.get_name():<{width}}  {result.get_outcome():<20}  {result.latency * 1000:7.1f} ms")
+        return "\n".join(lines)
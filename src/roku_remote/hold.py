@@ -0,0 +1,126 @@
+import logging
+import time
+from weakref import WeakSet
+
+logger = logging.getLogger("main.hold")
+
+class KeyHold:
+    """turns key and mouse button presses into ECP requests on the Tk thread. A quick tap
+    sends one keypress. Holding a scrolling key (D-pad, volume, rewind/forward, channel)
+    for HOLD_DELAY ms sends keydown, the device then repeats by itself until the keyup sent
+    on release, so a long scroll costs two requests. Auto-repeat is coalesced: X11 reports
+    it as release/press pairs, so a release is acted on only after RELEASE_DELAY ms without
+    a new press, and other platforms repeat presses without releases. Repeats of keys that
+    cannot be held are sent at most once every REPEAT_INTERVAL seconds. A keydown is never
+    leaked: the key is released after WATCHDOG ms, by release_all() on focus loss or device
+    change, and a keyup that fails is retried once after RETRY_DELAY ms"""
+    HOLD_DELAY = 300
+    RELEASE_DELAY = 40
+    REPEAT_INTERVAL = 0.2
+    WATCHDOG = 30000
+    RETRY_DELAY = 1000
+    HOLDABLE = {"Up", "Down", "Left", "Right", "Rev", "Fwd", "VolumeUp", "VolumeDown", "ChannelUp", "ChannelDown", "Backspace"}
+
+    class Held:
+        """a key that is down, with the device it was pressed for and its pending timers"""
+        def __init__(self, roku, key):
+            self.roku = roku
+            self.key = key
+            self.down = False
+            self.hold_timer = None
+            self.release_timer = None
+            self.watchdog = None
+            self.last_sent = None
+
+    def __init__(self, window, submit):
+        """submit(function, *args, roku=roku, callback=callback) queues an ECP call for roku"""
+        self.window = window
+        self.submit = submit
+        self.held = {}
+        self.released = WeakSet()
+        self.sent = 0
+        self.coalesced = 0
+
+    def press(self, roku, key):
+        held = self.held.get(key)
+        if held is not None:
+            if held.release_timer is not None:
+                self.window.after_cancel(held.release_timer)
+                held.release_timer = None
+            self.repeat(held)
+            return
+        held = self.held[key] = KeyHold.Held(roku, key)
+        if key in KeyHold.HOLDABLE:
+            held.hold_timer = self.window.after(KeyHold.HOLD_DELAY, self.hold, held)
+        else:
+            self.send(held, held.roku.send_keypress)
+        held.watchdog = self.window.after(KeyHold.WATCHDOG, self.expire, held)
+
+    def repeat(self, held):
+        """an auto-repeat of a key that is down, a held key's device repeats by itself"""
+        now = time.monotonic()
+        if held.key in KeyHold.HOLDABLE or now - held.last_sent < KeyHold.REPEAT_INTERVAL:
+            self.coalesced += 1
+            return
+        self.send(held, held.roku.send_keypress)
+
+    def hold(self, held):
+        held.hold_timer = None
+        held.down = True
+        self.send(held, held.roku.send_keydown)
+
+    def release(self, key):
+        held = self.held.get(key)
+        if held is not None and held.release_timer is None:
+            held.release_timer = self.window.after(KeyHold.RELEASE_DELAY, self.finish, held)
+
+    def release_all(self):
+        """releases every key that is down right away"""
+        for held in list(self.held.values()):
+            self.finish(held)
+
+    def forget(self, roku):
+        """releases the keys held for a device that is going away, a failed keyup is then no
+        longer retried on it"""
+        for held in list(self.held.values()):
+            if held.roku is roku:
+                self.finish(held)
+        self.released.add(roku)
+
+    def expire(self, held):
+        held.watchdog = None
+        logger.info(f"releasing {held.key} on roku {held.roku.get_name()} held for {KeyHold.WATCHDOG}ms")
+        self.finish(held)
+
+    def finish(self, held):
+        if self.held.get(held.key) is not held:
+            return
+        del self.held[held.key]
+        for timer in (held.release_timer, held.watchdog):
+            if timer is not None:
+                self.window.after_cancel(timer)
+        if held.hold_timer is not None:
+            # released before it became a hold, a tap
+            self.window.after_cancel(held.hold_timer)
+            self.send(held, held.roku.send_keypress)
+        elif held.down:
+            self.send(held, held.roku.send_keyup, callback=self.keyup_completed)
+        if self.coalesced:
+            logger.debug(f"{held.key}: {self.sent} requests sent, {self.coalesced} repeats coalesced")
+
+    def send(self, held, function, callback=None):
+        held.last_sent = time.monotonic()
+        self.sent += 1
+        self.submit(function, held.key, roku=held.roku, callback=callback)
+
+    def keyup_completed(self, command):
+        """retries a failed keyup once, so a dropped connection does not leave the key down"""
+        if command.roku in self.released:
+            return
+        if command.exception is not None or command.result not in (200, 202):
+            logger.info(f"keyup {command.args[0]} failed on roku {command.roku.get_name()}, retrying")
+            self.window.after(KeyHold.RETRY_DELAY, self.retry_keyup, command)
+
+    def retry_keyup(self, command):
+        if command.roku not in self.released:
+            self.submit(command.roku.send_keyup, *command.args, roku=command.roku)
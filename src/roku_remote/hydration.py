@@ -0,0 +1,52 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("main.hydration")
+
+class Hydrator:
+    """bounded concurrent hydration stage for discovered devices. Each SSDP response handed
+    to submit() is turned into a Roku on a worker thread, fetching its device-info, within a
+    per-device deadline. Hydrated devices are passed to on_ready as soon as they finish, so the
+    fastest devices are registered first and a dead device only occupies one worker"""
+    MAX_WORKERS = 8
+    DEADLINE = 5
+
+    def __init__(self, on_ready, on_failed=None, max_workers=MAX_WORKERS, deadline=DEADLINE):
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        self.deadline = deadline
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hydrate")
+
+    def submit(self, headers):
+        """queues a device for hydration and returns immediately"""
+        self.executor.submit(self.hydrate, headers, time.monotonic() + self.deadline)
+
+    def hydrate(self, headers, deadline):
+        # imported here, aiohttp and lxml are not needed before the first device appears
+        from roku_remote.roku import Roku
+        start = time.monotonic()
+        roku = None
+        try:
+            remaining = deadline - start
+            if remaining <= 0:
+                raise TimeoutError("deadline expired while queued")
+            # the socket timeouts alone don't bound a device that answers slowly, hydrate_timeout
+            # does, and the constructor closes the device's session if it expires
+            roku = Roku(headers, timeout=(min(Roku.TIMEOUT[0], remaining), remaining), hydrate_timeout=remaining)
+            # the static fields below come from the device-info fetched by the constructor
+            logger.info(f"hydrated {roku.get_description()} {roku.get_name()} {roku.get_device_info('friendly-model-name')} at {roku.get_api_url()} in {time.monotonic() - start:.3f}s")
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"hydration took {time.monotonic() - start:.3f}s")
+            roku.timeout = Roku.TIMEOUT
+        except Exception as ex:
+            logger.error(f"exception {ex!r} hydrating device at {headers.get('LOCATION')}")
+            if roku is not None:
+                roku.close()
+            if self.on_failed is not None:
+                self.on_failed(headers, ex)
+            return
+        self.on_ready(roku)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,142 @@
+import asyncio
+import logging
+import shlex
+import time
+
+from roku_remote import eventloop
+
+logger = logging.getLogger("main.macro")
+
+class Macro:
+    """a recorded sequence of remote actions with their times. Each action is an AsyncRoku
+    send_ method without the send_ prefix and its arguments, e.g. keypress Lit_a, keydown Up,
+    key_home or launch_channel 12. Times are seconds after the first action. The file format
+    is one action per line, the time in seconds followed by the action, # starts a comment:
+
+        # roku_remote macro 1
+        0.000 key_home
+        1.532 keydown Up
+        2.210 keyup Up
+        4.006 launch_channel 12
+    """
+    HEADER = "# roku_remote macro 1"
+    PREFIX = "send_"
+
+    def __init__(self, actions=None):
+        self.actions = actions or []
+        self.started = None
+
+    def record(self, name, args):
+        """records a call of the send_ method name with args, other calls are ignored"""
+        if not name.startswith(Macro.PREFIX):
+            return
+        now = time.monotonic()
+        if self.started is None:
+            self.started = now
+        self.actions.append((now - self.started, name[len(Macro.PREFIX):], tuple(str(arg) for arg in args)))
+
+    def get_duration(self):
+        return self.actions[-1][0] if self.actions else 0
+
+    def __len__(self):
+        return len(self.actions)
+
+    def save(self, path):
+        with open(path, "w") as file:
+            file.write(self.format())
+
+    def format(self):
+        lines = [Macro.HEADER]
+        for offset, action, args in self.actions:
+            lines.append(f"{offset:.3f} {shlex.join((action,) + args)}")
+        return "\n".join(lines) + "\n"
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            return cls.parse(file.read())
+
+    @classmethod
+    def parse(cls, text):
+        """parses the file format, raises ValueError for a malformed line"""
+        actions = []
+        for number, line in enumerate(text.splitlines(), 1):
+            fields = shlex.split(line, comments=True)
+            if len(fields) == 0:
+                continue
+            try:
+                offset = float(fields[0])
+                action = fields[1]
+            except (ValueError, IndexError):
+                raise ValueError(f"line {number}: expected time and action, got {line!r}")
+            if not action.isidentifier() or (actions and offset < actions[-1][0]):
+                raise ValueError(f"line {number}: bad action or time going backwards in {line!r}")
+            actions.append((offset, action, tuple(fields[2:])))
+        return cls(actions)
+
+
+class MacroPlayer:
+    """replays a Macro against any number of devices at once. Every device plays the macro in
+    its own task on the shared event loop, so a slow device never holds up the others. Each
+    action is scheduled on the loop's monotonic clock at start + time * scale, absolute rather
+    than relative to the previous action so delays do not accumulate. With compensate the
+    action is sent early by a moving average of that device's request latency, so it takes
+    effect on the device close to its scheduled time. The first action has no latency to go
+    by and is sent on time"""
+    TIMEOUT = 5
+    START_DELAY = 0.1
+    SMOOTHING = 0.25
+
+    class Playback:
+        """what happened when one device played the macro"""
+        def __init__(self, roku):
+            self.roku = roku
+            self.latencies = []
+            self.errors = []
+            self.failed = 0
+            self.lead = 0
+
+    def __init__(self, macro, scale=1.0, compensate=True, timeout=TIMEOUT):
+        self.macro = macro
+        self.scale = scale
+        self.compensate = compensate
+        self.timeout = timeout
+
+    @staticmethod
+    def get_lead(lead, latency, first):
+        """the moving average of request latency, seeded with the first request's latency so
+        the second action is already compensated in full"""
+        if first:
+            return latency
+        return lead + MacroPlayer.SMOOTHING * (latency - lead)
+
+    def submit(self, rokus):
+        """plays on Roku facades without blocking, returns a concurrent future of the Playbacks"""
+        return asyncio.run_coroutine_threadsafe(self.play_async([roku.async_roku for roku in rokus]), eventloop.get_loop())
+
+    async def play_async(self, rokus):
+        """plays on AsyncRokus and returns a Playback per device in order"""
+        start = asyncio.get_running_loop().time() + MacroPlayer.START_DELAY
+        return await asyncio.gather(*[self.play_one(roku, start) for roku in rokus])
+
+    async def play_one(self, roku, start):
+        loop = asyncio.get_running_loop()
+        playback = MacroPlayer.Playback(roku)
+        for offset, action, args in self.macro.actions:
+            due = start + offset * self.scale
+            delay = due - (playback.lead if self.compensate else 0) - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            sent = loop.time()
+            try:
+                status = await asyncio.wait_for(getattr(roku, Macro.PREFIX + action)(*args), self.timeout)
+            except Exception as ex:
+                logger.error(f"exception {ex!r} in {action}{args} for roku {roku.get_name()}")
+                status = None
+            done = loop.time()
+            if status not in (200, 202):
+                playback.failed += 1
+            playback.lead = MacroPlayer.get_lead(playback.lead, done - sent, len(playback.latencies) == 0)
+            playback.latencies.append(done - sent)
+            playback.errors.append(done - due)
+        return playback
@@ -1,21 +1,28 @@
 import logging
-import tkinter as tk
 
 import click
 
 from roku_remote import __version__
-from roku_remote.app import App
-from roku_remote.discover import discover
+from roku_remote.startup import StartupProfile
 
 CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
 
 @click.command(context_settings=CONTEXT_SETTINGS, options_metavar="<options>")
 @click.option("--log-level", help="Log level (default: error)", type=click.Choice(["debug", "info", "error"]), default="error")
 @click.option("--timeout", help="length of time in seconds to keep listening for devices, default 60s", type=click.INT, default=60)
+@click.option("--push/--no-push", help="subscribe to device ECP push notifications, falls back to polling when unsupported (default: push)", default=True)
+@click.option("--ecp-auth-key", help="key used to answer the ECP session authentication challenge (default: the well known key)", default=None)
+@click.option("--profile-startup", help="report import, widget construction and image load times and the time to first frame", is_flag=True)
+@click.option("--metrics-file", help="on exit write ECP request and discovery metrics to this file, Prometheus text if it ends in .prom, json otherwise", type=click.Path(dir_okay=False, writable=True), default=None)
 
-def main(timeout, log_level):
+def main(timeout, log_level, push, ecp_auth_key, profile_startup, metrics_file):
     """main python application entrypoint. Creates the Tk window, creates the App gui
-    and starts the SSDP discovery thread passing the application registration callback"""
+    and starts the SSDP discovery session once the first frame is up, the discovery session
+    calls the application registration callbacks"""
+    # the gui modules are imported below rather than at module level, so they can be timed
+    profile = StartupProfile()
+    if profile_startup:
+        profile.install()
     format = "%(asctime)s %(levelname)-8s %(message)s"
     if log_level == "debug":
         level = logging.DEBUG
@@ -32,12 +39,27 @@ def main(timeout, log_level):
     logger.info(f"roku {__version__}")
     logger.info(f"looking for roku devices on network for {timeout} seconds ...")
 
-    root = tk.Tk()
-    app = App(root, timeout)
-    ssdp_thread = discover("roku:ecp", app.register_device, force=False, timeout=timeout)
-    app.set_discover_thread(ssdp_thread)
-    ssdp_thread.start()
+    with profile.phase("import gui"):
+        import tkinter as tk
+        from roku_remote.app import App
+    with profile.phase("create Tk root"):
+        root = tk.Tk()
+    with profile.phase("create App and widgets"):
+        app = App(root, timeout, push, ecp_auth_key)
+    profile.record(f"image loads ({app.images.loads}, included above)", app.images.load_seconds)
+    profile.uninstall()
+
+    def first_frame():
+        root.unbind("<Map>")
+        if profile.frame_shown() and profile_startup:
+            click.echo(profile.report())
+    # the first frame is drawn by the idle handlers queued when the window is mapped
+    root.bind("<Map>", lambda event: root.after_idle(first_frame))
+    root.after_idle(app.start_discovery)
     root.mainloop()
+    if metrics_file is not None:
+        from roku_remote.metrics import get_metrics
+        get_metrics().save(metrics_file)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
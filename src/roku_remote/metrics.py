@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from threading import Lock
+from urllib.parse import urlparse
+
+logger = logging.getLogger("main.metrics")
+
+class Histogram:
+    """latency histogram with fixed bucket upper bounds in seconds, as Prometheus counts them"""
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self):
+        self.counts = [0] * (len(Histogram.BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0
+        self.max = 0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(Histogram.BUCKETS, seconds)] += 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def merge(self, other):
+        self.counts = [count + other_count for count, other_count in zip(self.counts, other.counts)]
+        self.count += other.count
+        self.sum += other.sum
+        self.max = max(self.max, other.max)
+
+    def get_percentile(self, percent):
+        """returns the upper bound of the bucket holding the percentile, the max for the last"""
+        if self.count == 0:
+            return None
+        rank = self.count * percent / 100
+        seen = 0
+        for bound, count in zip(Histogram.BUCKETS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def snapshot(self):
+        return {
+            "count": self.count,
+            "sum_s": self.sum,
+            "mean_ms": self.sum / self.count * 1000 if self.count else None,
+            "p50_ms": self.get_percentile(50) * 1000 if self.count else None,
+            "p95_ms": self.get_percentile(95) * 1000 if self.count else None,
+            "max_ms": self.max * 1000,
+            "buckets": {str(bound): count for bound, count in zip(Histogram.BUCKETS + ("+Inf",), self.counts)},
+        }
+
+
+class Metrics:
+    """process wide latency, error and connection metrics, recorded on the hot path of every
+    ECP request and discovery search. Requests are keyed by device and endpoint, the first path
+    segment(s) of the url such as keypress or query/device-info, so that keys and channel ids
+    do not multiply the series. Recording is thread-safe and cheap: a lock, a bisect and a few
+    additions. Use get_metrics() for the shared instance"""
+    PREFIX = "roku_remote"
+
+    class Sample:
+        """filled in by the measured code, status is the HTTP status when there is one"""
+        def __init__(self):
+            self.status = None
+
+    def __init__(self):
+        self.lock = Lock()
+        self.started = time.time()
+        self.requests = {}
+        self.errors = {}
+        self.connections = {}
+        self.discovery = {}
+
+    @staticmethod
+    def get_endpoint(url):
+        parts = [part for part in urlparse(url).path.split("/") if part]
+        if len(parts) == 0:
+            return "/"
+        if parts[0] == "query" and len(parts) > 1:
+            return f"query/{parts[1]}"
+        return parts[0]
+
+    @contextmanager
+    def measure(self, device, url):
+        """times the request to url made inside the with block, an exception or a status other
+        than 200 to 299 or 304 counts as an error. A request abandoned by its caller, e.g. at a
+        wait_for timeout, is cancelled and counts as a cancelled error"""
+        sample = Metrics.Sample()
+        started = time.perf_counter()
+        try:
+            yield sample
+        except asyncio.CancelledError:
+            self.observe_request(device, Metrics.get_endpoint(url), time.perf_counter() - started, error="cancelled")
+            raise
+        except Exception as ex:
+            self.observe_request(device, Metrics.get_endpoint(url), time.perf_counter() - started, error=type(ex).__name__)
+            raise
+        self.observe_request(device, Metrics.get_endpoint(url), time.perf_counter() - started, sample.status)
+
+    def observe_request(self, device, endpoint, seconds, status=None, error=None):
+        if error is None and status is not None and not (200 <= status < 300 or status == 304):
+            error = str(status)
+        with self.lock:
+            histogram = self.requests.get((device, endpoint))
+            if histogram is None:
+                histogram = self.requests[(device, endpoint)] = Histogram()
+            histogram.observe(seconds)
+            if error is not None:
+                key = (device, endpoint, error)
+                self.errors[key] = self.errors.get(key, 0) + 1
+
+    def observe_connection(self, device, reused):
+        with self.lock:
+            counts = self.connections.setdefault(device, {"created": 0, "reused": 0})
+            counts["reused" if reused else "created"] += 1
+
+    def observe_discovery(self, phase, seconds):
+        """records a discovery phase, e.g. the whole search or the time to its first response"""
+        with self.lock:
+            histogram = self.discovery.get(phase)
+            if histogram is None:
+                histogram = self.discovery[phase] = Histogram()
+            histogram.observe(seconds)
+
+    def rename(self, device, name):
+        """moves everything recorded for device to name, e.g. from a device's address to its
+        friendly name once it is known"""
+        with self.lock:
+            for key in [key for key in self.requests if key[0] == device]:
+                histogram = self.requests.pop(key)
+                self.requests.setdefault((name, key[1]), Histogram()).merge(histogram)
+            for key in [key for key in self.errors if key[0] == device]:
+                renamed = (name,) + key[1:]
+                self.errors[renamed] = self.errors.get(renamed, 0) + self.errors.pop(key)
+            if device in self.connections:
+                counts = self.connections.pop(device)
+                renamed = self.connections.setdefault(name, {"created": 0, "reused": 0})
+                for state, count in counts.items():
+                    renamed[state] += count
+
+    def get_trace_config(self, get_device):
+        """returns an aiohttp TraceConfig that counts new and reused pooled connections for the
+        device named by get_device()"""
+        import aiohttp
+
+        async def created(session, context, params):
+            self.observe_connection(get_device(), False)
+
+        async def reused(session, context, params):
+            self.observe_connection(get_device(), True)
+
+        trace_config = aiohttp.TraceConfig()
+        trace_config.on_connection_create_end.append(created)
+        trace_config.on_connection_reuseconn.append(reused)
+        return trace_config
+
+    def reset(self):
+        with self.lock:
+            self.started = time.time()
+            self.requests = {}
+            self.errors = {}
+            self.connections = {}
+            self.discovery = {}
+
+    def snapshot(self):
+        """returns the metrics as plain data, ready for json"""
+        with self.lock:
+            return {
+                "uptime_s": time.time() - self.started,
+                "requests": [{"device": device, "endpoint": endpoint, **histogram.snapshot()} for (device, endpoint), histogram in sorted(self.requests.items())],
+                "errors": [{"device": device, "endpoint": endpoint, "error": error, "count": count} for (device, endpoint, error), count in sorted(self.errors.items())],
+                "connections": [{"device": device, **counts} for device, counts in sorted(self.connections.items())],
+                "discovery": [{"phase": phase, **histogram.snapshot()} for phase, histogram in sorted(self.discovery.items())],
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """returns the metrics in the Prometheus text exposition format"""
+        def escape(value):
+            return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+        def labels(**values):
+            return "{" + ",".join(f'{name}="{escape(value)}"' for name, value in values.items()) + "}"
+
+        def histogram_lines(name, histogram, **values):
+            cumulative = 0
+            for bound, count in zip(Histogram.BUCKETS + ("+Inf",), histogram.counts):
+                cumulative += count
+                lines.append(f"{name}_bucket{labels(**values, le=bound)} {cumulative}")
+            lines.append(f"{name}_sum{labels(**values)} {histogram.sum}")
+            lines.append(f"{name}_count{labels(**values)} {histogram.count}")
+
+        prefix = Metrics.PREFIX
+        lines = []
+        with self.lock:
+            lines.append(f"# HELP {prefix}_request_seconds ECP request latency by device and endpoint")
+            lines.append(f"# TYPE {prefix}_request_seconds histogram")
+            for (device, endpoint), histogram in sorted(self.requests.items()):
+                histogram_lines(f"{prefix}_request_seconds", histogram, device=device, endpoint=endpoint)
+            lines.append(f"# HELP {prefix}_request_errors_total failed ECP requests by device, endpoint and status or exception")
+            lines.append(f"# TYPE {prefix}_request_errors_total counter")
+            for (device, endpoint, error), count in sorted(self.errors.items()):
+                lines.append(f"{prefix}_request_errors_total{labels(device=device, endpoint=endpoint, error=error)} {count}")
+            lines.append(f"# HELP {prefix}_connections_total pooled connections to each device, created or reused")
+            lines.append(f"# TYPE {prefix}_connections_total counter")
+            for device, counts in sorted(self.connections.items()):
+                for state, count in counts.items():
+                    lines.append(f"{prefix}_connections_total{labels(device=device, state=state)} {count}")
+            lines.append(f"# HELP {prefix}_discovery_seconds discovery phase durations")
+            lines.append(f"# TYPE {prefix}_discovery_seconds histogram")
+            for phase, histogram in sorted(self.discovery.items()):
+                histogram_lines(f"{prefix}_discovery_seconds", histogram, phase=phase)
+        return "\n".join(lines) + "\n"
+
+    def export(self, format):
+        """returns the metrics as json or prometheus text"""
+        return self.to_prometheus() if format == "prometheus" else self.to_json()
+
+    def save(self, path):
+        """writes the metrics to path, as Prometheus text if it ends in .prom, otherwise json"""
+        with open(path, "w") as file:
+            file.write(self.export("prometheus" if path.endswith(".prom") else "json"))
+
+    def format(self):
+        """returns the metrics as a text table for the stats window"""
+        snapshot = self.snapshot()
+
+        def ms(value):
+            return f"{value:8.1f}" if value is not None else f"{'-':>8}"
+
+        lines = [f"{'device':<20} {'endpoint':<20} {'count':>6} {'mean':>8} {'p50':>8} {'p95':>8} {'max':>8} ms"]
+        for entry in snapshot["requests"]:
+            lines.append(f"{entry['device'][:20]:<20} {entry['endpoint'][:20]:<20} {entry['count']:>6} {ms(entry['mean_ms'])} {ms(entry['p50_ms'])} {ms(entry['p95_ms'])} {ms(entry['max_ms'])}")
+        if snapshot["errors"]:
+            lines += ["", "errors:"]
+            lines += [f"  {entry['device']} {entry['endpoint']} {entry['error']}: {entry['count']}" for entry in snapshot["errors"]]
+        if snapshot["connections"]:
+            lines += ["", "connections:"]
+            for entry in snapshot["connections"]:
+                total = entry["created"] + entry["reused"]
+                lines.append(f"  {entry['device']}: {entry['created']} created, {entry['reused']} reused ({entry['reused'] / total:.0%} reuse)")
+        if snapshot["discovery"]:
+            lines += ["", "discovery:"]
+            lines += [f"  {entry['phase']:<18} {entry['count']:>6} {ms(entry['mean_ms'])} {ms(entry['p50_ms'])} {ms(entry['p95_ms'])} {ms(entry['max_ms'])}" for entry in snapshot["discovery"]]
+        return "\n".join(lines)
+
+
+_metrics = Metrics()
+
+def get_metrics():
+    """returns the process wide Metrics"""
+    return _metrics
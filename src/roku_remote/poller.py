@@ -0,0 +1,207 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+
+from roku_remote import eventloop
+
+logger = logging.getLogger("main.poller")
+
+class StatePoller:
+    """polls the power state and active app of every registered device from one timer wheel
+    on the shared event loop. Each device's interval adapts: it polls every FAST_INTERVAL for
+    FAST_PERIOD seconds after a user interaction or a state change, backs off towards
+    IDLE_INTERVAL while nothing changes and towards UNREACHABLE_INTERVAL while the device does
+    not answer. Wakeups are jittered so devices are not polled in lockstep. State changes are
+    published by calling on_change(device, state) on the event loop thread, where state is a
+    dict of power, active_app and reachable. With push enabled each device is also subscribed
+    to its ECP push notifications, while that subscription is live the device is only polled
+    every PUSH_IDLE_INTERVAL as a safety net. The public methods may be called from any thread"""
+    FAST_INTERVAL = 2
+    POKE_DELAY = 1
+    FAST_PERIOD = 30
+    BASE_INTERVAL = 10
+    IDLE_INTERVAL = 60
+    UNREACHABLE_INTERVAL = 300
+    PUSH_IDLE_INTERVAL = 300
+    BACKOFF = 1.5
+    JITTER = 0.1
+
+    class DeviceState:
+        """poll schedule and last known state of one device"""
+        def __init__(self, device):
+            self.device = device
+            self.interval = StatePoller.BASE_INTERVAL
+            self.due = 0
+            self.fast_until = 0
+            self.state = None
+            self.push_task = None
+            self.live = False
+
+    def __init__(self, on_change, push=False, auth_key=None):
+        """auth_key answers the ECP session challenge, None for the well known key"""
+        self.on_change = on_change
+        self.push = push
+        self.auth_key = auth_key
+        self.devices = {}
+        self.wheel = []
+        self.sequence = itertools.count()
+        self.task = None
+        self.wakeup = None
+
+    # thread safe api
+    def add(self, device):
+        """starts polling device, a Roku or AsyncRoku, right away"""
+        eventloop.call_soon(self.add_now, device)
+
+    def remove(self, device):
+        eventloop.call_soon(self.remove_now, device)
+
+    def poke(self, device):
+        """polls device within POKE_DELAY seconds and fast for a while, e.g. after a user
+        interaction. A burst of pokes costs one poll, so polls do not compete with keypresses
+        for the device's connections"""
+        eventloop.call_soon(self.poke_now, device)
+
+    def get_state(self, device):
+        """returns the last published state of device, or None"""
+        device_state = self.devices.get(device)
+        return device_state.state if device_state is not None else None
+
+    def stop(self):
+        eventloop.call_soon(self.stop_now)
+
+    # event loop thread
+    def add_now(self, device):
+        if device not in self.devices:
+            device_state = self.devices[device] = StatePoller.DeviceState(device)
+            self.schedule(device_state, 0)
+            if self.push:
+                # imported here, so aiohttp is not loaded before the first device appears
+                from roku_remote.push import PushChannel
+                channel = PushChannel(
+                    getattr(device, "async_roku", device),
+                    lambda event, params: self.notified(device_state, event, params),
+                    lambda live: self.push_live(device_state, live),
+                    self.auth_key or PushChannel.AUTH_KEY)
+                device_state.push_task = asyncio.ensure_future(channel.run())
+
+    def remove_now(self, device):
+        # the device's wheel entries are skipped once it is no longer in self.devices
+        device_state = self.devices.pop(device, None)
+        if device_state is not None and device_state.push_task is not None:
+            device_state.push_task.cancel()
+
+    def poke_now(self, device):
+        device_state = self.devices.get(device)
+        if device_state is None:
+            return
+        loop = asyncio.get_running_loop()
+        device_state.fast_until = loop.time() + StatePoller.FAST_PERIOD
+        device_state.interval = StatePoller.FAST_INTERVAL
+        if device_state.due is None:
+            # being polled, the next poll is scheduled FAST_INTERVAL after it
+            return
+        if device_state.due - loop.time() > StatePoller.POKE_DELAY:
+            self.schedule(device_state, StatePoller.POKE_DELAY)
+
+    def stop_now(self):
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        for device in list(self.devices):
+            self.remove_now(device)
+
+    def schedule(self, device_state, delay):
+        loop = asyncio.get_running_loop()
+        device_state.due = loop.time() + delay
+        heapq.heappush(self.wheel, (device_state.due, next(self.sequence), device_state))
+        if self.task is None:
+            self.wakeup = asyncio.Event()
+            self.task = asyncio.ensure_future(self.run())
+        elif self.wheel[0][2] is device_state:
+            self.wakeup.set()
+
+    async def run(self):
+        """sleeps until the earliest due device, then polls every device that is due"""
+        loop = asyncio.get_running_loop()
+        while True:
+            while self.wheel and (self.wheel[0][2].device not in self.devices or self.wheel[0][0] != self.wheel[0][2].due):
+                heapq.heappop(self.wheel)   # removed device or superseded entry
+            timeout = self.wheel[0][0] - loop.time() if self.wheel else None
+            if timeout is None or timeout > 0:
+                self.wakeup.clear()
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            due, sequence, device_state = heapq.heappop(self.wheel)
+            device_state.due = None
+            asyncio.ensure_future(self.poll(device_state))
+
+    async def poll(self, device_state):
+        device = getattr(device_state.device, "async_roku", device_state.device)
+        loop = asyncio.get_running_loop()
+        try:
+            state = {"power": await device.is_power_on(), "active_app": await device.get_active_app(), "reachable": True}
+        except Exception as ex:
+            logger.debug(f"{device.get_name()}: exception {ex} polling state")
+            state = dict(device_state.state or {}, reachable=False)
+        if device_state.device not in self.devices:
+            return
+        self.publish(device_state, state)
+        now = loop.time()
+        if not state["reachable"]:
+            device_state.interval = min(max(device_state.interval, StatePoller.BASE_INTERVAL) * 2, StatePoller.UNREACHABLE_INTERVAL)
+        elif now < device_state.fast_until:
+            device_state.interval = StatePoller.FAST_INTERVAL
+        else:
+            idle_interval = StatePoller.PUSH_IDLE_INTERVAL if device_state.live else StatePoller.IDLE_INTERVAL
+            device_state.interval = min(max(device_state.interval, StatePoller.BASE_INTERVAL / StatePoller.BACKOFF) * StatePoller.BACKOFF, idle_interval)
+        if device_state.due is None:
+            jitter = random.uniform(1 - StatePoller.JITTER, 1 + StatePoller.JITTER)
+            self.schedule(device_state, device_state.interval * jitter)
+
+    def publish(self, device_state, state):
+        """records a device's new state and calls on_change if it differs from the last one,
+        a change after the first state polls the device fast for a while"""
+        if state == device_state.state:
+            return
+        if device_state.state is not None:
+            device_state.fast_until = asyncio.get_running_loop().time() + StatePoller.FAST_PERIOD
+        logger.debug(f"{device_state.device.get_name()}: state {state}")
+        device_state.state = state
+        self.on_change(device_state.device, state)
+
+    @staticmethod
+    def normalize_power_mode(power_mode):
+        """returns a pushed power mode, e.g. power-on, as device-info spells it, e.g. PowerOn"""
+        if "-" in power_mode:
+            return "".join(part.capitalize() for part in power_mode.split("-"))
+        return power_mode
+
+    def notified(self, device_state, event, params):
+        """applies a pushed notification, a power mode change is published straight away,
+        anything else may have changed the active app, so the device is polled now"""
+        if device_state.device not in self.devices:
+            return
+        if event == "power-mode-changed" and "power-mode" in params:
+            power_mode = StatePoller.normalize_power_mode(params["power-mode"])
+            device = getattr(device_state.device, "async_roku", device_state.device)
+            device.device_info.push("power-mode", power_mode)
+            state = dict(device_state.state or {"active_app": None}, power=power_mode == "PowerOn", reachable=True)
+            self.publish(device_state, state)
+        elif device_state.due is not None:
+            self.schedule(device_state, 0)
+
+    def push_live(self, device_state, live):
+        logger.debug(f"{device_state.device.get_name()}: push notifications {'live' if live else 'down'}")
+        device_state.live = live
+        if not live:
+            # pushed values are no longer kept up to date
+            getattr(device_state.device, "async_roku", device_state.device).device_info.invalidate()
+        if not live and device_state.device in self.devices and device_state.due is not None:
+            # polling takes over, don't wait out the long push safety net interval
+            self.schedule(device_state, min(device_state.due - asyncio.get_running_loop().time(), StatePoller.BASE_INTERVAL))
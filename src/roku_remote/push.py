@@ -0,0 +1,140 @@
+import asyncio
+import base64
+import hashlib
+import itertools
+import json
+import logging
+
+import aiohttp
+
+logger = logging.getLogger("main.push")
+
+class PushChannel:
+    """subscribes to the notifications a Roku pushes over its ECP WebSocket session on
+    port 8060, e.g. power-mode-changed, calling on_notify(event, params) for each one on
+    the event loop thread. on_live(live) is called when the subscription comes up and
+    goes down. Older firmware has no ECP session, run() then returns False and the
+    caller keeps polling the device instead"""
+    PATH = "ecp-session"
+    PROTOCOL = "ecp-2"
+    AUTH_KEY = "95E610D0-7C29-44EF-FB0F-97F1FCE4C297"
+    EVENTS = ("power-mode-changed", "media-player-state-changed", "plugin-ui-run")
+    HEARTBEAT = 30
+    REQUEST_TIMEOUT = 5
+    RETRY_INTERVAL = 5
+    RETRY_MAX_INTERVAL = 300
+
+    class Unsupported(Exception):
+        """the device refused the ECP session or its authentication"""
+
+    def __init__(self, device, on_notify, on_live=None, auth_key=AUTH_KEY):
+        """device is an AsyncRoku. The WebSocket gets a session of its own, so it never holds
+        one of the connections in the device's request pool"""
+        self.device = device
+        self.on_notify = on_notify
+        self.on_live = on_live
+        self.auth_key = auth_key
+        self.request_ids = itertools.count()
+        self.live = False
+
+    def get_url(self):
+        return "ws" + self.device.get_api_url().removeprefix("http") + PushChannel.PATH
+
+    @staticmethod
+    def get_challenge_response(challenge, auth_key):
+        """answers the session's authentication challenge, base64 of sha1(challenge + key)"""
+        return base64.b64encode(hashlib.sha1((challenge + auth_key).encode()).digest()).decode()
+
+    async def run(self):
+        """keeps the subscription up, reconnecting with backoff after it drops. Returns False
+        as soon as the device turns out not to support push notifications"""
+        interval = PushChannel.RETRY_INTERVAL
+        while True:
+            try:
+                await self.subscribe()
+                interval = PushChannel.RETRY_INTERVAL
+            except (aiohttp.WSServerHandshakeError, PushChannel.Unsupported) as ex:
+                logger.info(f"{self.device.get_name()}: no ECP push notifications, {ex}")
+                return False
+            except (aiohttp.ClientError, OSError, asyncio.TimeoutError) as ex:
+                logger.debug(f"{self.device.get_name()}: ECP session dropped, {ex}, retrying in {interval}s")
+            await asyncio.sleep(interval)
+            interval = min(interval * 2, PushChannel.RETRY_MAX_INTERVAL)
+
+    async def subscribe(self):
+        """opens the ECP session, authenticates, requests the notifications and dispatches
+        them until the session closes"""
+        async with aiohttp.ClientSession() as session:
+            async with session.ws_connect(self.get_url(), protocols=(PushChannel.PROTOCOL,), heartbeat=PushChannel.HEARTBEAT) as ws:
+                try:
+                    await self.authenticate(ws)
+                    await self.request(ws, "request-events", {"param-events": ",".join("+" + event for event in PushChannel.EVENTS)})
+                    self.set_live(True)
+                    logger.debug(f"{self.device.get_name()}: subscribed to {', '.join(PushChannel.EVENTS)}")
+                    async for message in ws:
+                        if message.type != aiohttp.WSMsgType.TEXT:
+                            break
+                        notification = self.parse(message)
+                        if notification is not None:
+                            self.dispatch(notification)
+                finally:
+                    self.set_live(False)
+
+    async def authenticate(self, ws):
+        message = await self.receive(ws)
+        if message.get("notify") != "authenticate":
+            # the session did not challenge us, nothing to answer
+            self.dispatch(message)
+            return
+        response = PushChannel.get_challenge_response(message.get("param-challenge", ""), self.auth_key)
+        await self.request(ws, "authenticate", {"param-response": response})
+
+    async def request(self, ws, request, params):
+        """sends an ECP session request and waits for its response, dispatching any
+        notification that arrives in between"""
+        request_id = str(next(self.request_ids))
+        await ws.send_json(dict({"request": request, "request-id": request_id}, **params))
+        while True:
+            message = await self.receive(ws)
+            if message.get("response-id") != request_id:
+                self.dispatch(message)
+                continue
+            if str(message.get("status")) != "200":
+                raise PushChannel.Unsupported(f"{request} status {message.get('status')}")
+            return message
+
+    async def receive(self, ws):
+        while True:
+            message = await ws.receive(timeout=PushChannel.REQUEST_TIMEOUT)
+            if message.type != aiohttp.WSMsgType.TEXT:
+                raise aiohttp.ClientError(f"ECP session closed, {message.type}")
+            parsed = self.parse(message)
+            if parsed is not None:
+                return parsed
+
+    def parse(self, message):
+        """returns the json object in a text message, or None for a malformed one, which is
+        logged and skipped rather than dropping the session"""
+        try:
+            parsed = json.loads(message.data)
+        except ValueError as ex:
+            logger.warning(f"{self.device.get_name()}: skipping malformed ECP session message {message.data[:80]!r}, {ex}")
+            return None
+        if not isinstance(parsed, dict):
+            logger.warning(f"{self.device.get_name()}: skipping ECP session message {message.data[:80]!r}")
+            return None
+        return parsed
+
+    def dispatch(self, message):
+        event = message.get("notify")
+        if event is None:
+            return
+        params = {key.removeprefix("param-"): value for key, value in message.items() if key.startswith("param-")}
+        logger.debug(f"{self.device.get_name()}: {event} {params}")
+        self.on_notify(event, params)
+
+    def set_live(self, live):
+        if live != self.live:
+            self.live = live
+            if self.on_live is not None:
+                self.on_live(live)
@@ -0,0 +1,131 @@
+import logging
+import re
+import time
+from threading import Lock
+
+logger = logging.getLogger("main.registry")
+
+def get_header(headers, name, default=None):
+    """case insensitive lookup of an SSDP header, devices disagree on header name case"""
+    value = headers.get(name)
+    if value is not None:
+        return value
+    name = name.lower()
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+    return default
+
+def get_max_age(headers, default):
+    """returns the advertisement lifetime in seconds from the CACHE-CONTROL header"""
+    match = re.search(r"max-age\s*=\s*(\d+)", get_header(headers, "CACHE-CONTROL", ""))
+    return int(match.group(1)) if match else default
+
+class DeviceRegistry:
+    """index of the devices found by discovery keyed by USN, used to short-circuit
+    repeated SSDP responses of known devices before any HTTP request is made to them.
+    Each entry lives for the max-age its device advertised in CACHE-CONTROL, counted from
+    when it was last seen, and is due for revalidation shortly before it expires"""
+    NEW = "new"
+    MOVED = "moved"
+    KNOWN = "known"
+    DEFAULT_MAX_AGE = 1800
+    REVALIDATION_MARGIN = 60
+
+    class Entry:
+        """a registered device and its advertisement lifetime"""
+        def __init__(self, usn, location, max_age, headers):
+            self.usn = usn
+            self.location = location
+            self.max_age = max_age
+            self.headers = headers
+            self.last_seen = time.monotonic()
+            self.revalidating = False
+
+        def expires(self):
+            return self.last_seen + self.max_age
+
+        def revalidates(self):
+            """when to revalidate, a margin before expiry, at most a tenth of the lifetime"""
+            return self.expires() - min(DeviceRegistry.REVALIDATION_MARGIN, self.max_age / 10)
+
+        def __repr__(self):
+            return f"{self.usn} at {self.location} max-age {self.max_age}s expires in {self.expires() - time.monotonic():.0f}s"
+
+    def __init__(self):
+        self.lock = Lock()
+        self.devices = {}
+        self.reset_stats()
+
+    @staticmethod
+    def get_serial(usn):
+        """returns the serial number from a roku:ecp USN, e.g. uuid:roku:ecp:X000008HLY9X"""
+        return usn.rsplit(":", 1)[-1] if usn else None
+
+    def observe(self, headers):
+        """records an SSDP response and returns whether its device is NEW, has MOVED
+        to a new LOCATION or is already KNOWN"""
+        usn = get_header(headers, "USN")
+        location = get_header(headers, "LOCATION")
+        max_age = get_max_age(headers, DeviceRegistry.DEFAULT_MAX_AGE)
+        with self.lock:
+            if usn is None:
+                self.unkeyed += 1
+                return DeviceRegistry.NEW
+            entry = self.devices.get(usn)
+            self.devices[usn] = DeviceRegistry.Entry(usn, location, max_age, headers)
+            if entry is None:
+                self.new += 1
+                return DeviceRegistry.NEW
+            if entry.location != location:
+                self.moved += 1
+                logger.info(f"{usn} moved from {entry.location} to {location}")
+                return DeviceRegistry.MOVED
+            self.duplicates += 1
+            return DeviceRegistry.KNOWN
+
+    def forget(self, usn):
+        """drops a device, e.g. when it could not be reached, so it is retried next time"""
+        with self.lock:
+            self.devices.pop(usn, None)
+
+    def clear(self):
+        with self.lock:
+            self.devices.clear()
+
+    def entries(self):
+        """returns the registered devices, soonest to expire first"""
+        with self.lock:
+            return sorted(self.devices.values(), key=lambda entry: entry.expires())
+
+    def next_deadline(self):
+        """returns the monotonic time of the next revalidation or expiry, or None"""
+        with self.lock:
+            deadlines = [entry.expires() if entry.revalidating else entry.revalidates() for entry in self.devices.values()]
+        return min(deadlines, default=None)
+
+    def housekeeping(self, now=None):
+        """removes and returns the entries whose max-age has lapsed, and marks the entries
+        due for revalidation, returning whether any were newly marked"""
+        now = time.monotonic() if now is None else now
+        expired = []
+        revalidate = False
+        with self.lock:
+            for entry in list(self.devices.values()):
+                if entry.expires() <= now:
+                    expired.append(self.devices.pop(entry.usn))
+                elif entry.revalidates() <= now and not entry.revalidating:
+                    entry.revalidating = True
+                    revalidate = True
+            self.expired += len(expired)
+        return expired, revalidate
+
+    def reset_stats(self):
+        self.new = 0
+        self.moved = 0
+        self.duplicates = 0
+        self.unkeyed = 0
+        self.expired = 0
+
+    def stats(self):
+        return {"new": self.new, "moved": self.moved, "duplicates": self.duplicates, "unkeyed": self.unkeyed, "expired": self.expired, "known": len(self.devices)}
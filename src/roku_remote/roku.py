@@ -1,13 +1,64 @@
-import requests
+import asyncio
+import logging
 from urllib.parse import urlparse, quote
 
-from lxml import objectify
-import logging
+import aiohttp
 from strenum import StrEnum
 
+from roku_remote import eventloop
+from roku_remote.device_info import DeviceInfoCache
+from roku_remote.metrics import get_metrics
+from roku_remote.registry import get_header
+
 logger = logging.getLogger("main.roku")
-class Roku:
-    
+
+def char_to_key(char, keysym):
+    """maps a Tk key event's char and keysym to the ECP key to send, or None"""
+    if len(char):
+        if char in "@#$&+=:;,?/ ":
+            return f"Lit_{quote(char, safe='')}"
+        if char.isprintable():
+            return f"Lit_{char}"
+
+    match keysym:
+        case 'BackSpace':
+            return AsyncRoku.Key.backspace
+        case 'Delete':
+            return AsyncRoku.Key.backspace
+        case 'Up':
+            return AsyncRoku.Key.up
+        case 'Down':
+            return AsyncRoku.Key.down
+        case 'Left':
+            return AsyncRoku.Key.left
+        case 'Right':
+            return AsyncRoku.Key.right
+        case 'Home':
+            return AsyncRoku.Key.home
+        case 'Escape':
+            return AsyncRoku.Key.back
+        case 'Pause':
+            return AsyncRoku.Key.play
+        case 'Return':
+            return AsyncRoku.Key.select
+    return None
+
+def fromstring(body):
+    """parses an ECP xml response, lxml is imported on first use"""
+    from lxml import objectify
+    return objectify.fromstring(body)
+
+def log_response(method, roku, url, status_code, text):
+    if not (status_code == 200 or status_code == 202):
+        logger.error(f"error in {method} roku {roku} url {url} status {status_code} {text}")
+    else:
+        logger.info(f"{method} roku {roku} url {url} status {status_code} {text}")
+
+class AsyncRoku:
+    """asyncio native Roku ECP client. Every request goes over a pooled keep-alive aiohttp
+    session, so any number of devices and concurrent operations share one event loop
+    without a thread per request. Create with AsyncRoku.create(dict) to fetch the name"""
+
     class Key(StrEnum):
         power_on = "PowerOn"
         power_off = "PowerOff"
@@ -38,167 +89,465 @@ class Roku:
         input_hdmi3 = "InputHDMI3"
         input_hdmi4 = "InputHDMI4"
         input_av1 = "InputAV1"
-        
-    def __init__(self, dict) -> None:
+
+    POOL_SIZE = 2
+    HEARTBEAT_INTERVAL = 15
+    KEEPALIVE_TIMEOUT = 30
+    TIMEOUT = (3.05, 5)     # (connect, read) seconds
+
+    def __init__(self, dict, pool_size=POOL_SIZE, timeout=TIMEOUT) -> None:
         self.api_url = urlparse(dict['LOCATION']).geturl()
-        self.device_info = None
-        self.name = self.get_device_info("friendly-device-name")
+        self.usn = get_header(dict, 'USN')
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.session = None
+        self.closed = False
+        self.heartbeat_task = None
+        self.device_info = DeviceInfoCache(self.fetch_device_info)
+        self.name = None
+
+    @classmethod
+    async def create(cls, dict, **kwargs):
+        """creates an AsyncRoku and fetches its device-info, closing its session if the device
+        does not answer"""
+        roku = cls(dict, **kwargs)
+        try:
+            await roku.hydrate()
+        except BaseException:
+            await roku.close()
+            raise
+        return roku
+
+    async def hydrate(self):
+        address = self.get_label()
+        self.name = str(await self.get_device_info("friendly-device-name"))
+        get_metrics().rename(address, self.name)
+        return self.name
+
+    # connection management
+    def get_session(self):
+        """returns the device's keep-alive session, whose connection pool holds up to pool_size
+        connections to the device, creating it on first use inside the running event loop.
+        Raises RuntimeError once the device is closed, rather than opening a session nothing
+        would close"""
+        if self.closed:
+            raise RuntimeError(f"roku {self.get_label()} is closed")
+        if self.session is None:
+            connector = aiohttp.TCPConnector(limit_per_host=self.pool_size, keepalive_timeout=AsyncRoku.KEEPALIVE_TIMEOUT)
+            self.session = aiohttp.ClientSession(connector=connector, trace_configs=[get_metrics().get_trace_config(self.get_label)])
+        return self.session
+
+    async def request(self, method, url):
+        """sends an ECP request and returns the status code and body bytes, its latency and
+        outcome are recorded in the metrics"""
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        with get_metrics().measure(self.get_label(), url) as sample:
+            async with self.get_session().request(method, url, timeout=timeout) as response:
+                sample.status = response.status
+                return response.status, await response.read()
+
+    async def warm_up(self):
+        """opens a pooled connection to the device ahead of the first key press"""
+        try:
+            status, body = await self.request("HEAD", self.api_url)
+            logger.debug(f"warm_up roku {self.name} url {self.api_url} status {status}")
+        except Exception as ex:
+            logger.error(f"exception {ex} in warm_up() roku {self.name}")
+
+    async def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        """warms up the connection pool and keeps it open by sending a cheap HEAD request
+        every interval seconds, until stop_heartbeat() is called"""
+        if self.heartbeat_task is None and not self.closed:
+            self.heartbeat_task = asyncio.ensure_future(self.heartbeat(interval))
+
+    async def stop_heartbeat(self):
+        if self.heartbeat_task is not None:
+            self.heartbeat_task.cancel()
+            self.heartbeat_task = None
+
+    async def heartbeat(self, interval):
+        while True:
+            await self.warm_up()
+            await asyncio.sleep(interval)
+
+    async def close(self):
+        """closes the device's session for good, later requests raise RuntimeError"""
+        self.closed = True
+        await self.stop_heartbeat()
+        self.device_info.cancel()
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def post(self, method, url):
+        """sends an ECP command and returns the status code"""
+        status, body = await self.request("POST", url)
+        log_response(method, self.name, url, status, body.decode(errors="replace"))
+        return status
+
+    # actions
+    async def send_keypress(self, key):
+        status = await self.post("send_keypress", self.api_url + "keypress/" + key)
+        if key in (AsyncRoku.Key.power_on, AsyncRoku.Key.power_off):
+            self.device_info.invalidate()
+        return status
+
+    async def send_keydown(self, key):
+        return await self.post("send_keydown", self.api_url + "keydown/" + key)
+
+    async def send_keyup(self, key):
+        return await self.post("send_keyup", self.api_url + "keyup/" + key)
+
+    async def send_launch_channel(self, id):
+        return await self.post("launch", self.api_url + "launch" + "/" + id)
+
+    # key actions
+    async def send_power_on(self):
+        return await self.send_keypress(AsyncRoku.Key.power_on)
+
+    async def send_power_off(self):
+        return await self.send_keypress(AsyncRoku.Key.power_off)
+
+    async def send_key_home(self):
+        return await self.send_keypress(AsyncRoku.Key.home)
+
+    async def send_key_rev(self):
+        return await self.send_keypress(AsyncRoku.Key.rev)
+
+    async def send_key_fwd(self):
+        return await self.send_keypress(AsyncRoku.Key.fwd)
+
+    async def send_key_play(self):
+        return await self.send_keypress(AsyncRoku.Key.play)
+
+    async def send_key_select(self):
+        return await self.send_keypress(AsyncRoku.Key.select)
 
-    def log_response(self, method, roku, url, status_code, text):
-        if not (status_code == 200 or status_code == 202):
-            logger.error(f"error in {method} roku {roku} url {url} status {status_code} {text}")
+    async def send_key_left(self):
+        return await self.send_keypress(AsyncRoku.Key.left)
+
+    async def send_key_right(self):
+        return await self.send_keypress(AsyncRoku.Key.right)
+
+    async def send_key_down(self):
+        return await self.send_keypress(AsyncRoku.Key.down)
+
+    async def send_key_up(self):
+        return await self.send_keypress(AsyncRoku.Key.up)
+
+    async def send_key_back(self):
+        return await self.send_keypress(AsyncRoku.Key.back)
+
+    async def send_key_guide(self):
+        return await self.send_keypress(AsyncRoku.Key.guide)
+
+    async def send_key_instant_replay(self):
+        return await self.send_keypress(AsyncRoku.Key.instant_replay)
+
+    async def send_key_info(self):
+        return await self.send_keypress(AsyncRoku.Key.info)
+
+    async def send_key_backspace(self):
+        return await self.send_keypress(AsyncRoku.Key.backspace)
+
+    async def send_key_search(self):
+        return await self.send_keypress(AsyncRoku.Key.search)
+
+    async def send_key_enter(self):
+        return await self.send_keypress(AsyncRoku.Key.enter)
+
+    async def send_key_volume_down(self):
+        return await self.send_keypress(AsyncRoku.Key.volume_down)
+
+    async def send_key_volume_mute(self):
+        return await self.send_keypress(AsyncRoku.Key.volume_mute)
+
+    async def send_key_volume_up(self):
+        return await self.send_keypress(AsyncRoku.Key.volume_up)
+
+    async def send_key_channel_up(self):
+        return await self.send_keypress(AsyncRoku.Key.channel_up)
+
+    async def send_key_channel_down(self):
+        return await self.send_keypress(AsyncRoku.Key.channel_down)
+
+    async def send_key_input_tuner(self):
+        return await self.send_keypress(AsyncRoku.Key.input_tuner)
+
+    async def send_key_input_hdmi1(self):
+        return await self.send_keypress(AsyncRoku.Key.input_hdmi1)
+
+    async def send_key_input_hdmi2(self):
+        return await self.send_keypress(AsyncRoku.Key.input_hdmi2)
+
+    async def send_key_input_hdmi3(self):
+        return await self.send_keypress(AsyncRoku.Key.input_hdmi3)
+
+    async def send_key_input_hdmi4(self):
+        return await self.send_keypress(AsyncRoku.Key.input_hdmi4)
+
+    async def send_key_input_av1(self):
+        return await self.send_keypress(AsyncRoku.Key.input_av1)
+
+    async def send_key_headphones(self):
+        pass
+
+    async def send_key_power(self):
+        if await self.is_power_on():
+            return await self.send_power_off()
         else:
-            logger.info(f"{method} roku {roku} url {url} status {status_code} {text}")
+            return await self.send_power_on()
+
+    async def send_char(self, char, keysym):
+        key = char_to_key(char, keysym)
+        if key is not None:
+            return await self.send_keypress(key)
+
+    # utilities
+    async def is_power_on(self):
+        value = await self.get_device_info("power-mode")
+        return value == "PowerOn"
+
+    async def is_tv(self):
+        return await self.get_device_info("is-tv")
+
+    async def is_stick(self):
+        return await self.get_device_info("is-stick")
+
+    async def get_description(self):
+        if await self.is_tv():
+            return "TV"
+        elif await self.is_stick():
+            return "Stick"
+        return "unknown"
+
+    async def get_device_info(self, key):
+        """returns a device-info field, served from the device-info cache while fresh"""
+        return await self.device_info.get(key)
+
+    async def fetch_device_info(self):
+        url = self.api_url + "query/device-info"
+        try:
+            status, body = await self.request("GET", url)
+            return fromstring(body)
+        except Exception as ex:
+            logger.error(f"exception {ex} in fetch_device_info()")
+            raise(ex)
+
+    async def get_active_app(self):
+        """returns the name of the app in the foreground, Roku for the home screen"""
+        url = self.api_url + "query/active-app"
+        try:
+            status, body = await self.request("GET", url)
+            return str(fromstring(body).app)
+        except Exception as ex:
+            logger.error(f"exception {ex} in get_active_app()")
+            raise(ex)
+
+    async def get_apps(self):
+        """returns the installed apps as (id, name, version) tuples"""
+        url = self.api_url + "query/apps"
+        try:
+            status, body = await self.request("GET", url)
+            return [(app.get("id"), str(app), app.get("version")) for app in fromstring(body).iterchildren("app")]
+        except Exception as ex:
+            logger.error(f"exception {ex} in get_apps()")
+            raise(ex)
+
+    async def get_icon(self, id, headers=None):
+        """fetches the icon of app id, headers may carry If-None-Match or If-Modified-Since.
+        Returns the status code, body bytes and response headers"""
+        url = self.api_url + f"query/icon/{id}"
+        timeout = aiohttp.ClientTimeout(sock_connect=self.timeout[0], sock_read=self.timeout[1])
+        with get_metrics().measure(self.get_label(), url) as sample:
+            async with self.get_session().get(url, headers=headers, timeout=timeout) as response:
+                sample.status = response.status
+                return response.status, await response.read(), response.headers
+
+    async def get_full_device_info(self):
+        url = self.api_url + "query/device-info"
+        try:
+            status, body = await self.request("GET", url)
+            self.device_info.store(fromstring(body))
+        except Exception as ex:
+            logger.error(f"exception {ex} in get_full_device_info()")
+            raise(ex)
+        return body.decode(errors="replace")
+
+    def get_name(self):
+        return self.name
+
+    def get_api_url(self):
+        return self.api_url
+
+    def get_usn(self):
+        return self.usn
+
+    def get_label(self):
+        """the name to record metrics under, the address until the name is known"""
+        return self.name or urlparse(self.api_url).netloc
+
+
+class Roku:
+    """synchronous facade over AsyncRoku, each call runs on the shared event loop and
+    blocks the calling thread until it completes"""
+    Key = AsyncRoku.Key
+
+    POOL_SIZE = AsyncRoku.POOL_SIZE
+    HEARTBEAT_INTERVAL = AsyncRoku.HEARTBEAT_INTERVAL
+    TIMEOUT = AsyncRoku.TIMEOUT
+
+    def __init__(self, dict, pool_size=POOL_SIZE, timeout=TIMEOUT, hydrate_timeout=None) -> None:
+        """hydrate_timeout bounds the whole device-info fetch, timeout only each socket operation"""
+        self.async_roku = AsyncRoku(dict, pool_size, timeout)
+        self.api_url = self.async_roku.api_url
+        self.usn = self.async_roku.usn
+        try:
+            self.name = eventloop.run(asyncio.wait_for(self.async_roku.hydrate(), hydrate_timeout))
+        except BaseException:
+            # the device did not answer, don't leak its session
+            eventloop.run(self.async_roku.close())
+            raise
+
+    @property
+    def timeout(self):
+        return self.async_roku.timeout
+
+    @timeout.setter
+    def timeout(self, timeout):
+        self.async_roku.timeout = timeout
+
+    @property
+    def device_info(self):
+        return self.async_roku.device_info
+
+    # connection management
+    def warm_up(self):
+        eventloop.run(self.async_roku.warm_up())
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        eventloop.run(self.async_roku.start_heartbeat(interval))
+
+    def stop_heartbeat(self):
+        eventloop.run(self.async_roku.stop_heartbeat())
+
+    def close(self):
+        eventloop.run(self.async_roku.close())
 
     # actions
     def send_keypress(self, key):
-        url = self.api_url + "keypress/" + key
-        response = requests.post(url)
-        self.log_response("send_keypress", self.name, url, response.status_code, response.text)
+        return eventloop.run(self.async_roku.send_keypress(key))
 
     def send_keydown(self, key):
-        url = self.api_url + "keydown/" + key
-        response = requests.post(url)
-        self.log_response("send_keydown", self.name, url, response.status_code, response.text)
+        return eventloop.run(self.async_roku.send_keydown(key))
 
     def send_keyup(self, key):
-        url = self.api_url + "keyup/" + key
-        response = requests.post(url)
-        self.log_response("send_keyup", self.name, url, response.status_code, response.text)
+        return eventloop.run(self.async_roku.send_keyup(key))
 
     def send_launch_channel(self, id):
-        url = self.api_url + "launch" + "/" + id
-        response = requests.post(url)
-        self.log_response("launch", self.name, url, response.status_code, response.text)
+        return eventloop.run(self.async_roku.send_launch_channel(id))
 
     # key actions
     def send_power_on(self):
-        self.send_keypress(Roku.Key.power_on)
+        return self.send_keypress(Roku.Key.power_on)
 
     def send_power_off(self):
-        self.send_keypress(Roku.Key.power_off)
+        return self.send_keypress(Roku.Key.power_off)
 
     def send_key_home(self):
-        self.send_keypress(Roku.Key.home)
+        return self.send_keypress(Roku.Key.home)
 
     def send_key_rev(self):
-        self.send_keypress(Roku.Key.rev)
+        return self.send_keypress(Roku.Key.rev)
 
     def send_key_fwd(self):
-        self.send_keypress(Roku.Key.fwd)
+        return self.send_keypress(Roku.Key.fwd)
 
     def send_key_play(self):
-        self.send_keypress(Roku.Key.play)
+        return self.send_keypress(Roku.Key.play)
 
     def send_key_select(self):
-        self.send_keypress(Roku.Key.select)
+        return self.send_keypress(Roku.Key.select)
 
     def send_key_left(self):
-        self.send_keypress(Roku.Key.left)
+        return self.send_keypress(Roku.Key.left)
 
     def send_key_right(self):
-        self.send_keypress(Roku.Key.right)
+        return self.send_keypress(Roku.Key.right)
 
     def send_key_down(self):
-        self.send_keypress(Roku.Key.down)
+        return self.send_keypress(Roku.Key.down)
 
     def send_key_up(self):
-        self.send_keypress(Roku.Key.up)
+        return self.send_keypress(Roku.Key.up)
 
     def send_key_back(self):
-        self.send_keypress(Roku.Key.back)
+        return self.send_keypress(Roku.Key.back)
 
     def send_key_guide(self):
-        self.send_keypress(Roku.Key.guide)
+        return self.send_keypress(Roku.Key.guide)
 
     def send_key_instant_replay(self):
-        self.send_keypress(Roku.Key.instant_replay)
+        return self.send_keypress(Roku.Key.instant_replay)
 
     def send_key_info(self):
-        self.send_keypress(Roku.Key.info)
+        return self.send_keypress(Roku.Key.info)
 
     def send_key_backspace(self):
-        self.send_keypress(Roku.Key.backspace)
+        return self.send_keypress(Roku.Key.backspace)
 
     def send_key_search(self):
-        self.send_keypress(Roku.Key.search)
+        return self.send_keypress(Roku.Key.search)
 
     def send_key_enter(self):
-        self.send_keypress(Roku.Key.enter)
+        return self.send_keypress(Roku.Key.enter)
 
     def send_key_volume_down(self):
-        self.send_keypress(Roku.Key.volume_down)
+        return self.send_keypress(Roku.Key.volume_down)
 
     def send_key_volume_mute(self):
-        self.send_keypress(Roku.Key.volume_mute)
+        return self.send_keypress(Roku.Key.volume_mute)
 
     def send_key_volume_up(self):
-        self.send_keypress(Roku.Key.volume_up)
+        return self.send_keypress(Roku.Key.volume_up)
 
     def send_key_channel_up(self):
-        self.send_keypress(Roku.Key.channel_up)
+        return self.send_keypress(Roku.Key.channel_up)
         
     def send_key_channel_down(self):
-        self.send_keypress(Roku.Key.channel_down)
+        return self.send_keypress(Roku.Key.channel_down)
 
     def send_key_input_tuner(self):
-        self.send_keypress(Roku.Key.input_tuner)
+        return self.send_keypress(Roku.Key.input_tuner)
 
     def send_key_input_hdmi1(self):
-        self.send_keypress(Roku.Key.input_hdmi1)
+        return self.send_keypress(Roku.Key.input_hdmi1)
 
     def send_key_input_hdmi2(self):
-        self.send_keypress(Roku.Key.input_hdmi2)
+        return self.send_keypress(Roku.Key.input_hdmi2)
 
     def send_key_input_hdmi3(self):
-        self.send_keypress(Roku.Key.input_hdmi3)
+        return self.send_keypress(Roku.Key.input_hdmi3)
 
     def send_key_input_hdmi4(self):
-        self.send_keypress(Roku.Key.input_hdmi4)
+        return self.send_keypress(Roku.Key.input_hdmi4)
 
     def send_key_input_av1(self):
-        self.send_keypress(Roku.Key.input_av1)
+        return self.send_keypress(Roku.Key.input_av1)
 
     def send_key_headphones(self):
         pass
 
     def send_key_power(self):
         if self.is_power_on():
-            self.send_power_off()
+            return self.send_power_off()
         else:
-            self.send_power_on()
+            return self.send_power_on()
 
     def send_char(self, char, keysym):
-        if len(char):
-            if char in "@#$&+=:;,?/ ":
-                char = quote(char, safe="")
-                self.send_keypress(f"Lit_{char}")
-                return
-            if char.isprintable():
-                self.send_keypress(f"Lit_{char}")
-                return
-
-        match keysym:
-            case 'BackSpace':
-                self.send_key_backspace()
-            case 'Delete':
-                self.send_key_backspace()
-            case 'Up':
-                self.send_key_up()
-            case 'Down':
-                self.send_key_down()
-            case 'Left':
-                self.send_key_left()
-            case 'Right':
-                self.send_key_right()
-            case 'Home':
-                self.send_key_home()
-            case 'Escape':
-                self.send_key_back()
-            case 'Pause':
-                self.send_key_play()
-            case 'Return':
-                self.send_key_select()
+        key = char_to_key(char, keysym)
+        if key is not None:
+            return self.send_keypress(key)
 
     # utilities
     def is_power_on(self):
@@ -222,33 +571,23 @@ class Roku:
         return "unknown"
 
     def get_device_info(self, key):
-        if self.device_info is None or key == "power-mode":
-            url = self.api_url + "query/device-info"
-            try:
-                response = requests.get(url)
-                self.device_info = objectify.fromstring(response.content)
-            except Exception as ex:
-                logger.error(f"exception {ex} in get_device_info({key})")
-                raise(ex)
-            except:
-                logger.error(f"unknown error in get_device_info()")
-        return self.device_info[key]
+        """returns a device-info field, served from the device-info cache while fresh"""
+        return eventloop.run(self.async_roku.get_device_info(key))
+
+    def get_active_app(self):
+        return eventloop.run(self.async_roku.get_active_app())
+
+    def get_apps(self):
+        return eventloop.run(self.async_roku.get_apps())
 
     def get_full_device_info(self):
-        url = self.api_url + "query/device-info"
-        try:
-            response = requests.get(url)
-        except Exception as ex:
-            logger.error(f"exception {ex} in get_device_info({key})")
-            raise(ex)
-        except:
-            logger.error(f"unknown error in get_device_info()")
-        return response.text
-    
+        return eventloop.run(self.async_roku.get_full_device_info())
+
     def get_name(self):
         return self.name
 
     def get_api_url(self):
         return self.api_url
 
-
+    def get_usn(self):
+        return self.usn
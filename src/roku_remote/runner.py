@@ -0,0 +1,306 @@
+#!/usr/bin/env python3
+"""Run scripted ECP commands or recorded macros against Rokus without the GUI."""
+import asyncio
+import ipaddress
+import json
+import logging
+import shlex
+import sys
+
+import click
+
+from roku_remote import eventloop
+from roku_remote.discover import DiscoverySession
+from roku_remote.fanout import Broadcast
+from roku_remote.macro import Macro, MacroPlayer
+from roku_remote.metrics import get_metrics
+from roku_remote.registry import DeviceRegistry
+from roku_remote.roku import AsyncRoku, char_to_key
+
+logger = logging.getLogger("main.runner")
+
+ECP_PORT = 8060
+
+CONTEXT_SETTINGS = dict(help_option_names=["-h", "--help"])
+@click.command(context_settings=CONTEXT_SETTINGS, options_metavar="<options>")
+@click.option("--device", "devices", help="device to control, by friendly name, serial number or IP address, repeat to broadcast to several", type=click.STRING, required=True, multiple=True)
+@click.option("--file", "script", help="read commands from a file, - for stdin", type=click.File("r"), default=None)
+@click.option("--pace", help="seconds from the start of one command to the start of the next (default: 0.1)", type=click.FLOAT, default=0.1)
+@click.option("--repeat", help="run the commands this many times", type=click.INT, default=1)
+@click.option("--timeout", help="seconds to look for the device on the network, default 10s", type=click.INT, default=10)
+@click.option("--command-timeout", help=f"seconds to wait for each device to answer a command (default: {Broadcast.TIMEOUT})", type=click.FLOAT, default=Broadcast.TIMEOUT)
+@click.option("--concurrency", help=f"most devices sent a command at once (default: {Broadcast.CONCURRENCY})", type=click.INT, default=Broadcast.CONCURRENCY)
+@click.option("--macro", "macro_path", help="replay a macro recorded in the GUI with F3 instead of running commands", type=click.Path(exists=True, dir_okay=False), default=None)
+@click.option("--scale", help="multiply the macro's recorded times by this, 0.5 replays twice as fast (default: 1)", type=click.FLOAT, default=1.0)
+@click.option("--compensate/--no-compensate", help="send macro actions early by each device's measured latency (default: on)", default=True)
+@click.option("--metrics", "metrics_format", help="after the report print the request and discovery metrics in this format", type=click.Choice(["json", "prometheus"]), default=None)
+@click.option("--json", "as_json", help="print the report as json", is_flag=True, default=False)
+@click.option("--log-level", help="Log level (default: error)", type=click.Choice(["debug", "info", "error"]), default="error")
+@click.argument("commands", nargs=-1)
+
+def main(devices, script, pace, repeat, timeout, command_timeout, concurrency, macro_path, scale, compensate, metrics_format, as_json, log_level, commands):
+    """runs COMMANDS, and the commands in --file, in order against each device over a pooled
+    keep-alive connection, then reports throughput and per command and per device latency.
+    With several devices each command is sent to all of them in parallel before the next. A command is a key
+    name (home, up, select, VolumeUp, ...) optionally repeated as key*N, text:<text> to type,
+    launch:<channel id>, keydown:<key>, keyup:<key> or sleep:<seconds>. In a file commands are
+    separated by white space, quote text with spaces and start comments with #. With --macro
+    the macro is replayed on every device at once with its recorded timing instead"""
+    if log_level == "debug":
+        level = logging.DEBUG
+    elif log_level == "info":
+        level = logging.INFO
+    elif log_level == "error":
+        level = logging.ERROR
+    logging.basicConfig(format='%(asctime)s %(levelname)-8s %(message)s', level=level)
+
+    tokens = list(commands)
+    if script is not None:
+        tokens += shlex.split(script.read(), comments=True)
+    if macro_path is not None:
+        if len(tokens) > 0:
+            raise click.UsageError("give either commands or --macro")
+        try:
+            macro = Macro.load(macro_path)
+        except ValueError as ex:
+            raise click.UsageError(f"{macro_path}: {ex}")
+        player = MacroPlayer(macro, scale, compensate, command_timeout)
+    else:
+        try:
+            steps = parse_commands(tokens) * repeat
+        except ValueError as ex:
+            raise click.UsageError(str(ex))
+        if len(steps) == 0:
+            raise click.UsageError("no commands given")
+
+    try:
+        if macro_path is not None:
+            report = eventloop.run(replay(devices, player, timeout))
+        else:
+            report = eventloop.run(run(devices, steps, pace, timeout, Broadcast(concurrency, command_timeout)))
+    except LookupError as ex:
+        raise click.ClickException(str(ex))
+    click.echo(json.dumps(report, indent=2) if as_json else format_report(report))
+    if metrics_format is not None:
+        click.echo(get_metrics().export(metrics_format))
+    sys.exit(1 if report["failed"] or report["unresolved"] else 0)
+
+def get_keys():
+    """returns the ECP keys by lower case member name and value, e.g. volume_up and volumeup"""
+    keys = {}
+    for key in AsyncRoku.Key:
+        keys[key.name.lower()] = key
+        keys[key.value.lower()] = key
+    return keys
+
+def parse_commands(tokens):
+    """turns command tokens into (label, method, args) steps, method is an AsyncRoku method
+    name or None to sleep"""
+    keys = get_keys()
+
+    def get_key(name):
+        key = keys.get(name.lower())
+        if key is None:
+            raise ValueError(f"unknown key {name}")
+        return key
+
+    steps = []
+    for token in tokens:
+        command, separator, argument = token.partition(":")
+        match command.lower() if separator else None:
+            case "text":
+                for char in argument:
+                    key = char_to_key(char, "")
+                    if key is None:
+                        raise ValueError(f"cannot type {char!r} in {token}")
+                    steps.append(("text", "send_keypress", (key,)))
+            case "launch":
+                steps.append((f"launch {argument}", "send_launch_channel", (argument,)))
+            case "keydown":
+                steps.append((f"keydown {argument}", "send_keydown", (get_key(argument),)))
+            case "keyup":
+                steps.append((f"keyup {argument}", "send_keyup", (get_key(argument),)))
+            case "sleep":
+                steps.append((f"sleep {argument}", None, (float(argument),)))
+            case None:
+                name, star, count = token.partition("*")
+                key = get_key(name)
+                steps += [(str(key), "send_keypress", (key,))] * (int(count) if star else 1)
+            case _:
+                raise ValueError(f"unknown command {token}")
+    return steps
+
+def is_address(device):
+    try:
+        ipaddress.ip_address(device)
+        return True
+    except ValueError:
+        return False
+
+async def resolve(device, timeout):
+    """returns a hydrated AsyncRoku for a friendly name, serial number or IP address. An IP
+    address is used directly, otherwise the device is searched for with find()"""
+    if is_address(device):
+        try:
+            return await AsyncRoku.create({"LOCATION": f"http://{device}:{ECP_PORT}/"})
+        except Exception as ex:
+            raise LookupError(f"no device answered at {device}: {ex}")
+    return await find(device, timeout)
+
+async def find(device, timeout, client_callback=None, registry=None):
+    """searches for a device by friendly name, serial number, USN or IP address and returns it
+    hydrated. The search finishes as soon as a response matches the serial number, USN or
+    address, or a hydrated device matches the name. client_callback is called with every
+    response, registry is the DiscoverySession's"""
+    found = asyncio.get_running_loop().create_future()
+    checks = {}
+
+    def response_received(headers):
+        if client_callback is not None:
+            client_callback(headers)
+        location = headers.get("LOCATION")
+        if location not in checks:
+            checks[location] = asyncio.ensure_future(check(headers))
+
+    async def check(headers):
+        try:
+            roku = await AsyncRoku.create(headers)
+            if found.done() or roku.get_name().casefold() != device.casefold():
+                await roku.close()
+                return
+            found.set_result(roku)
+            for search in session.searches:
+                search.finish("name matched")
+        except (Exception, asyncio.CancelledError) as ex:
+            logger.debug(f"exception {ex!r} checking {headers.get('LOCATION')}")
+
+    session = DiscoverySession("roku:ecp", response_received, registry=registry, timeout=timeout)
+    try:
+        search = await session.search_async(timeout, match=device)
+    finally:
+        await session.close()
+        for task in checks.values():
+            task.cancel()
+        await asyncio.gather(*checks.values(), return_exceptions=True)
+    if search.matched is not None and not found.done():
+        found.set_result(await AsyncRoku.create(search.matched))
+    if not found.done():
+        raise LookupError(f"no device named {device} or with serial number {device} found in {timeout}s")
+    return found.result()
+
+async def resolve_all(devices, timeout):
+    """resolves the devices concurrently, returns the AsyncRokus found and the errors for
+    those not found, raises LookupError when none was found"""
+    resolved = await asyncio.gather(*[resolve(device, timeout) for device in devices], return_exceptions=True)
+    unresolved = [str(roku) for roku in resolved if isinstance(roku, Exception)]
+    rokus = [roku for roku in resolved if not isinstance(roku, Exception)]
+    if len(rokus) == 0:
+        raise LookupError("; ".join(unresolved))
+    return rokus, unresolved
+
+async def run(devices, steps, pace, timeout, broadcast):
+    """resolves the devices and runs the steps, each broadcast to every device and starting
+    pace seconds after the previous one started, or right after the slowest device answered
+    if that took longer. Returns the report"""
+    loop = asyncio.get_running_loop()
+    rokus, unresolved = await resolve_all(devices, timeout)
+    try:
+        await asyncio.gather(*[roku.warm_up() for roku in rokus])
+        latencies = {}
+        per_device = {roku: [] for roku in rokus}
+        failures = {roku: 0 for roku in rokus}
+        started = loop.time()
+        next_start = started
+        for label, method, args in steps:
+            await asyncio.sleep(max(next_start - loop.time(), 0))
+            next_start = loop.time() + pace
+            if method is None:
+                next_start = loop.time() + args[0]
+                continue
+            for result in await broadcast.send_async(rokus, method, *args):
+                latencies.setdefault(label, []).append(result.latency)
+                per_device[result.roku].append(result.latency)
+                if not result.ok():
+                    logger.error(f"{label} failed on {result.roku.get_name()}: {result.get_outcome()}")
+                    failures[result.roku] += 1
+        elapsed = loop.time() - started
+    finally:
+        await asyncio.gather(*[roku.close() for roku in rokus])
+    return get_report(per_device, failures, latencies, unresolved, elapsed)
+
+async def replay(devices, player, timeout):
+    """resolves the devices and replays the macro on all of them at once. Returns the report,
+    with how late each action completed against its schedule"""
+    loop = asyncio.get_running_loop()
+    rokus, unresolved = await resolve_all(devices, timeout)
+    try:
+        await asyncio.gather(*[roku.warm_up() for roku in rokus])
+        started = loop.time()
+        playbacks = await player.play_async(rokus)
+        elapsed = loop.time() - started
+    finally:
+        await asyncio.gather(*[roku.close() for roku in rokus])
+    latencies = {}
+    for playback in playbacks:
+        for (offset, action, args), latency in zip(player.macro.actions, playback.latencies):
+            latencies.setdefault(action, []).append(latency)
+    per_device = {playback.roku: playback.latencies for playback in playbacks}
+    failures = {playback.roku: playback.failed for playback in playbacks}
+    report = get_report(per_device, failures, latencies, unresolved, elapsed)
+    errors = [error for playback in playbacks for error in playback.errors]
+    report["schedule_error"] = get_summary(errors) if errors else None
+    return report
+
+def get_percentile(values, percent):
+    values = sorted(values)
+    return values[min(int(len(values) * percent / 100), len(values) - 1)]
+
+def get_summary(values):
+    return {
+        "count": len(values),
+        "min_ms": min(values) * 1000,
+        "mean_ms": sum(values) / len(values) * 1000,
+        "p50_ms": get_percentile(values, 50) * 1000,
+        "p95_ms": get_percentile(values, 95) * 1000,
+        "max_ms": max(values) * 1000,
+    }
+
+def get_report(per_device, failures, latencies, unresolved, elapsed):
+    every = [latency for values in latencies.values() for latency in values]
+    devices = []
+    for roku, values in per_device.items():
+        devices.append({
+            "device": roku.get_name(),
+            "serial": DeviceRegistry.get_serial(roku.get_usn()),
+            "url": roku.get_api_url(),
+            "failed": failures[roku],
+            "latency": get_summary(values) if values else None,
+        })
+    return {
+        "devices": devices,
+        "unresolved": unresolved,
+        "commands": len(every),
+        "failed": sum(failures.values()),
+        "elapsed_s": elapsed,
+        "throughput_per_s": len(every) / elapsed if elapsed > 0 else 0,
+        "latency": get_summary(every) if every else None,
+        "by_command": {label: get_summary(values) for label, values in latencies.items()},
+    }
+
+def format_report(report):
+    names = ", ".join(f"{device['device']} at {device['url']}" for device in report["devices"])
+    lines = [f"{report['commands']} commands to {names} in {report['elapsed_s']:.2f}s, "
+             f"{report['throughput_per_s']:.1f}/s, {report['failed']} failed"]
+    lines += [f"  not found: {message}" for message in report["unresolved"]]
+    summaries = ([("all", report["latency"])] if report["latency"] else []) + list(report["by_command"].items())
+    if len(report["devices"]) > 1:
+        summaries += [(device["device"], device["latency"]) for device in report["devices"] if device["latency"]]
+    if report.get("schedule_error"):
+        summaries.append(("behind schedule", report["schedule_error"]))
+    for label, summary in summaries:
+        lines.append(f"  {label:<20} n={summary['count']:<5} min {summary['min_ms']:7.1f} mean {summary['mean_ms']:7.1f} "
+                     f"p50 {summary['p50_ms']:7.1f} p95 {summary['p95_ms']:7.1f} max {summary['max_ms']:7.1f} ms")
+    return "\n".join(lines)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Fast SSDP datagram parser, used for every datagram the discovery engine receives."""
+import logging
+
+logger = logging.getLogger("main.ssdp_parser")
+
+class SSDPRecord:
+    """a parsed SSDP datagram. For a response method is None and status is the status code,
+    for a request (NOTIFY, M-SEARCH) method is set and status is None. Header names are
+    upper case, since devices disagree on case, e.g. Cache-Control and CACHE-CONTROL"""
+    __slots__ = ("method", "status", "headers")
+
+    def __init__(self, method, status, headers):
+        self.method = method
+        self.status = status
+        self.headers = headers
+
+    def is_response(self):
+        return self.method is None
+
+    def __repr__(self):
+        return f"{self.method or self.status} {self.headers}"
+
+def parse_datagram(data):
+    """parses an SSDP datagram straight from the receive buffer, returns an SSDPRecord,
+    or None if the datagram is not SSDP. Names and values are decoded directly from
+    memoryview slices of the buffer, without copying lines or splitting the datagram"""
+    view = memoryview(data)
+    end = len(data)
+    line_end = data.find(b"\n")
+    if line_end < 0:
+        return None
+    first = data[:line_end].rstrip()
+    if first.startswith(b"HTTP/"):
+        parts = first.split(b" ", 2)
+        if len(parts) < 2 or not parts[1].isdigit():
+            return None
+        method = None
+        status = int(parts[1])
+    else:
+        parts = first.split(b" ", 1)
+        if len(parts) < 2 or not parts[1].endswith(b"HTTP/1.1"):
+            return None
+        method = str(parts[0], "ascii", "replace")
+        status = None
+
+    headers = {}
+    start = line_end + 1
+    while start < end:
+        line_end = data.find(b"\n", start)
+        if line_end < 0:
+            line_end = end
+        colon = data.find(b":", start, line_end)
+        if colon > 0:
+            name = str(view[start:colon], "latin-1").strip().upper()
+            headers[name] = str(view[colon + 1:line_end], "latin-1").strip()
+        start = line_end + 1
+
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"parsed {method or status} headers {headers}")
+    return SSDPRecord(method, status, headers)
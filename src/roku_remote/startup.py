@@ -0,0 +1,80 @@
+import builtins
+import logging
+import sys
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger("main.startup")
+
+class StartupProfile:
+    """records where startup time goes for --profile-startup: the import time of each module
+    imported while it is installed, named phases such as widget construction, and the time
+    to the first frame. Imports are timed by wrapping builtins.__import__, each module is
+    reported with its inclusive time and its own time excluding the modules it imported"""
+    TOP_IMPORTS = 15
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}
+        self.phases = []
+        self.children = []
+        self.import_function = None
+        self.first_frame = None
+
+    def install(self):
+        self.import_function = builtins.__import__
+        builtins.__import__ = self.timed_import
+
+    def uninstall(self):
+        if self.import_function is not None:
+            builtins.__import__ = self.import_function
+            self.import_function = None
+
+    def timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level:
+            package = (globals or {}).get("__package__") or ""
+            module = f"{package}.{name}" if name else package
+        else:
+            module = name
+        if module in sys.modules:
+            return self.import_function(name, globals, locals, fromlist, level)
+        self.children.append(0)
+        started = time.perf_counter()
+        try:
+            return self.import_function(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self.children.pop()
+            if self.children:
+                self.children[-1] += elapsed
+            self.imports[module] = (elapsed, elapsed - children)
+
+    @contextmanager
+    def phase(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - started)
+
+    def record(self, name, seconds):
+        self.phases.append((name, seconds))
+
+    def frame_shown(self):
+        """call when a frame has been drawn, returns whether it was the first"""
+        if self.first_frame is not None:
+            return False
+        self.first_frame = time.perf_counter() - self.started
+        return True
+
+    def report(self):
+        """returns the profile as text"""
+        lines = [f"imports, top {StartupProfile.TOP_IMPORTS} of {len(self.imports)} by inclusive time:"]
+        for module, (inclusive, own) in sorted(self.imports.items(), key=lambda item: -item[1][0])[:StartupProfile.TOP_IMPORTS]:
+            lines.append(f"  {inclusive * 1000:8.1f} ms {own * 1000:8.1f} ms self  {module}")
+        lines.append("phases:")
+        for name, seconds in self.phases:
+            lines.append(f"  {seconds * 1000:8.1f} ms  {name}")
+        if self.first_frame is not None:
+            lines.append(f"time to first frame {self.first_frame * 1000:.1f} ms")
+        return "\n".join(lines)
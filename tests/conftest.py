@@ -1,10 +1,28 @@
 """
-    Dummy conftest.py for roku_remote.
+    Shared fixtures for the roku_remote tests.
 
-    If you don't know what this is for, just leave it empty.
     Read more about conftest.py under:
     - https://docs.pytest.org/en/stable/fixture.html
     - https://docs.pytest.org/en/stable/writing_plugins.html
 """
 
-# import pytest
+import pytest
+
+
+@pytest.fixture
+def serve():
+    """returns a coroutine function that starts a stand-in for a device's ECP server with
+    routes, a list of aiohttp route definitions, on a free local port of the running event
+    loop, and returns its runner, to clean up on the same loop, and the port"""
+    web = pytest.importorskip("aiohttp.web")
+
+    async def serve(routes):
+        app = web.Application()
+        app.router.add_routes(routes)
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, "127.0.0.1", 0)
+        await site.start()
+        return runner, runner.addresses[0][1]
+
+    return serve
@@ -0,0 +1,35 @@
+import os
+
+from PIL import Image
+
+from roku_remote.assets import ImageCache
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_resized_images_are_cached(tmp_path):
+    """images are resized once into the cache, keyed by source hash and size"""
+    images = tmp_path / "images"
+    images.mkdir()
+    Image.new("RGB", (200, 100), "red").save(images / "chan12.jpeg")
+    Image.new("RGB", (200, 100), "red").save(images / "chan2.jpeg")
+    Image.new("RGBA", (64, 64), "blue").save(images / "home.png")
+    cache_dir = str(tmp_path / "cache")
+
+    cache = ImageCache(images, cache_dir)
+    assert cache.channel_ids() == ["2", "12"]
+    path = cache.get_file("chan12.jpeg", (75, 50))
+    assert path.startswith(cache_dir)
+    with Image.open(path) as image:
+        assert image.size == (75, 50)
+    # identical sources resolve to the same cached file
+    assert cache.get_file("chan2.jpeg", (75, 50)) == path
+    assert cache.get_file("home.png", (75, 50)) != path
+
+    mtime = os.path.getmtime(path)
+    cache = ImageCache(images, cache_dir)
+    assert cache.get_file("chan12.jpeg", (75, 50)) == path
+    assert os.path.getmtime(path) == mtime
+    assert set(cache.manifest) == {"chan12.jpeg", "chan2.jpeg", "home.png"}
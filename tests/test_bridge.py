@@ -0,0 +1,44 @@
+import threading
+import time
+import tkinter as tk
+
+from roku_remote.bridge import TkBridge
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_posts_from_threads_run_in_order_on_tk_thread():
+    """callbacks posted from another thread wake the Tk thread and run in order on it"""
+    interpreter = tk.Tcl()
+    bridge = TkBridge(interpreter)
+    received = []
+
+    def receive(i):
+        received.append((i, threading.current_thread()))
+
+    poster = threading.Thread(target=lambda: [bridge.post(receive, i) for i in range(100)])
+    poster.start()
+    poster.join()
+    deadline = time.monotonic() + 2
+    while len(received) < 100 and time.monotonic() < deadline:
+        interpreter.tk.dooneevent(tk._tkinter.ALL_EVENTS | tk._tkinter.DONT_WAIT)
+    bridge.close()
+    assert [i for i, thread in received] == list(range(100))
+    assert all(thread is threading.current_thread() for i, thread in received)
+
+
+def test_batch_callback_runs_once_per_batch():
+    """everything posted before the Tk thread wakes is drained as one batch"""
+    interpreter = tk.Tcl()
+    bridge = TkBridge(interpreter)
+    received = []
+    batches = []
+    bridge.add_batch_callback(lambda: batches.append(len(received)))
+    for i in range(50):
+        bridge.post(received.append, i)
+    interpreter.tk.dooneevent(tk._tkinter.ALL_EVENTS | tk._tkinter.DONT_WAIT)
+    bridge.close()
+    assert len(received) == 50
+    assert batches == [50]
@@ -0,0 +1,106 @@
+import asyncio
+import os
+
+from roku_remote.catalogue import Catalogue, IconCache
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self, apps):
+        self.apps = apps
+        self.requests = []
+
+    def get_name(self):
+        return "fake"
+
+    async def get_apps(self):
+        return self.apps
+
+    async def get_icon(self, id, headers=None):
+        self.requests.append((id, headers))
+        etag = f'"{id}"'
+        if headers and headers.get("If-None-Match") == etag:
+            return 304, b"", {}
+        return 200, id.encode() * 50, {"ETag": etag}
+
+
+def test_icons_are_revalidated_and_evicted(tmp_path):
+    """a cached icon is revalidated with its ETag, the least recently used icon is evicted"""
+    async def scenario():
+        cache = IconCache(str(tmp_path), max_bytes=250)
+        roku = FakeRoku([])
+        assert await cache.fetch(roku, "12", "12-1")
+        assert not await cache.fetch(roku, "12", "12-1")
+        assert roku.requests[1] == ("12", {"If-None-Match": '"12"'})
+        assert await cache.fetch(roku, "13", "13-1")
+        assert cache.get_path("12-1") is not None
+        assert await cache.fetch(roku, "14", "14-1")
+        # 12 was used more recently than 13
+        assert cache.get_path("13-1") is None
+        assert cache.get_path("12-1") is not None
+        assert len([name for name in os.listdir(tmp_path) if name.endswith(".img")]) == 2
+
+    asyncio.run(scenario())
+
+
+def test_missing_icon_file_is_downloaded_again(tmp_path):
+    """an icon whose file was deleted behind the cache's back is fetched without validators
+    and written again"""
+    async def scenario():
+        cache = IconCache(str(tmp_path))
+        roku = FakeRoku([])
+        assert await cache.fetch(roku, "12", "12-1")
+        os.remove(cache.get_path("12-1"))
+        assert await cache.fetch(roku, "12", "12-1")
+        assert roku.requests[1] == ("12", {})
+        assert os.path.exists(cache.get_path("12-1"))
+
+    asyncio.run(scenario())
+
+
+def test_catalogue_is_memoized_per_device(tmp_path):
+    """the second load publishes the memoized apps and does not fetch icons again"""
+    updates = []
+
+    async def scenario():
+        catalogue = Catalogue(lambda device, apps, icons: updates.append((apps, icons)), IconCache(str(tmp_path)))
+        roku = FakeRoku([("12", "Netflix", "4.1"), ("13", "Prime Video", "2.0")])
+        await catalogue.refresh(roku)
+        assert len(roku.requests) == 2
+        assert set(updates[-1][1]) == {"12", "13"}
+        updates.clear()
+        await catalogue.refresh(roku)
+        assert len(roku.requests) == 2
+        assert len(updates) == 1 and set(updates[0][1]) == {"12", "13"}
+
+    asyncio.run(scenario())
+
+
+def test_failed_fetch_publishes_a_fallback(tmp_path):
+    """a device whose apps cannot be fetched gets None, so the bundled channels are shown,
+    a device with memoized apps keeps them"""
+    updates = []
+
+    class BrokenRoku(FakeRoku):
+        async def get_apps(self):
+            if self.apps is None:
+                raise ConnectionError("unreachable")
+            return self.apps
+
+    async def scenario():
+        catalogue = Catalogue(lambda device, apps, icons: updates.append(apps), IconCache(str(tmp_path)))
+        roku = BrokenRoku(None)
+        await catalogue.refresh(roku)
+        assert updates == [None]
+        updates.clear()
+        roku.apps = [("12", "Netflix", "4.1")]
+        await catalogue.refresh(roku)
+        roku.apps = None
+        updates.clear()
+        await catalogue.refresh(roku)
+        assert updates == [[("12", "Netflix", "4.1")]]
+
+    asyncio.run(scenario())
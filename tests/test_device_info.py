@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from roku_remote.device_info import DeviceInfoCache
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_static_and_volatile_fields():
+    """static fields are served from cache, volatile fields refresh after their TTL"""
+    fetches = []
+
+    async def fetch():
+        fetches.append(time.monotonic())
+        return {"friendly-device-name": "Den", "power-mode": f"PowerOn{len(fetches)}"}
+
+    async def scenario():
+        cache = DeviceInfoCache(fetch, ttls={"power-mode": 0.05})
+        assert await cache.get("friendly-device-name") == "Den"
+        assert await cache.get("friendly-device-name") == "Den"
+        assert await cache.get("power-mode") == "PowerOn1"
+        assert len(fetches) == 1
+        await asyncio.sleep(0.06)
+        assert await cache.get("power-mode") == "PowerOn2"
+        assert await cache.get("friendly-device-name") == "Den"
+        cache.invalidate()
+        assert await cache.get("power-mode") == "PowerOn3"
+        assert cache.stats() == {"hits": 3, "misses": 3, "coalesced": 0}
+
+    asyncio.run(scenario())
+
+
+def test_concurrent_refreshes_are_coalesced():
+    """callers arriving while a refresh is in flight await it instead of fetching"""
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        await asyncio.sleep(0.05)
+        return {"power-mode": "PowerOn"}
+
+    async def scenario():
+        cache = DeviceInfoCache(fetch)
+        results = await asyncio.gather(*[cache.get("power-mode") for _ in range(5)])
+        assert results == ["PowerOn"] * 5
+        assert len(fetches) == 1
+        assert cache.stats() == {"hits": 0, "misses": 1, "coalesced": 4}
+
+    asyncio.run(scenario())
+
+
+def test_pushed_values_expire_with_the_field_ttl():
+    """a pushed value is served instead of fetching, but only for the field's TTL"""
+    fetches = []
+
+    async def fetch():
+        fetches.append(1)
+        return {"power-mode": "PowerOn"}
+
+    async def scenario():
+        cache = DeviceInfoCache(fetch, ttls={"power-mode": 0.05})
+        cache.push("power-mode", "PowerStandby")
+        assert await cache.get("power-mode") == "PowerStandby"
+        assert len(fetches) == 0
+        await asyncio.sleep(0.06)
+        assert await cache.get("power-mode") == "PowerOn"
+        assert len(fetches) == 1
+
+    asyncio.run(scenario())
@@ -1,6 +1,10 @@
+import asyncio
 import logging
 from click.testing import CliRunner
-from roku_remote.discover import main
+import ifaddr
+from roku_remote import discover
+from roku_remote.discover import INTERFACE, DiscoveryEngine, DiscoverySession, Interface, SSDP_ProtocolHandler, get_interfaces, main
+from roku_remote.registry import DeviceRegistry
 
 __author__ = "gordonaspin"
 __copyright__ = "gordonaspin"
@@ -25,3 +29,231 @@ def test_main(caplog):
             discovered = True
     assert discovered
     assert "stopping discovery thread" in caplog.records[len(caplog.records) - 1].message
+
+
+ROKU = {"ST": "roku:ecp", "USN": "uuid:roku:ecp:X000008HLY9X", "LOCATION": "http://192.168.0.172:8060/"}
+ROUTER = {"ST": "upnp:rootdevice", "USN": "uuid:67d10bb0::upnp:rootdevice", "LOCATION": "http://192.168.0.1:1900/rootDesc.xml"}
+
+
+def test_concurrent_attaches_open_the_sockets_once():
+    """sessions attaching at the same time share one opening, closing both closes every socket"""
+    class CountingEngine(DiscoveryEngine):
+        opened = 0
+
+        async def open(self):
+            self.opened += 1
+            await super().open()
+
+    async def scenario():
+        engine = CountingEngine()
+        first = DiscoverySession("roku:ecp", lambda headers: None, engine=engine)
+        second = DiscoverySession("ssdp:all", lambda headers: None, engine=engine)
+        await asyncio.gather(first.attach(), second.attach())
+        assert engine.opened == 1
+        assert engine.sessions == [first, second]
+        transports = [engine.listen_transport, *engine.search_transports.values()]
+        await asyncio.gather(first.close(), second.close())
+        assert engine.listen_transport is None and engine.search_transports == {}
+        assert all(transport.is_closing() for transport in transports if transport is not None)
+
+    asyncio.run(scenario())
+
+
+def test_responses_are_routed_by_search_target():
+    """each session receives only the responses and NOTIFYs for its own search target"""
+    async def scenario():
+        engine = DiscoveryEngine()
+        received = {"roku:ecp": [], "upnp:rootdevice": [], "ssdp:all": []}
+        # sessions are routed to once attached, the sockets are not needed to feed them
+        engine.sessions += [DiscoverySession(target, received[target].append, engine=engine) for target in received]
+        engine.response_received(dict(ROKU), ("192.168.0.172", 1900))
+        engine.response_received(dict(ROUTER), ("192.168.0.1", 1900))
+        engine.notify_received({"NT": "roku:ecp", "NTS": "ssdp:alive", "USN": "uuid:roku:ecp:Y1", "LOCATION": "http://192.168.0.173:8060/"}, ("192.168.0.173", 1900))
+        return received
+
+    received = asyncio.run(scenario())
+    assert [headers["USN"] for headers in received["roku:ecp"]] == [ROKU["USN"], "uuid:roku:ecp:Y1"]
+    assert [headers["USN"] for headers in received["upnp:rootdevice"]] == [ROUTER["USN"]]
+    assert len(received["ssdp:all"]) == 3
+
+
+class QuietEngine:
+    """stands in for the engine, no sockets, responses are fed to the session by the test"""
+    def __init__(self):
+        self.searches = []
+
+    async def attach(self, session):
+        pass
+
+    async def detach(self, session):
+        pass
+
+    def send_search(self, search_target, timeout):
+        self.searches.append(search_target)
+
+
+def run_search(responses, timeout=5, **criteria):
+    """searches while feeding (delay, headers) responses to the session, returns the Search
+    and how long it took"""
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        session = DiscoverySession("roku:ecp", lambda headers: None, engine=QuietEngine())
+        started = loop.time()
+        searching = asyncio.ensure_future(session.search_async(timeout, **criteria))
+        for delay, headers in responses:
+            await asyncio.sleep(delay)
+            if not searching.done():
+                session.response_received(dict(headers))
+        search = await searching
+        return search, loop.time() - started
+
+    return asyncio.run(scenario())
+
+
+def roku(serial, ip):
+    return {"ST": "roku:ecp", "USN": f"uuid:roku:ecp:{serial}", "LOCATION": f"http://{ip}:8060/"}
+
+
+def test_search_ends_at_max_devices():
+    search, elapsed = run_search([(0.01, roku("A1", "10.0.0.1")), (0.01, roku("A1", "10.0.0.1")), (0.01, roku("B2", "10.0.0.2"))], max_devices=2)
+    assert search.reason == "max devices"
+    assert len(search.devices) == 2
+    assert elapsed < 1
+
+
+def test_search_ends_after_quiet_period():
+    search, elapsed = run_search([(0.01, roku("A1", "10.0.0.1")), (0.05, roku("B2", "10.0.0.2"))], quiet_period=0.2)
+    assert search.reason == "quiet period"
+    assert len(search.devices) == 2
+    assert 0.25 <= elapsed < 1
+
+
+def test_search_ends_at_match_by_serial_or_ip():
+    search, elapsed = run_search([(0.01, roku("A1", "10.0.0.1")), (0.01, roku("B2", "10.0.0.2")), (0.01, roku("C3", "10.0.0.3"))], match="B2")
+    assert search.reason == "match"
+    assert search.matched["USN"] == "uuid:roku:ecp:B2"
+    assert elapsed < 1
+    search, elapsed = run_search([(0.01, roku("A1", "10.0.0.1")), (0.01, roku("C3", "10.0.0.3"))], match="10.0.0.3")
+    assert search.matched["USN"] == "uuid:roku:ecp:C3"
+
+
+def test_search_without_criteria_runs_to_timeout():
+    search, elapsed = run_search([(0.01, roku("A1", "10.0.0.1"))], timeout=0.3)
+    assert search.reason == "timeout"
+    assert search.matched is None
+    assert elapsed >= 0.3
+
+
+def test_get_interfaces(monkeypatch):
+    """every IPv4 address but loopback and link-local is used, else the default route's"""
+    adapters = [
+        ifaddr.Adapter("lo", "lo", [ifaddr.IP("127.0.0.1", 8, "lo"), ifaddr.IP(("::1", 0, 0), 128, "lo")]),
+        ifaddr.Adapter("eth0", "eth0", [ifaddr.IP("192.168.0.10", 24, "eth0"), ifaddr.IP("169.254.3.4", 16, "eth0"), ifaddr.IP(("fe80::1", 0, 2), 64, "eth0")]),
+        ifaddr.Adapter("docker0", "docker0", [ifaddr.IP("172.17.0.1", 16, "docker0")]),
+    ]
+    monkeypatch.setattr(discover.ifaddr, "get_adapters", lambda: adapters)
+    assert [(interface.name, interface.ip_address, str(interface.network)) for interface in get_interfaces()] == [
+        ("eth0", "192.168.0.10", "192.168.0.0/24"),
+        ("docker0", "172.17.0.1", "172.17.0.0/16"),
+    ]
+    monkeypatch.setattr(discover.ifaddr, "get_adapters", lambda: adapters[:1])
+    monkeypatch.setattr(discover, "get_ip", lambda: "10.1.2.3")
+    assert [(interface.name, interface.ip_address) for interface in get_interfaces()] == [("default", "10.1.2.3")]
+
+
+def test_responses_are_tagged_with_their_interface():
+    """a search response is tagged with its socket's interface wherever it came from, a NOTIFY
+    on the shared socket with the most specific interface network holding its source"""
+    eth0 = Interface("eth0", "192.168.0.10", 24)
+    engine = DiscoveryEngine()
+    engine.interfaces = [eth0, Interface("vpn", "10.8.0.2", 8), Interface("vpn-site", "10.8.1.2", 24)]
+    received = []
+    engine.sessions.append(DiscoverySession("ssdp:all", received.append, engine=engine))
+    response = b"HTTP/1.1 200 OK\r\nST: roku:ecp\r\nUSN: uuid:roku:ecp:A1\r\nLOCATION: http://10.20.30.40:8060/\r\n\r\n"
+    notify = b"NOTIFY * HTTP/1.1\r\nNT: roku:ecp\r\nNTS: ssdp:alive\r\nUSN: uuid:roku:ecp:B2\r\nLOCATION: http://%s:8060/\r\n\r\n"
+
+    async def scenario():
+        # a routed device, off every local network
+        SSDP_ProtocolHandler(engine, eth0).datagram_received(response, ("10.20.30.40", 1900))
+        listener = SSDP_ProtocolHandler(engine)
+        listener.datagram_received(notify % b"10.8.1.50", ("10.8.1.50", 1900))
+        listener.datagram_received(notify % b"10.9.0.1", ("10.9.0.1", 1900))
+        listener.datagram_received(notify % b"8.8.8.8", ("8.8.8.8", 1900))
+
+    asyncio.run(scenario())
+    assert [headers[INTERFACE] for headers in received] == ["eth0", "vpn-site", "vpn", None]
+
+
+def test_search_stats_per_interface():
+    search, elapsed = run_search([
+        (0.01, dict(roku("A1", "192.168.0.2"), INTERFACE="eth0")),
+        (0.01, dict(roku("B2", "10.8.0.5"), INTERFACE="vpn")),
+        (0.01, dict(roku("C3", "192.168.0.3"), INTERFACE="eth0")),
+    ], max_devices=3)
+    assert {name: stats["devices"] for name, stats in search.interfaces.items()} == {"eth0": 2, "vpn": 1}
+    assert search.interfaces["eth0"]["first"] <= search.interfaces["vpn"]["first"] <= search.interfaces["eth0"]["last"]
+    assert "eth0: 2 devices" in search.report()
+
+
+def test_notify_builds_no_debug_messages_unless_enabled(monkeypatch):
+    """the NOTIFY hot path costs no header lookups for a debug message that is not logged"""
+    looked_up = []
+    real_get_header = discover.get_header
+
+    def get_header(headers, name, default=None):
+        looked_up.append(name)
+        return real_get_header(headers, name, default)
+
+    monkeypatch.setattr(discover, "get_header", get_header)
+    monkeypatch.setattr(discover.logger, "isEnabledFor", lambda level: level > logging.DEBUG)
+    alive = {"NT": "roku:ecp", "NTS": "ssdp:alive", "USN": "uuid:roku:ecp:A1", "LOCATION": "http://10.0.0.1:8060/"}
+
+    async def scenario():
+        DiscoverySession("roku:ecp", lambda headers: None, engine=QuietEngine()).notify_received(alive)
+
+    asyncio.run(scenario())
+    assert looked_up == ["NTS"]
+
+
+def test_known_devices_are_not_reported_again():
+    """with a registry, a repeated response is dropped and only a moved device is reported again"""
+    found = []
+
+    async def scenario():
+        session = DiscoverySession("roku:ecp", found.append, registry=DeviceRegistry(), engine=QuietEngine())
+        session.response_received(roku("A1", "10.0.0.1"))
+        session.response_received(roku("A1", "10.0.0.1"))
+        session.response_received(roku("B2", "10.0.0.2"))
+        session.response_received(roku("A1", "10.0.0.9"))
+        await session.close()
+        return session.registry.stats()
+
+    stats = asyncio.run(scenario())
+    assert [headers["LOCATION"] for headers in found] == ["http://10.0.0.1:8060/", "http://10.0.0.2:8060/", "http://10.0.0.9:8060/"]
+    assert stats["duplicates"] == 1 and stats["moved"] == 1 and stats["known"] == 2
+
+
+def test_notify_tracks_devices_joining_and_leaving():
+    """ssdp:alive reports a device, ssdp:byebye reports it gone and forgets it so its next
+    ssdp:alive is reported again, NOTIFYs for other targets are not routed to the session"""
+    engine = DiscoveryEngine()
+    found, gone = [], []
+    session = DiscoverySession("roku:ecp", found.append, gone.append, registry=DeviceRegistry(), engine=engine)
+    engine.sessions.append(session)
+    notify = b"NOTIFY * HTTP/1.1\r\nNT: %s\r\nNTS: %s\r\nUSN: uuid:roku:ecp:A1\r\nLOCATION: http://10.0.0.1:8060/\r\n\r\n"
+    addr = ("10.0.0.1", 1900)
+
+    async def scenario():
+        listener = SSDP_ProtocolHandler(engine)
+        listener.datagram_received(notify % (b"roku:ecp", b"ssdp:alive"), addr)
+        listener.datagram_received(notify % (b"roku:ecp", b"ssdp:alive"), addr)
+        listener.datagram_received(notify % (b"upnp:rootdevice", b"ssdp:byebye"), addr)
+        assert len(found) == 1 and gone == []
+        listener.datagram_received(notify % (b"roku:ecp", b"ssdp:byebye"), addr)
+        assert session.registry.stats()["known"] == 0
+        listener.datagram_received(notify % (b"roku:ecp", b"ssdp:alive"), addr)
+        await session.close()
+
+    asyncio.run(scenario())
+    assert [headers["NTS"] for headers in found] == ["ssdp:alive", "ssdp:alive"]
+    assert [headers["USN"] for headers in gone] == ["uuid:roku:ecp:A1"]
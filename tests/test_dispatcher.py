@@ -0,0 +1,134 @@
+import threading
+import time
+
+from roku_remote.dispatcher import Dispatcher
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class Completions:
+    """collects the commands the dispatcher notifies from its worker threads"""
+    def __init__(self):
+        self.commands = []
+        self.lock = threading.Lock()
+        self.done = threading.Semaphore(0)
+
+    def notify(self, command):
+        with self.lock:
+            self.commands.append(command)
+        self.done.release()
+
+    def wait(self, count, timeout=5):
+        for _ in range(count):
+            assert self.done.acquire(timeout=timeout)
+
+
+def wait_pending(dispatcher, count, timeout=5):
+    """waits for pending() to drop to count, workers notify before they stop counting a command"""
+    deadline = time.monotonic() + timeout
+    while dispatcher.pending() != count:
+        assert time.monotonic() < deadline
+        time.sleep(0.001)
+
+
+def test_commands_run_in_order_per_device():
+    completions = Completions()
+    dispatcher = Dispatcher(completions.notify)
+    roku = FakeRoku("den")
+    ran = []
+
+    def send(key):
+        time.sleep(0.001)
+        ran.append(key)
+        return key
+
+    for key in range(50):
+        dispatcher.submit(roku, send, key)
+    completions.wait(50)
+    assert ran == list(range(50))
+    assert [command.result for command in completions.commands] == list(range(50))
+    wait_pending(dispatcher, 0)
+    dispatcher.remove(roku)
+
+
+def test_devices_run_concurrently():
+    """a device blocked on a slow command does not hold up the others"""
+    completions = Completions()
+    dispatcher = Dispatcher(completions.notify)
+    slow, fast = FakeRoku("slow"), FakeRoku("fast")
+    release = threading.Event()
+
+    dispatcher.submit(slow, release.wait, 5)
+    dispatcher.submit(fast, lambda: "done")
+    completions.wait(1)
+    assert completions.commands[0].roku is fast
+    wait_pending(dispatcher, 1)
+    release.set()
+    completions.wait(1)
+    wait_pending(dispatcher, 0)
+
+
+def test_exceptions_are_reported_and_counted():
+    """a failing command is handed back with its exception, the worker keeps going"""
+    completions = Completions()
+    dispatcher = Dispatcher(completions.notify)
+    roku = FakeRoku("den")
+
+    def fail():
+        raise ConnectionError("no route to host")
+
+    def callback(command):
+        pass
+
+    failed = dispatcher.submit(roku, fail, callback=callback)
+    succeeded = dispatcher.submit(roku, lambda: 200)
+    completions.wait(2)
+    assert completions.commands == [failed, succeeded]
+    assert isinstance(failed.exception, ConnectionError) and failed.result is None
+    assert failed.callback is callback
+    assert succeeded.exception is None and succeeded.result == 200
+    assert succeeded.latency() >= 0
+    stats = dispatcher.stats()["den"]
+    assert stats["submitted"] == 2
+    assert stats["completed"] == 1
+    assert stats["failed"] == 1
+    assert stats["depth"] == 0 and stats["in_flight"] == 0
+    assert stats["max_depth"] >= 1
+
+
+def test_remove_stops_the_worker_after_queued_commands():
+    completions = Completions()
+    dispatcher = Dispatcher(completions.notify)
+    roku = FakeRoku("den")
+    dispatcher.submit(roku, time.sleep, 0.05)
+    thread = dispatcher.queues[roku].thread
+    dispatcher.remove(roku)
+    assert "den" not in dispatcher.stats()
+    completions.wait(1)
+    thread.join(timeout=5)
+    assert not thread.is_alive()
+
+
+def test_submit_after_remove_is_dropped():
+    """work for a removed device neither runs nor starts a new worker"""
+    completions = Completions()
+    dispatcher = Dispatcher(completions.notify)
+    roku = FakeRoku("den")
+    ran = []
+    dispatcher.submit(roku, ran.append, 1)
+    dispatcher.remove(roku)
+    assert dispatcher.submit(roku, ran.append, 2) is None
+    completions.wait(1)
+    assert ran == [1]
+    assert dispatcher.queues == {}
+    wait_pending(dispatcher, 0)
@@ -0,0 +1,55 @@
+import asyncio
+import time
+
+from roku_remote.fanout import Broadcast
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self, name, delay, status=200):
+        self.name = name
+        self.delay = delay
+        self.status = status
+        self.keys = []
+
+    def get_name(self):
+        return self.name
+
+    async def send_keypress(self, key):
+        await asyncio.sleep(self.delay)
+        self.keys.append(key)
+        return self.status
+
+
+def test_stuck_device_does_not_delay_the_others():
+    """results come back in device order, a stuck device times out on its own"""
+    rokus = [FakeRoku("den", 0.01), FakeRoku("stuck", 10), FakeRoku("kitchen", 0.01, status=503)]
+
+    async def scenario():
+        started = time.perf_counter()
+        results = await Broadcast(timeout=0.2).send_async(rokus, "send_keypress", "Home")
+        return results, time.perf_counter() - started
+
+    results, elapsed = asyncio.run(scenario())
+    assert elapsed < 1
+    assert [result.roku.get_name() for result in results] == ["den", "stuck", "kitchen"]
+    assert results[0].ok() and results[0].latency < 0.2
+    assert results[1].timed_out and not results[1].ok()
+    assert not results[2].ok() and results[2].status == 503
+    assert rokus[0].keys == ["Home"]
+    assert "timed out" in Broadcast.format(results)
+
+
+def test_concurrency_is_bounded():
+    rokus = [FakeRoku(str(i), 0.05) for i in range(6)]
+
+    async def scenario():
+        started = time.perf_counter()
+        await Broadcast(concurrency=2).send_async(rokus, "send_keypress", "Home")
+        return time.perf_counter() - started
+
+    # three rounds of two devices
+    assert asyncio.run(scenario()) >= 0.15
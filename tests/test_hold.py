@@ -0,0 +1,131 @@
+from roku_remote.hold import KeyHold
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeWindow:
+    """runs after() timers when the test advances the clock"""
+    def __init__(self):
+        self.now = 0
+        self.timers = {}
+        self.next_id = 0
+
+    def after(self, ms, function, *args):
+        self.next_id += 1
+        self.timers[self.next_id] = (self.now + ms, function, args)
+        return self.next_id
+
+    def after_cancel(self, id):
+        self.timers.pop(id, None)
+
+    def advance(self, ms):
+        end = self.now + ms
+        while True:
+            due = [(when, id) for id, (when, function, args) in self.timers.items() if when <= end]
+            if not due:
+                break
+            when, id = min(due)
+            self.now = when
+            when, function, args = self.timers.pop(id)
+            function(*args)
+        self.now = end
+
+
+class FakeRoku:
+    def get_name(self):
+        return "fake"
+
+    def send_keypress(self, key):
+        pass
+
+    def send_keydown(self, key):
+        pass
+
+    def send_keyup(self, key):
+        pass
+
+
+def make_hold():
+    window = FakeWindow()
+    sent = []
+    hold = KeyHold(window, lambda function, key, roku=None, callback=None: sent.append((function.__name__, key)))
+    return window, hold, sent
+
+
+def test_tap_sends_one_keypress():
+    window, hold, sent = make_hold()
+    hold.press(FakeRoku(), "Up")
+    window.advance(100)
+    hold.release("Up")
+    window.advance(1000)
+    assert sent == [("send_keypress", "Up")]
+
+
+def test_autorepeated_hold_sends_keydown_and_keyup():
+    """X11 auto-repeat release/press pairs are coalesced into one keydown and one keyup"""
+    window, hold, sent = make_hold()
+    roku = FakeRoku()
+    hold.press(roku, "Down")
+    window.advance(500)
+    for _ in range(100):
+        hold.release("Down")
+        hold.press(roku, "Down")
+        window.advance(33)
+    hold.release("Down")
+    window.advance(1000)
+    assert sent == [("send_keydown", "Down"), ("send_keyup", "Down")]
+    assert hold.held == {}
+
+
+def test_repeats_of_other_keys_are_rate_limited():
+    window, hold, sent = make_hold()
+    roku = FakeRoku()
+    hold.press(roku, "Lit_a")
+    for _ in range(10):
+        hold.press(roku, "Lit_a")
+    hold.release("Lit_a")
+    window.advance(1000)
+    assert sent == [("send_keypress", "Lit_a")]
+
+
+def test_leaked_hold_is_released():
+    """a key whose release never arrives is released by release_all or the watchdog"""
+    window, hold, sent = make_hold()
+    roku = FakeRoku()
+    hold.press(roku, "Left")
+    hold.press(roku, "Right")
+    window.advance(KeyHold.HOLD_DELAY)
+    hold.release_all()
+    assert sorted(sent) == [("send_keydown", "Left"), ("send_keydown", "Right"), ("send_keyup", "Left"), ("send_keyup", "Right")]
+    sent.clear()
+    hold.press(roku, "VolumeUp")
+    window.advance(KeyHold.WATCHDOG)
+    assert sent == [("send_keydown", "VolumeUp"), ("send_keyup", "VolumeUp")]
+
+
+class FailedKeyup:
+    def __init__(self, roku, key):
+        self.roku = roku
+        self.args = (key,)
+        self.exception = ConnectionError("reset")
+        self.result = None
+
+
+def test_keyup_is_not_retried_on_a_released_device():
+    """a failed keyup is retried once, unless its device has gone away in the meantime"""
+    window, hold, sent = make_hold()
+    roku = FakeRoku()
+    hold.press(roku, "Up")
+    window.advance(KeyHold.HOLD_DELAY)
+    hold.forget(roku)
+    assert sent == [("send_keydown", "Up"), ("send_keyup", "Up")]
+    hold.keyup_completed(FailedKeyup(roku, "Up"))
+    window.advance(KeyHold.RETRY_DELAY)
+    assert len(sent) == 2
+
+    other = FakeRoku()
+    hold.keyup_completed(FailedKeyup(other, "Down"))
+    window.advance(KeyHold.RETRY_DELAY)
+    assert sent[2:] == [("send_keyup", "Down")]
@@ -0,0 +1,106 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from roku_remote import eventloop
+from roku_remote.hydration import Hydrator
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+DEVICE_INFO = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<device-info>
+    <friendly-device-name>Living Room</friendly-device-name>
+    <friendly-model-name>Roku Ultra</friendly-model-name>
+    <is-tv>false</is-tv>
+    <is-stick>false</is-stick>
+</device-info>
+"""
+
+
+async def answer(request):
+    await asyncio.sleep(0.3)
+    return web.Response(body=DEVICE_INFO, content_type="text/xml")
+
+
+async def trickle(request):
+    """answers a byte at a time, so no single read ever times out"""
+    response = web.StreamResponse(headers={"Content-Type": "text/xml"})
+    await response.prepare(request)
+    try:
+        for byte in DEVICE_INFO:
+            await response.write(bytes([byte]))
+            await asyncio.sleep(0.05)
+    except ConnectionResetError:
+        pass    # the client gave up
+    return response
+
+
+async def broken(request):
+    return web.Response(status=500, body=b"not xml")
+
+
+class Results:
+    """collects the Hydrator's callbacks from its worker threads"""
+    def __init__(self, expected):
+        self.ready = []
+        self.failed = []
+        self.expected = expected
+        self.done = threading.Event()
+
+    def on_ready(self, roku):
+        self.ready.append(roku)
+        self.check()
+
+    def on_failed(self, headers, ex):
+        self.failed.append(ex)
+        self.check()
+
+    def check(self):
+        if len(self.ready) + len(self.failed) == self.expected:
+            self.done.set()
+
+
+def hydrate(serve, handler, count, **kwargs):
+    """hydrates count devices served by handler, returns the Results and the seconds taken"""
+    runner, port = eventloop.run(serve([web.get("/query/device-info", handler)]))
+    results = Results(count)
+    hydrator = Hydrator(results.on_ready, results.on_failed, **kwargs)
+    try:
+        start = time.monotonic()
+        for _ in range(count):
+            hydrator.submit({"LOCATION": f"http://127.0.0.1:{port}/", "USN": "uuid:roku:ecp:TEST0001"})
+        assert results.done.wait(10)
+        return results, time.monotonic() - start
+    finally:
+        hydrator.shutdown()
+        for roku in results.ready:
+            roku.close()
+        eventloop.run(runner.cleanup())
+
+
+def test_devices_are_hydrated_in_parallel(serve):
+    """four devices that each take 0.3s are hydrated together, not one after the other"""
+    results, elapsed = hydrate(serve, answer, 4, max_workers=4)
+    assert [roku.get_name() for roku in results.ready] == ["Living Room"] * 4
+    assert elapsed < 1.0
+
+
+def test_failure_is_reported(serve):
+    results, elapsed = hydrate(serve, broken, 1)
+    assert results.ready == []
+    assert len(results.failed) == 1
+
+
+def test_deadline_is_enforced(serve):
+    """a device that answers too slowly fails at its deadline, as does one queued past it"""
+    results, elapsed = hydrate(serve, trickle, 2, max_workers=1, deadline=0.5)
+    assert results.ready == []
+    assert [type(ex) for ex in results.failed] == [TimeoutError, TimeoutError]
+    assert elapsed < 1.5
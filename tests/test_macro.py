@@ -0,0 +1,66 @@
+import asyncio
+
+import pytest
+
+from roku_remote.macro import Macro, MacroPlayer
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self, name, latency):
+        self.name = name
+        self.latency = latency
+        self.received = []
+
+    def get_name(self):
+        return self.name
+
+    async def send_keypress(self, key):
+        await asyncio.sleep(self.latency)
+        self.received.append((asyncio.get_running_loop().time(), key))
+        return 200
+
+    async def send_launch_channel(self, id):
+        return await self.send_keypress(f"launch {id}")
+
+
+def test_macro_round_trip():
+    macro = Macro()
+    macro.record("send_keypress", ("Lit_a",))
+    macro.record("get_full_device_info", ())
+    macro.record("send_launch_channel", (12,))
+    assert [(action, args) for offset, action, args in macro.actions] == [("keypress", ("Lit_a",)), ("launch_channel", ("12",))]
+    parsed = Macro.parse(macro.format())
+    assert [(action, args) for offset, action, args in parsed.actions] == [("keypress", ("Lit_a",)), ("launch_channel", ("12",))]
+    assert Macro.parse("# comment\n\n0.5 key_home\n").actions == [(0.5, "key_home", ())]
+    with pytest.raises(ValueError):
+        Macro.parse("1.0 key_home\n0.5 key_up\n")
+
+
+def test_replay_keeps_scaled_timing_on_every_device():
+    """actions take effect close to time * scale on each device despite request latency"""
+    macro = Macro.parse("0 keypress Home\n0.4 keypress Up\n0.8 launch_channel 12\n")
+    rokus = [FakeRoku("fast", 0.01), FakeRoku("slow", 0.08)]
+
+    async def scenario():
+        start = asyncio.get_running_loop().time() + MacroPlayer.START_DELAY
+        playbacks = await MacroPlayer(macro, scale=0.5).play_async(rokus)
+        return start, playbacks
+
+    start, playbacks = asyncio.run(scenario())
+    for roku, playback in zip(rokus, playbacks):
+        assert [key for when, key in roku.received] == ["Home", "Up", "launch 12"]
+        assert playback.failed == 0
+        assert [when - start for when, key in roku.received][2] == pytest.approx(0.4, abs=0.05)
+    for playback in playbacks:
+        # the lead follows the compensation model over the measured latencies
+        lead = None
+        for index, latency in enumerate(playback.latencies):
+            lead = MacroPlayer.get_lead(lead, latency, index == 0)
+        assert playback.lead == pytest.approx(lead)
+    # the slow device's later actions were sent early to make up for its latency
+    assert playbacks[1].lead >= 0.08
+    assert abs(playbacks[1].errors[-1]) < playbacks[1].errors[0]
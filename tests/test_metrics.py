@@ -0,0 +1,72 @@
+import asyncio
+import json
+
+import pytest
+
+from roku_remote.metrics import Histogram, Metrics
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_requests_are_grouped_by_device_and_endpoint():
+    metrics = Metrics()
+    for key in ("Up", "Down", "Lit_a"):
+        with metrics.measure("den", f"http://10.0.0.2:8060/keypress/{key}") as sample:
+            sample.status = 200
+    with metrics.measure("den", "http://10.0.0.2:8060/query/icon/12") as sample:
+        sample.status = 503
+    with pytest.raises(TimeoutError):
+        with metrics.measure("den", "http://10.0.0.2:8060/"):
+            raise TimeoutError()
+    metrics.observe_connection("den", False)
+    metrics.observe_connection("den", True)
+    metrics.observe_connection("den", True)
+
+    snapshot = json.loads(metrics.to_json())
+    assert [(entry["endpoint"], entry["count"]) for entry in snapshot["requests"]] == [("/", 1), ("keypress", 3), ("query/icon", 1)]
+    assert [(entry["endpoint"], entry["error"]) for entry in snapshot["errors"]] == [("/", "TimeoutError"), ("query/icon", "503")]
+    assert snapshot["connections"] == [{"device": "den", "created": 1, "reused": 2}]
+
+
+def test_histogram_and_prometheus_text():
+    histogram = Histogram()
+    for seconds in (0.003, 0.02, 0.02, 0.2, 3):
+        histogram.observe(seconds)
+    assert histogram.get_percentile(50) == 0.025
+    assert histogram.get_percentile(100) == 3
+
+    metrics = Metrics()
+    metrics.observe_request('my "den"', "keypress", 0.02, 200)
+    metrics.observe_discovery("search", 1.5)
+    text = metrics.to_prometheus()
+    assert 'roku_remote_request_seconds_bucket{device="my \\"den\\"",endpoint="keypress",le="0.025"} 1' in text
+    assert 'roku_remote_request_seconds_bucket{device="my \\"den\\"",endpoint="keypress",le="+Inf"} 1' in text
+    assert 'roku_remote_discovery_seconds_count{phase="search"} 1' in text
+
+
+def test_rename_merges_into_the_friendly_name():
+    metrics = Metrics()
+    metrics.observe_request("10.0.0.2:8060", "query/device-info", 0.02, 200)
+    metrics.observe_connection("10.0.0.2:8060", False)
+    metrics.observe_request("den", "keypress", 0.02, 500)
+    metrics.rename("10.0.0.2:8060", "den")
+    snapshot = metrics.snapshot()
+    assert {entry["device"] for entry in snapshot["requests"]} == {"den"}
+    assert snapshot["connections"] == [{"device": "den", "created": 1, "reused": 0}]
+
+
+def test_abandoned_requests_count_as_cancelled():
+    """a request cut off by a wait_for timeout is recorded, then the cancellation goes on"""
+    metrics = Metrics()
+
+    async def request():
+        with metrics.measure("den", "http://10.0.0.2:8060/keypress/Up"):
+            await asyncio.sleep(1)
+
+    with pytest.raises(asyncio.TimeoutError):
+        asyncio.run(asyncio.wait_for(request(), 0.01))
+    snapshot = metrics.snapshot()
+    assert snapshot["requests"][0]["count"] == 1
+    assert snapshot["errors"] == [{"device": "den", "endpoint": "keypress", "error": "cancelled", "count": 1}]
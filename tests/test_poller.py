@@ -0,0 +1,90 @@
+import asyncio
+import threading
+
+from roku_remote.device_info import DeviceInfoCache
+from roku_remote.poller import StatePoller
+from roku_remote.roku import AsyncRoku
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self):
+        self.power = False
+        self.polls = 0
+
+    async def is_power_on(self):
+        self.polls += 1
+        return self.power
+
+    async def get_active_app(self):
+        return "Home"
+
+    def get_name(self):
+        return "fake"
+
+
+def test_poller_publishes_changes():
+    """the first poll publishes the initial state, a poke picks up a change within POKE_DELAY"""
+    changes = []
+    changed = threading.Semaphore(0)
+
+    def on_change(device, state):
+        changes.append(state)
+        changed.release()
+
+    roku = FakeRoku()
+    poller = StatePoller(on_change)
+    poller.add(roku)
+    assert changed.acquire(timeout=2)
+    assert changes[0] == {"power": False, "active_app": "Home", "reachable": True}
+    roku.power = True
+    poller.poke(roku)
+    assert changed.acquire(timeout=StatePoller.POKE_DELAY + 1)
+    assert changes[1]["power"] is True
+    assert poller.get_state(roku) == changes[1]
+    poller.remove(roku)
+    poller.stop()
+
+
+def test_pokes_are_coalesced():
+    """a burst of pokes, e.g. keypresses, costs one poll instead of one each"""
+    async def scenario():
+        roku = FakeRoku()
+        poller = StatePoller(lambda device, state: None)
+        poller.add_now(roku)
+        await asyncio.sleep(0.1)
+        assert roku.polls == 1
+        for _ in range(20):
+            poller.poke_now(roku)
+            await asyncio.sleep(0.01)
+        assert roku.polls == 1
+        await asyncio.sleep(StatePoller.POKE_DELAY)
+        assert roku.polls == 2
+        poller.stop_now()
+
+    asyncio.run(scenario())
+
+
+def test_pushed_power_mode_is_normalized():
+    """a pushed power-on is cached and published as device-info's PowerOn"""
+    async def fetch():
+        return {"power-mode": "PowerStandby"}
+
+    async def scenario():
+        roku = FakeRoku()
+        roku.device_info = DeviceInfoCache(fetch)
+        roku.is_power_on = lambda: AsyncRoku.is_power_on(roku)
+        roku.get_device_info = roku.device_info.get
+        changes = []
+        poller = StatePoller(lambda device, state: changes.append(state))
+        device_state = poller.devices[roku] = StatePoller.DeviceState(roku)
+        poller.notified(device_state, "power-mode-changed", {"power-mode": "power-on"})
+        assert changes == [{"active_app": None, "power": True, "reachable": True}]
+        assert await roku.device_info.get("power-mode") == "PowerOn"
+        assert await roku.is_power_on() is True
+
+    assert StatePoller.normalize_power_mode("PowerStandby") == "PowerStandby"
+    asyncio.run(scenario())
@@ -0,0 +1,74 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from roku_remote.push import PushChannel
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+class FakeRoku:
+    def __init__(self, port):
+        self.port = port
+
+    def get_api_url(self):
+        return f"http://127.0.0.1:{self.port}/"
+
+    def get_name(self):
+        return "fake"
+
+
+async def ecp_session(request):
+    """stand-in for the device side of the ECP session"""
+    ws = web.WebSocketResponse(protocols=(PushChannel.PROTOCOL,))
+    await ws.prepare(request)
+    await ws.send_json({"notify": "authenticate", "param-challenge": "abc"})
+    message = await ws.receive_json()
+    ok = message["param-response"] == PushChannel.get_challenge_response("abc", PushChannel.AUTH_KEY)
+    await ws.send_json({"response": "authenticate", "response-id": message["request-id"], "status": "200" if ok else "401"})
+    message = await ws.receive_json()
+    assert "+power-mode-changed" in message["param-events"]
+    # malformed frames are skipped, during a request and while notifications are read
+    await ws.send_str("{not json")
+    await ws.send_json({"response": "request-events", "response-id": message["request-id"], "status": "200"})
+    await ws.send_str("[1, 2]")
+    await ws.send_json({"notify": "power-mode-changed", "param-power-mode": "PowerOn"})
+    await ws.close()
+    return ws
+
+
+async def not_found(request):
+    return web.Response(status=404)
+
+
+def test_push_notifications(serve):
+    """the channel authenticates, subscribes and dispatches the pushed notifications"""
+    async def scenario():
+        runner, port = await serve([web.get("/ecp-session", ecp_session)])
+        device = FakeRoku(port)
+        notifications = []
+        live = []
+        channel = PushChannel(device, lambda event, params: notifications.append((event, params)), live.append)
+        await channel.subscribe()
+        await runner.cleanup()
+        assert notifications == [("power-mode-changed", {"power-mode": "PowerOn"})]
+        assert live == [True, False]
+
+    asyncio.run(scenario())
+
+
+def test_unsupported_falls_back(serve):
+    """run() returns False when the device has no ECP session"""
+    async def scenario():
+        runner, port = await serve([web.get("/ecp-session", not_found)])
+        device = FakeRoku(port)
+        channel = PushChannel(device, lambda event, params: None)
+        assert await asyncio.wait_for(channel.run(), 5) is False
+        await runner.cleanup()
+
+    asyncio.run(scenario())
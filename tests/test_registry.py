@@ -0,0 +1,34 @@
+from roku_remote.registry import DeviceRegistry
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+ROKU = {"Cache-Control": "max-age=3600", "ST": "roku:ecp", "USN": "uuid:roku:ecp:X000008HLY9X", "LOCATION": "http://192.168.0.172:8060/"}
+
+
+def test_observe_deduplicates_by_usn():
+    """repeated responses are KNOWN, a new LOCATION for a known USN is MOVED"""
+    registry = DeviceRegistry()
+    assert registry.observe(ROKU) == DeviceRegistry.NEW
+    assert registry.observe(ROKU) == DeviceRegistry.KNOWN
+    assert registry.observe(dict(ROKU, LOCATION="http://192.168.0.173:8060/")) == DeviceRegistry.MOVED
+    assert registry.stats() == {"new": 1, "moved": 1, "duplicates": 1, "unkeyed": 0, "expired": 0, "known": 1}
+    assert DeviceRegistry.get_serial(ROKU["USN"]) == "X000008HLY9X"
+
+
+def test_entries_expire_after_max_age():
+    """entries are revalidated a margin before their max-age lapses and expire after it"""
+    registry = DeviceRegistry()
+    registry.observe({"CACHE-CONTROL": "max-age=100", "USN": "uuid:router", "LOCATION": "http://192.168.0.1:1900/"})
+    registry.observe(ROKU)
+    entry = registry.entries()[0]
+    assert entry.max_age == 100
+    assert registry.next_deadline() == entry.last_seen + 90
+    assert registry.housekeeping(entry.last_seen + 50) == ([], False)
+    assert registry.housekeeping(entry.last_seen + 95) == ([], True)
+    assert registry.next_deadline() == entry.last_seen + 100
+    expired, revalidate = registry.housekeeping(entry.last_seen + 100)
+    assert [expired.usn for expired in expired] == ["uuid:router"]
+    assert revalidate is False
+    assert [entry.usn for entry in registry.entries()] == [ROKU["USN"]]
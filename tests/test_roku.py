@@ -0,0 +1,148 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web
+
+from roku_remote import eventloop, roku
+from roku_remote.roku import AsyncRoku, Roku
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+DEVICE_INFO = b"""<?xml version="1.0" encoding="UTF-8" ?>
+<device-info>
+    <friendly-device-name>Living Room</friendly-device-name>
+    <power-mode>PowerOn</power-mode>
+</device-info>
+"""
+
+
+def get_headers(port):
+    return {"LOCATION": f"http://127.0.0.1:{port}/", "USN": "uuid:roku:ecp:TEST0001"}
+
+
+def test_requests(serve):
+    """create() fetches the name, commands return the status and reuse the pooled session"""
+    keys = []
+
+    async def device_info(request):
+        return web.Response(body=DEVICE_INFO, content_type="text/xml")
+
+    async def keypress(request):
+        keys.append(request.match_info["key"])
+        return web.Response(status=200)
+
+    async def scenario():
+        runner, port = await serve([web.get("/query/device-info", device_info), web.post("/keypress/{key}", keypress)])
+        device = await AsyncRoku.create(get_headers(port))
+        try:
+            assert device.get_name() == "Living Room"
+            assert device.get_usn() == "uuid:roku:ecp:TEST0001"
+            session = device.get_session()
+            assert await device.send_key_home() == 200
+            assert await device.send_keypress("Lit_a") == 200
+            assert device.get_session() is session
+            assert keys == ["Home", "Lit_a"]
+            assert await device.is_power_on() is True
+        finally:
+            await device.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_timeout(serve):
+    """a device that does not answer within the read timeout raises instead of hanging"""
+    async def slow(request):
+        await asyncio.sleep(1)
+        return web.Response(status=200)
+
+    async def scenario():
+        runner, port = await serve([web.post("/keypress/{key}", slow)])
+        device = AsyncRoku(get_headers(port), timeout=(0.1, 0.1))
+        try:
+            with pytest.raises(asyncio.TimeoutError):
+                await device.send_key_home()
+        finally:
+            await device.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_close(serve):
+    """close() closes the session for good, later requests are refused"""
+    async def keypress(request):
+        return web.Response(status=200)
+
+    async def scenario():
+        runner, port = await serve([web.post("/keypress/{key}", keypress)])
+        device = AsyncRoku(get_headers(port))
+        try:
+            await device.start_heartbeat()
+            session = device.get_session()
+            await device.close()
+            assert session.closed
+            assert device.session is None and device.heartbeat_task is None
+            with pytest.raises(RuntimeError):
+                await device.send_key_home()
+            assert device.session is None
+        finally:
+            await device.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+
+
+def test_failed_hydrate_closes_the_session(monkeypatch, serve):
+    """the Roku facade closes its session when the device does not answer"""
+    created = []
+
+    class RecordingRoku(AsyncRoku):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    async def broken(request):
+        return web.Response(status=500, body=b"not xml")
+
+    monkeypatch.setattr(roku, "AsyncRoku", RecordingRoku)
+    runner, port = eventloop.run(serve([web.get("/query/device-info", broken)]))
+    try:
+        with pytest.raises(Exception):
+            Roku(get_headers(port))
+        assert len(created) == 1
+        assert created[0].session is None
+    finally:
+        eventloop.run(runner.cleanup())
+
+
+def test_heartbeat_keeps_one_pooled_connection(serve):
+    """the heartbeat warms up at once and repeats its HEAD on the same kept-alive connection,
+    until it is stopped"""
+    peers = []
+
+    async def head(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.Response(status=200)
+
+    async def scenario():
+        runner, port = await serve([web.head("/", head)])
+        device = AsyncRoku(get_headers(port))
+        try:
+            await device.start_heartbeat(interval=0.05)
+            await asyncio.sleep(0.3)
+            await device.stop_heartbeat()
+            count = len(peers)
+            assert count >= 3
+            assert len(set(peers)) == 1
+            await asyncio.sleep(0.15)
+            assert len(peers) == count
+        finally:
+            await device.close()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from aiohttp import web
+
+from roku_remote import discover
+from roku_remote.roku import AsyncRoku
+from roku_remote.runner import find, get_summary, parse_commands
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_commands_are_parsed_in_order():
+    """key names and values, repeats, text, launches and sleeps become steps in order"""
+    steps = parse_commands(["Home", "volume_up*3", "text:a b", "launch:12", "sleep:0.5", "keydown:up", "keyup:Up"])
+    assert [(method, args) for label, method, args in steps] == [
+        ("send_keypress", (AsyncRoku.Key.home,)),
+        ("send_keypress", (AsyncRoku.Key.volume_up,)),
+        ("send_keypress", (AsyncRoku.Key.volume_up,)),
+        ("send_keypress", (AsyncRoku.Key.volume_up,)),
+        ("send_keypress", ("Lit_a",)),
+        ("send_keypress", ("Lit_%20",)),
+        ("send_keypress", ("Lit_b",)),
+        ("send_launch_channel", ("12",)),
+        (None, (0.5,)),
+        ("send_keydown", (AsyncRoku.Key.up,)),
+        ("send_keyup", (AsyncRoku.Key.up,)),
+    ]
+
+
+def test_unknown_commands_are_rejected():
+    with pytest.raises(ValueError):
+        parse_commands(["home", "warp"])
+    with pytest.raises(ValueError):
+        parse_commands(["eject:1"])
+
+
+def test_summary():
+    summary = get_summary([0.01, 0.02, 0.03, 0.04])
+    assert summary["count"] == 4
+    assert summary["min_ms"] == pytest.approx(10)
+    assert summary["mean_ms"] == pytest.approx(25)
+    assert summary["max_ms"] == pytest.approx(40)
+
+
+def test_find_matches_the_friendly_name(monkeypatch, serve):
+    """a device found by name, whose serial number does not match, finishes the search early"""
+    def device_info(name):
+        async def handler(request):
+            return web.Response(body=f"<device-info><friendly-device-name>{name}</friendly-device-name></device-info>".encode(), content_type="text/xml")
+        return handler
+
+    class FakeEngine:
+        """answers every search with the two stand-in devices"""
+        async def attach(self, session):
+            self.session = session
+
+        async def detach(self, session):
+            pass
+
+        def send_search(self, search_target, timeout):
+            for serial, port in zip(("K1", "D2"), ports):
+                self.session.response_received({"ST": "roku:ecp", "USN": f"uuid:roku:ecp:{serial}", "LOCATION": f"http://127.0.0.1:{port}/"})
+
+    monkeypatch.setattr(discover, "get_engine", FakeEngine)
+    ports = []
+
+    async def scenario():
+        runners = []
+        for name in ("Kitchen", "Den"):
+            runner, port = await serve([web.get("/query/device-info", device_info(name))])
+            runners.append(runner)
+            ports.append(port)
+        responses = []
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        roku = await find("den", 5, responses.append)
+        try:
+            assert roku.get_name() == "Den"
+            assert roku.get_usn() == "uuid:roku:ecp:D2"
+            assert len(responses) == 2
+            assert loop.time() - started < 2
+            with pytest.raises(LookupError):
+                await find("attic", 0.3)
+        finally:
+            await roku.close()
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(scenario())
@@ -0,0 +1,31 @@
+from roku_remote.ssdp_parser import parse_datagram
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_parse_response():
+    """responses are parsed with upper case header names and stripped values"""
+    record = parse_datagram(b"HTTP/1.1 200 OK\r\nCache-Control: max-age=3600\r\nST: roku:ecp\r\nUSN: uuid:roku:ecp:X000008HLY9X\r\n"
+                            b"Ext: \r\nLOCATION: http://192.168.0.172:8060/\r\nWAKEUP: MAC=cc:a1:2b:6a:c5:cf;Timeout=10\r\n\r\n")
+    assert record.is_response()
+    assert record.status == 200
+    assert record.headers == {
+        "CACHE-CONTROL": "max-age=3600",
+        "ST": "roku:ecp",
+        "USN": "uuid:roku:ecp:X000008HLY9X",
+        "EXT": "",
+        "LOCATION": "http://192.168.0.172:8060/",
+        "WAKEUP": "MAC=cc:a1:2b:6a:c5:cf;Timeout=10",
+    }
+
+
+def test_parse_notify():
+    """NOTIFY requests are parsed, bare LF line endings are accepted and garbage is rejected"""
+    record = parse_datagram(b"NOTIFY * HTTP/1.1\nHOST: 239.255.255.250:1900\nNT: roku:ecp\nNTS: ssdp:byebye\nUSN: uuid:roku:ecp:X000008HLY9X\n\n")
+    assert not record.is_response()
+    assert record.method == "NOTIFY"
+    assert record.headers["NTS"] == "ssdp:byebye"
+    assert parse_datagram(b"garbage") is None
+    assert parse_datagram(b"HTTP/1.1 OK\r\n\r\n") is None
@@ -0,0 +1,26 @@
+import sys
+
+from roku_remote.startup import StartupProfile
+
+__author__ = "gordonaspin"
+__copyright__ = "gordonaspin"
+__license__ = "MIT"
+
+
+def test_profile_times_imports_and_phases():
+    """first time imports are timed while installed, phases are recorded in order"""
+    sys.modules.pop("colorsys", None)
+    profile = StartupProfile()
+    profile.install()
+    try:
+        with profile.phase("import"):
+            import colorsys
+    finally:
+        profile.uninstall()
+    assert "colorsys" in profile.imports
+    inclusive, own = profile.imports["colorsys"]
+    assert 0 <= own <= inclusive
+    assert [name for name, seconds in profile.phases] == ["import"]
+    assert profile.frame_shown()
+    assert not profile.frame_shown()
+    assert "colorsys" in profile.report()